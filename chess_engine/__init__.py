@@ -0,0 +1,21 @@
+"""
+Chess Engine Package
+
+Bitboard position representation and move generation used by chess_game.py.
+"""
+
+from .bitboard import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, square, row_col
+from .moves import encode_move, move_from, move_to, move_to_uci
+from .position import Position
+from .fen import STARTING_FEN, position_from_fen, position_to_fen
+from .san import move_to_san, parse_move
+
+__all__ = [
+    'WHITE', 'BLACK',
+    'PAWN', 'KNIGHT', 'BISHOP', 'ROOK', 'QUEEN', 'KING',
+    'square', 'row_col',
+    'encode_move', 'move_from', 'move_to', 'move_to_uci',
+    'Position',
+    'STARTING_FEN', 'position_from_fen', 'position_to_fen',
+    'move_to_san', 'parse_move',
+]
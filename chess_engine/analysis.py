@@ -0,0 +1,397 @@
+"""
+Batch position analysis on a pool of engine processes.
+
+AnalysisService takes batches of FENs with a depth and/or time budget,
+queues one task per position on a process pool and hands back a job id;
+status() reports progress and the results finished so far, so large
+batches can be polled instead of waited on. Each worker process keeps
+its own Engine (without the opening book, which has no scores to give),
+so its transposition table stays warm across the positions it is sent.
+
+Every FEN is read when a batch is submitted, so bad input is refused
+up front. The service caps the positions of one job, the unfinished jobs
+of one owner and the positions queued overall; submit() raises
+AnalysisBusy rather than queue past the last two.
+
+Scores follow UCI: from the side to move's point of view, as
+{'cp': n} or {'mate': n} with n in moves.
+
+annotate_games() runs stored games through the service and records an
+evaluation and best line for every position in the game_analysis table,
+for example overnight:
+
+    python -m chess_engine.analysis annotate -d chess_users.db --movetime 2000
+"""
+
+import multiprocessing
+import os
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .bitboard import WHITE
+from .engine import Engine, MAX_DEPTH
+from .fen import STARTING_FEN, position_from_fen, position_to_fen
+from .games import DEFAULT_PATH, replay, unpack_moves
+from .moves import move_to_uci
+from .timeman import TimeManager
+from .uci import format_score, principal_variation
+
+MAX_BATCH = 10000       # positions per job
+MAX_JOBS_PER_OWNER = 4  # unfinished jobs one owner may have queued
+MAX_QUEUED = 50000      # positions queued or running across all jobs
+JOB_TTL = 3600          # seconds a finished job's results are kept
+DEFAULT_MOVETIME = 1000  # milliseconds, when neither depth nor time is given
+GAMES_PER_JOB = 20
+
+# Migration step for chess_engine.db.migrate, run after the games archive step
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS game_analysis (
+        game_id INTEGER NOT NULL REFERENCES games (id) ON DELETE CASCADE,
+        ply INTEGER NOT NULL,
+        depth INTEGER NOT NULL,
+        score_cp INTEGER,       -- from White's point of view; NULL for mates
+        mate INTEGER,           -- moves to mate, positive when White mates
+        best_move TEXT,
+        pv TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (game_id, ply)
+    ) WITHOUT ROWID""",
+]
+
+_UNANNOTATED = """
+    SELECT id, start_fen, moves FROM games
+    WHERE id > ? AND NOT EXISTS (SELECT 1 FROM game_analysis WHERE game_id = games.id)
+    ORDER BY id LIMIT ?
+"""
+_INSERT_ANALYSIS = """
+    INSERT OR REPLACE INTO game_analysis (game_id, ply, depth, score_cp, mate, best_move, pv)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+_engine = None
+_iterations = []
+
+
+class AnalysisBusy(Exception):
+    """Raised by submit() when the queue or the owner's job limit is full"""
+
+
+def _init_worker(tt_size_mb, tablebase_dir):
+    global _engine
+    _engine = Engine(tt_size_mb, book_path=None, tablebase_dir=tablebase_dir)
+    _engine.on_iteration = lambda *info: _iterations.append(info)
+
+
+def _score(value):
+    """UCI score as a dict, value being from the side to move's point of view"""
+    kind, number = format_score(value).split()
+    return {kind: int(number)}
+
+
+def analyse_position(fen, depth=None, movetime=None):
+    """Worker task: evaluation and best line for fen
+
+    Returns a dict with fen, bestmove, score, depth, nodes, pv (UCI moves)
+    and time (ms), or with fen and error if the FEN cannot be read.
+    """
+    try:
+        position = position_from_fen(fen)
+    except ValueError as e:
+        return {'fen': fen, 'error': str(e)}
+    start = time.time()
+    if not position.generate_legal_moves():
+        return {'fen': fen, 'bestmove': None, 'score': {'mate': 0} if position.in_check() else {'cp': 0},
+                'depth': 0, 'nodes': 0, 'pv': [], 'time': 0}
+    if depth is None and movetime is None:
+        movetime = DEFAULT_MOVETIME
+    timer = TimeManager(move_time=movetime / 1000) if movetime is not None else TimeManager()
+    _iterations.clear()
+    best_move = _engine.think(position, timer, depth or MAX_DEPTH)
+    reached, value, nodes = 0, 0, 0
+    if _iterations:
+        reached, _, value, nodes = _iterations[-1]
+    if position.turn != WHITE:
+        value = -value
+    pv = principal_variation(_engine, position, best_move, max(reached, 1))
+    return {'fen': fen, 'bestmove': move_to_uci(best_move), 'score': _score(value),
+            'depth': reached, 'nodes': nodes, 'pv': [move_to_uci(move) for move in pv],
+            'time': int((time.time() - start) * 1000)}
+
+
+class Job:
+    def __init__(self, fens, futures, owner=None):
+        self.id = secrets.token_hex(8)
+        self.fens = fens
+        self.futures = futures
+        self.owner = owner
+        self.created = time.time()
+        self.finished = None
+
+    def done(self):
+        if self.finished is None and all(future.done() for future in self.futures):
+            self.finished = time.time()
+        return self.finished is not None
+
+
+def _result(future, fen):
+    if not future.done():
+        return None
+    if future.cancelled():
+        return {'fen': fen, 'error': 'cancelled'}
+    error = future.exception()
+    if error is not None:
+        return {'fen': fen, 'error': f"analysis failed: {error!r}"}
+    return future.result()
+
+
+class AnalysisService:
+    def __init__(self, workers=None, tt_size_mb=16, tablebase_dir='tablebases',
+                 max_batch=MAX_BATCH, max_jobs_per_owner=MAX_JOBS_PER_OWNER, max_queued=MAX_QUEUED):
+        self.workers = workers or os.cpu_count() or 1
+        self.tt_size_mb = tt_size_mb
+        self.tablebase_dir = tablebase_dir if tablebase_dir and os.path.isdir(tablebase_dir) else None
+        self.max_batch = max_batch
+        self.max_jobs_per_owner = max_jobs_per_owner
+        self.max_queued = max_queued
+        self.pool = None
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        if self.pool is None:
+            # spawn avoids forking a process that runs web server threads
+            context = multiprocessing.get_context('spawn')
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=context,
+                                            initializer=_init_worker,
+                                            initargs=(self.tt_size_mb, self.tablebase_dir))
+        return self.pool
+
+    def submit(self, fens, depth=None, movetime=None, owner=None):
+        """Queue fens for analysis; returns the job id
+
+        depth limits the search depth and movetime (ms) the time per
+        position; the search stops at whichever comes first. Raises
+        ValueError for an empty or oversized batch, a FEN that cannot be
+        read or a bad budget, and AnalysisBusy if owner (any hashable, e.g.
+        a user name) already has max_jobs_per_owner jobs unfinished or the
+        batch would take the queue past max_queued positions.
+        """
+        fens = list(fens)
+        if not fens or len(fens) > self.max_batch:
+            raise ValueError(f"a batch needs 1 to {self.max_batch} positions")
+        for number, fen in enumerate(fens, 1):
+            try:
+                position_from_fen(fen)
+            except ValueError as e:
+                raise ValueError(f"position {number}: {e}") from None
+        if depth is not None and not 1 <= depth <= MAX_DEPTH:
+            raise ValueError(f"depth must be between 1 and {MAX_DEPTH}")
+        if movetime is not None and movetime <= 0:
+            raise ValueError("movetime must be positive")
+        with self._lock:
+            self._expire()
+            running = [job for job in self.jobs.values() if not job.done()]
+            if owner is not None and \
+                    sum(job.owner == owner for job in running) >= self.max_jobs_per_owner:
+                raise AnalysisBusy(f"at most {self.max_jobs_per_owner} unfinished jobs per user")
+            queued = sum(not future.done() for job in running for future in job.futures)
+            if queued + len(fens) > self.max_queued:
+                raise AnalysisBusy("the analysis queue is full, try again later")
+            try:
+                futures = [self._get_pool().submit(analyse_position, fen, depth, movetime)
+                           for fen in fens]
+            except BrokenProcessPool:
+                # A worker died earlier: start a fresh pool and queue again
+                self.pool = None
+                futures = [self._get_pool().submit(analyse_position, fen, depth, movetime)
+                           for fen in fens]
+            job = Job(fens, futures, owner)
+            self.jobs[job.id] = job
+        return job.id
+
+    def _expire(self):
+        cutoff = time.time() - JOB_TTL
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.done() and job.finished < cutoff]:
+            del self.jobs[job_id]
+
+    def _job(self, job_id, owner):
+        job = self.jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def status(self, job_id, results=True, owner=None):
+        """Progress of a job as a dict, or None for an unknown or expired id
+
+        results lists one entry per submitted FEN, in order, with None for
+        positions not analysed yet. With owner, another owner's job counts
+        as unknown.
+        """
+        job = self._job(job_id, owner)
+        if job is None:
+            return None
+        completed = sum(future.done() for future in job.futures)
+        status = {'id': job.id, 'state': 'done' if job.done() else 'running' if completed else 'queued',
+                  'total': len(job.futures), 'completed': completed}
+        if results:
+            status['results'] = [_result(future, fen) for future, fen in zip(job.futures, job.fens)]
+        return status
+
+    def wait(self, job_id, timeout=None):
+        """Results of a job once it has finished (or timeout seconds have passed)"""
+        job = self.jobs[job_id]
+        wait(job.futures, timeout)
+        return self.status(job_id)['results']
+
+    def cancel(self, job_id, owner=None):
+        """Drop the positions of a job not started yet; False for an unknown id
+
+        With owner, another owner's job counts as unknown.
+        """
+        job = self._job(job_id, owner)
+        if job is None:
+            return False
+        for future in job.futures:
+            future.cancel()
+        return True
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+
+def game_positions(start_fen, moves):
+    """FENs of a game's positions, from the start to after the last move
+
+    Raises ValueError on a stored move that is not legal.
+    """
+    position = position_from_fen(start_fen or STARTING_FEN)
+    fens = []
+    for _ in replay(position, moves):
+        fens.append(position_to_fen(position))
+    fens.append(position_to_fen(position))
+    return fens
+
+
+def _analysis_row(game_id, ply, result):
+    """game_analysis row for a result, its score turned to White's point of view"""
+    score = result['score']
+    sign = 1 if result['fen'].split()[1] == 'w' else -1
+    cp = score['cp'] * sign if 'cp' in score else None
+    mate = score['mate'] * sign if 'mate' in score else None
+    return (game_id, ply, result['depth'], cp, mate, result['bestmove'], ' '.join(result['pv']))
+
+
+def annotate_games(conn, service, depth=None, movetime=None, max_games=None,
+                   games_per_job=GAMES_PER_JOB, log=None):
+    """Analyse every position of the games without annotations yet
+
+    Games go to the service a job of games_per_job at a time, the next job
+    queued before the previous one's results are written, so the workers
+    never wait for the database. Each job's rows are committed together;
+    an interrupted run resumes with the first game left unannotated.
+    Returns the number of games annotated.
+    """
+    conn.execute(SCHEMA[0])
+    queued = annotated = 0
+    last_id = 0
+    pending = None
+    while True:
+        job = None
+        limit = games_per_job if max_games is None else min(games_per_job, max_games - queued)
+        if limit > 0:
+            job, last_id = _queue_games(conn, service, last_id, limit, depth, movetime, log)
+        if job:
+            queued += len(job[1])
+        if pending:
+            _write_annotations(conn, service, *pending)
+            annotated += len(pending[1])
+            if log:
+                log(f"{annotated} games annotated")
+        if job is None:
+            return annotated
+        pending = job
+
+
+def _queue_games(conn, service, last_id, limit, depth, movetime, log):
+    """Submit the positions of up to limit unannotated games after last_id
+
+    Returns ((job id, [(game id, positions)]) or None, the last id read).
+    """
+    while True:
+        rows = conn.execute(_UNANNOTATED, (last_id, limit)).fetchall()
+        if not rows:
+            return None, last_id
+        games = []
+        fens = []
+        for row in rows:
+            last_id = row['id']
+            try:
+                positions = game_positions(row['start_fen'], unpack_moves(row['moves'] or b''))
+            except ValueError as e:
+                if log:
+                    log(f"game {row['id']} not annotated: {e}")
+                continue
+            games.append((row['id'], len(positions)))
+            fens.extend(positions)
+        if games:
+            return (service.submit(fens, depth, movetime), games), last_id
+
+
+def _write_annotations(conn, service, job_id, games):
+    results = iter(service.wait(job_id))
+    rows = []
+    for game_id, positions in games:
+        for ply in range(positions):
+            result = next(results)
+            if 'error' not in result:
+                rows.append(_analysis_row(game_id, ply, result))
+    with conn:
+        conn.executemany(_INSERT_ANALYSIS, rows)
+
+
+def main(argv=None):
+    import argparse
+    import json
+    from .db import connect
+
+    parser = argparse.ArgumentParser(description="Batch position analysis")
+    parser.add_argument('--depth', type=int)
+    parser.add_argument('--movetime', type=int, help="milliseconds per position")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--hash', type=int, default=16, help="transposition table MB per worker")
+    commands = parser.add_subparsers(dest='command', required=True)
+    positions = commands.add_parser('fen', help="analyse FENs, printing one JSON result per line")
+    positions.add_argument('fens', nargs='+')
+    annotate = commands.add_parser('annotate', help="annotate stored games")
+    annotate.add_argument('-d', '--database', default=DEFAULT_PATH)
+    annotate.add_argument('--max-games', type=int)
+    args = parser.parse_args(argv)
+
+    service = AnalysisService(args.workers, args.hash)
+    try:
+        if args.command == 'fen':
+            for result in service.wait(service.submit(args.fens, args.depth, args.movetime)):
+                print(json.dumps(result))
+        else:
+            conn = connect(args.database)
+            try:
+                count = annotate_games(conn, service, args.depth, args.movetime, args.max_games,
+                                       log=print)
+            finally:
+                conn.close()
+            print(f"annotated {count} games")
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Engine thinking off the GUI thread.
+
+BackgroundSearch owns one worker thread. Each job runs there and its result
+is posted to a queue that the main loop polls once per frame, so drawing
+and input never wait for the search. Every job gets an id; stopping or
+replacing a job makes its result stale and it is dropped instead of being
+delivered.
+"""
+
+import queue
+import threading
+
+
+class BackgroundSearch:
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self.results = queue.Queue()
+        self._lock = threading.Lock()
+        self._job_id = 0
+        self._timer = None
+        self._thread = threading.Thread(target=self._run, name='engine', daemon=True)
+        self._thread.start()
+
+    def start(self, job, timer=None):
+        """Run job() on the worker; timer (a TimeManager) lets stop() cut it short"""
+        with self._lock:
+            self._cancel()
+            self._job_id += 1
+            self._timer = timer
+            self._jobs.put((self._job_id, job, timer))
+            return self._job_id
+
+    def stop(self):
+        """Abandon the running job; its result will not be delivered"""
+        with self._lock:
+            self._cancel()
+            self._job_id += 1
+
+    def _cancel(self):
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+
+    def poll(self):
+        """(job id, result) of the latest job if it has finished, else None"""
+        while True:
+            try:
+                job_id, result = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            with self._lock:
+                if job_id == self._job_id:
+                    self._timer = None
+                    return job_id, result
+
+    def close(self, timeout=1.0):
+        self.stop()
+        self._jobs.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                return
+            job_id, job, timer = item
+            if timer is not None and timer.stopped:
+                continue  # cancelled before it started
+            try:
+                result = job()
+            except Exception as e:  # keep the worker alive for the next job
+                print(f"Engine error: {e!r}")
+                result = None
+            self.results.put((job_id, result))
@@ -0,0 +1,101 @@
+"""
+Depth against latency, from search statistics.
+
+`run` searches a fixed set of positions to each depth asked for, with a
+fresh engine per position, and prints one line per depth: mean and worst
+time, mean nodes, nodes per second, effective branching factor and the
+cutoff and table hit rates. `summary` prints the same table from the
+JSON lines an engine writes with stats_file set (or the UCI StatsFile
+option), grouped by depth limit. ChessAI searches difficulty + 1 plies,
+so the rows map straight onto difficulty levels.
+
+    python -m chess_engine.bench run --depths 2 3 4 5
+    python -m chess_engine.bench summary stats.jsonl
+"""
+
+import json
+import sys
+from collections import defaultdict
+
+from .engine import Engine
+from .fen import STARTING_FEN, position_from_fen
+from .timeman import TimeManager
+
+BENCH_FENS = [
+    STARTING_FEN,
+    'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1',
+]
+
+
+def run(depths, fens=BENCH_FENS, tt_size_mb=16):
+    """stats() records of searching every fen to every depth"""
+    records = []
+    for depth in depths:
+        for fen in fens:
+            engine = Engine(tt_size_mb, book_path=None, tablebase_dir=None)
+            position = position_from_fen(fen)
+            engine.think(position, TimeManager(), depth)
+            records.append({'fen': fen, 'max_depth': depth, **engine.stats()})
+            engine.close()
+    return records
+
+
+def _mean(values):
+    values = [value for value in values if value is not None]
+    return sum(values) / len(values) if values else 0
+
+
+def table(records):
+    """Lines of a per-depth-limit summary of stats records"""
+    groups = defaultdict(list)
+    for record in records:
+        groups[record['max_depth']].append(record)
+    lines = [f"{'depth':>5} {'moves':>5} {'avg ms':>8} {'max ms':>8} {'nodes':>9} {'nps':>7} "
+             f"{'ebf':>5} {'1st cut':>7} {'tt hit':>6}"]
+    for depth in sorted(groups):
+        group = groups[depth]
+        nodes = sum(record['nodes'] for record in group)
+        time = sum(record['time'] for record in group)
+        lines.append(f"{depth:>5} {len(group):>5} {time / len(group):>8.0f} "
+                     f"{max(record['time'] for record in group):>8.0f} {nodes / len(group):>9.0f} "
+                     f"{nodes * 1000 / time if time else 0:>7.0f} "
+                     f"{_mean(record['ebf'] for record in group):>5.2f} "
+                     f"{_mean(record['first_move_cutoff_rate'] for record in group):>7.3f} "
+                     f"{_mean(record['tt_hit_rate'] for record in group):>6.3f}")
+    return lines
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search depth against latency")
+    commands = parser.add_subparsers(dest='command', required=True)
+    bench = commands.add_parser('run', help="search the bench positions to each depth")
+    bench.add_argument('--depths', type=int, nargs='+', default=[2, 3, 4])
+    bench.add_argument('--fen', action='append', help="position to search instead of the bench set")
+    bench.add_argument('--hash', type=int, default=16)
+    bench.add_argument('--json', help="also write the stats records to this file")
+    summary = commands.add_parser('summary', help="summarise a stats file")
+    summary.add_argument('stats_file')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        records = run(args.depths, args.fen or BENCH_FENS, args.hash)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+    else:
+        with open(args.stats_file, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    for line in table(records):
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
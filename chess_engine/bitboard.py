@@ -0,0 +1,159 @@
+"""
+Bitboard primitives for the chess engine.
+
+Squares are numbered a1=0 .. h8=63 (rank * 8 + file). The GUI uses (row, col)
+with row 0 at the top of the screen (rank 8); use square()/row_col() to
+convert between the two.
+"""
+
+# Colors and piece types (index into Position.pieces as color * 6 + piece type)
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+FULL = (1 << 64) - 1
+BB_SQUARES = [1 << sq for sq in range(64)]
+FILES = [0x0101010101010101 << f for f in range(8)]
+RANKS = [0xFF << (8 * r) for r in range(8)]
+FILE_A, FILE_H = FILES[0], FILES[7]
+
+SQUARE_NAMES = [f + r for r in '12345678' for f in 'abcdefgh']
+
+
+def square(row, col):
+    """Convert a GUI (row, col) coordinate into a square index"""
+    return (7 - row) * 8 + col
+
+
+def row_col(sq):
+    """Convert a square index into a GUI (row, col) coordinate"""
+    return 7 - (sq >> 3), sq & 7
+
+
+def lsb(bb):
+    """Index of the least significant set bit"""
+    return (bb & -bb).bit_length() - 1
+
+
+def msb(bb):
+    """Index of the most significant set bit"""
+    return bb.bit_length() - 1
+
+
+def pop_count(bb):
+    return bb.bit_count()
+
+
+def iter_squares(bb):
+    """Yield the index of every set bit, lowest first"""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _step_table(offsets):
+    table = []
+    for sq in range(64):
+        rank, file = sq >> 3, sq & 7
+        bb = 0
+        for dr, df in offsets:
+            r, f = rank + dr, file + df
+            if 0 <= r < 8 and 0 <= f < 8:
+                bb |= 1 << (r * 8 + f)
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table([(2, 1), (2, -1), (-2, 1), (-2, -1),
+                              (1, 2), (1, -2), (-1, 2), (-1, -2)])
+KING_ATTACKS = _step_table([(1, 0), (-1, 0), (0, 1), (0, -1),
+                            (1, 1), (1, -1), (-1, 1), (-1, -1)])
+# PAWN_ATTACKS[color][sq] = squares a pawn of that color on sq attacks
+PAWN_ATTACKS = [_step_table([(1, 1), (1, -1)]), _step_table([(-1, 1), (-1, -1)])]
+
+# Ray directions as (rank delta, file delta). The first four move towards
+# higher square indices, the last four towards lower ones.
+ROOK_DIRECTIONS = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+BISHOP_DIRECTIONS = [(1, 1), (1, -1), (-1, -1), (-1, 1)]
+
+
+def _ray(sq, dr, df):
+    rank, file = sq >> 3, sq & 7
+    bb = 0
+    r, f = rank + dr, file + df
+    while 0 <= r < 8 and 0 <= f < 8:
+        bb |= 1 << (r * 8 + f)
+        r, f = r + dr, f + df
+    return bb
+
+
+RAYS = {d: [_ray(sq, *d) for sq in range(64)]
+        for d in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+
+# Squares strictly between two squares on a shared line (0 if not aligned)
+BETWEEN = [[0] * 64 for _ in range(64)]
+# Full line through two aligned squares, edge to edge (0 if not aligned)
+LINE = [[0] * 64 for _ in range(64)]
+for _d, _rays in RAYS.items():
+    _opposite = RAYS[(-_d[0], -_d[1])]
+    for _a in range(64):
+        for _b in iter_squares(_rays[_a]):
+            BETWEEN[_a][_b] = _rays[_a] & ~_rays[_b] & ~BB_SQUARES[_b]
+            LINE[_a][_b] = _rays[_a] | _opposite[_a] | BB_SQUARES[_a]
+
+
+def _slide(sq, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            # Positive directions hit the lowest blocker first
+            first = lsb(blockers) if d > (0, 0) else msb(blockers)
+            ray ^= RAYS[d][first]
+        attacks |= ray
+    return attacks
+
+
+def _relevance_mask(sq, directions):
+    # Edge squares never change the attack set, so leave them out of the key
+    mask = 0
+    for d in directions:
+        for target in iter_squares(RAYS[d][sq]):
+            if RAYS[d][target]:
+                mask |= BB_SQUARES[target]
+    return mask
+
+
+ROOK_MASKS = [_relevance_mask(sq, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_MASKS = [_relevance_mask(sq, BISHOP_DIRECTIONS) for sq in range(64)]
+
+# Attack sets keyed by the relevant occupancy bits. Entries are filled on
+# first use, so import stays cheap and the tables only hold occupancies that
+# actually occur in play.
+_ROOK_TABLE = [{} for _ in range(64)]
+_BISHOP_TABLE = [{} for _ in range(64)]
+
+
+def rook_attacks(sq, occupied):
+    key = occupied & ROOK_MASKS[sq]
+    table = _ROOK_TABLE[sq]
+    try:
+        return table[key]
+    except KeyError:
+        attacks = table[key] = _slide(sq, key, ROOK_DIRECTIONS)
+        return attacks
+
+
+def bishop_attacks(sq, occupied):
+    key = occupied & BISHOP_MASKS[sq]
+    table = _BISHOP_TABLE[sq]
+    try:
+        return table[key]
+    except KeyError:
+        attacks = table[key] = _slide(sq, key, BISHOP_DIRECTIONS)
+        return attacks
+
+
+def queen_attacks(sq, occupied):
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
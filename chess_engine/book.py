@@ -0,0 +1,192 @@
+"""
+Precompiled opening book.
+
+The book is a binary file of (position hash, move, weight) entries sorted
+by hash, so a lookup is a binary search over a memory-mapped file and
+nothing is loaded into Python objects at startup.
+
+File layout (little-endian): an 8 byte header (magic b'CBK1', uint32 entry
+count) followed by 16 byte entries (uint64 Zobrist key, uint16 move,
+uint16 weight, uint32 reserved), ordered by key then descending weight.
+
+Build a book from PGN files or plain move lists with
+
+    python -m chess_engine.book build games.pgn lines.txt -o chess_book.bin
+
+Plain text sources hold one line per game: moves in UCI or SAN separated by
+spaces, optionally preceded by a FEN and '|' to start from another position.
+"""
+
+import mmap
+import os
+import random
+import struct
+import sys
+
+from .fen import STARTING_FEN, position_from_fen
+from .moves import move_to_uci
+from .pgn import iter_pgn_games
+from .san import parse_move
+
+MAGIC = b'CBK1'
+HEADER = struct.Struct('<4sI')
+ENTRY = struct.Struct('<QHHI')
+_KEY = struct.Struct('<Q')
+
+DEFAULT_MAX_PLY = 20
+
+
+def iter_sources(paths):
+    """Yield (FEN, move tokens) for every game in the given files"""
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            if path.lower().endswith('.pgn'):
+                for headers, moves in iter_pgn_games(f):
+                    yield headers.get('FEN', STARTING_FEN), moves
+                continue
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if '|' in line:
+                    fen, moves = line.split('|', 1)
+                    yield fen.strip(), moves.split()
+                else:
+                    yield STARTING_FEN, line.split()
+
+
+def build_book(paths, output, max_ply=DEFAULT_MAX_PLY, min_count=1):
+    """Compile games into a book file; returns (games read, entries written)"""
+    counts = {}
+    games = 0
+    for fen, tokens in iter_sources(paths):
+        try:
+            position = position_from_fen(fen)
+        except ValueError:
+            continue
+        games += 1
+        for token in tokens[:max_ply]:
+            try:
+                move = parse_move(position, token)
+            except ValueError:
+                break  # keep the moves up to the first unreadable one
+            key = (position.hash, move)
+            counts[key] = counts.get(key, 0) + 1
+            position.push(move)
+
+    entries = sorted(((key, move, min(count, 0xFFFF))
+                      for (key, move), count in counts.items() if count >= min_count),
+                     key=lambda entry: (entry[0], -entry[2]))
+
+    # Write next to the target and rename, so readers never see a partial file
+    temp_path = output + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        for key, move, weight in entries:
+            f.write(ENTRY.pack(key, move, weight, 0))
+    os.replace(temp_path, output)
+    return games, len(entries)
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            if os.fstat(self._file.fileno()).st_size < HEADER.size:
+                raise ValueError(f"Not an opening book: {path}")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            self._file.close()
+            raise
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or HEADER.size + self.count * ENTRY.size > len(self._map):
+            self.close()
+            raise ValueError(f"Not an opening book: {path}")
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _key_at(self, index):
+        return _KEY.unpack_from(self._map, HEADER.size + index * ENTRY.size)[0]
+
+    def entries(self, key):
+        """(move, weight) pairs stored for a position hash"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = []
+        while lo < self.count:
+            entry_key, move, weight, _ = ENTRY.unpack_from(self._map, HEADER.size + lo * ENTRY.size)
+            if entry_key != key:
+                break
+            result.append((move, weight))
+            lo += 1
+        return result
+
+    def probe(self, position, rng=random, best=False):
+        """A book move for position (weighted random, or the heaviest), or None"""
+        entries = self.entries(position.hash)
+        if not entries:
+            return None
+        # Guard against hash collisions: only hand back legal moves
+        legal = set(position.generate_legal_moves())
+        entries = [(move, weight) for move, weight in entries if move in legal]
+        if not entries:
+            return None
+        if best:
+            return entries[0][0]
+        total = sum(weight for _, weight in entries)
+        pick = rng.uniform(0, total)
+        for move, weight in entries:
+            pick -= weight
+            if pick <= 0:
+                return move
+        return entries[-1][0]
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Opening book tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="compile PGN / move list files into a book")
+    build.add_argument('sources', nargs='+')
+    build.add_argument('-o', '--output', default='chess_book.bin')
+    build.add_argument('--max-ply', type=int, default=DEFAULT_MAX_PLY)
+    build.add_argument('--min-count', type=int, default=1,
+                       help="drop moves seen fewer times than this")
+    probe = commands.add_parser('probe', help="list book moves for a position")
+    probe.add_argument('book')
+    probe.add_argument('--fen', default=STARTING_FEN)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        games, entries = build_book(args.sources, args.output, args.max_ply, args.min_count)
+        print(f"{games} games -> {entries} entries in {args.output}")
+    else:
+        with OpeningBook(args.book) as book:
+            position = position_from_fen(args.fen)
+            for move, weight in book.entries(position.hash):
+                print(f"{move_to_uci(move)} {weight}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
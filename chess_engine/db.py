@@ -0,0 +1,116 @@
+"""
+Shared SQLite connection handling.
+
+connect() opens a connection in WAL mode with the pragmas below: readers
+never block on the writer, and a writer that finds the database locked
+waits for up to busy_timeout instead of failing. Each connection keeps a
+cache of prepared statements, so queries are only compiled once per
+connection.
+
+ConnectionPool hands out such connections, one thread at a time, and
+takes them back for the next caller, so a request pays neither the
+connect and pragma setup nor the statement preparation again.
+
+migrate() brings a database's schema up to date from a list of numbered
+steps; the number applied so far is kept in PRAGMA user_version.
+"""
+
+import queue
+import sqlite3
+from contextlib import contextmanager
+
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',  # with WAL, only a power loss can drop the last commits
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA foreign_keys = ON',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -8000',    # 8 MB page cache per connection
+)
+CACHED_STATEMENTS = 256
+POOL_SIZE = 8
+
+
+def connect(path, check_same_thread=True):
+    """Connection to path with the pragmas applied and rows as sqlite3.Row"""
+    conn = sqlite3.connect(path, cached_statements=CACHED_STATEMENTS,
+                           check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def migrate(conn, migrations):
+    """Apply the steps of migrations past the database's user_version
+
+    Each step is a sequence of SQL statements or a callable taking the
+    connection; it runs in its own write transaction together with the
+    version bump, so a failed step leaves the database at the previous
+    version. Returns the resulting version.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number in range(version + 1, len(migrations) + 1):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated while we waited for the lock
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= number:
+                conn.rollback()
+                continue
+            step = migrations[number - 1]
+            if callable(step):
+                step(conn)
+            else:
+                for statement in step:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return max(version, len(migrations))
+
+
+class ConnectionPool:
+    def __init__(self, path, size=POOL_SIZE, migrations=()):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()  # most recently used first: its cache is warm
+        if migrations:
+            with self.connection() as conn:
+                migrate(conn, migrations)
+
+    def acquire(self):
+        """An idle connection, or a new one; use it from one thread, then release it"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        return connect(self.path, check_same_thread=False)
+
+    def release(self, conn):
+        """Return a connection; an open transaction is rolled back"""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._idle.qsize() < self.size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close the idle connections; ones still borrowed close on release"""
+        self.size = 0
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
@@ -0,0 +1,103 @@
+"""
+GUI-free engine: a Searcher with the opening book, endgame tables and
+optional root-parallel search wired in.
+
+ChessAI in chess_game.py and the UCI front end (chess_engine.uci) both
+build on Engine, so neither the match harness nor batch services need
+pygame or Flask.
+
+With stats_file set, every searched move appends a JSON line with the
+position, the move, the depth limit and the search's stats() to that
+file, for comparing depth and latency across settings.
+"""
+
+import json
+import os
+
+from .book import OpeningBook
+from .fen import position_to_fen
+from .moves import move_to_uci
+from .search import Searcher
+from .tablebase import Tablebase
+
+MAX_DEPTH = 64  # depth limit for searches bounded only by time
+
+
+class Engine(Searcher):
+    def __init__(self, tt_size_mb=16, workers=1, book_path='chess_book.bin',
+                 tablebase_dir='tablebases'):
+        super().__init__(tt_size_mb=tt_size_mb)
+        self.tt_size_mb = tt_size_mb
+        self.book = None
+        self.parallel = None
+        self.stats_file = None  # path of a JSON lines file for per-move stats
+        self.open_book(book_path)
+        self.open_tablebase(tablebase_dir)
+        self.set_workers(workers)
+
+    def open_book(self, path):
+        """Use the book at path (memory-mapped; entries are only read when probed)"""
+        if self.book:
+            self.book.close()
+            self.book = None
+        if path and os.path.exists(path):
+            try:
+                self.book = OpeningBook(path)
+            except (OSError, ValueError) as e:
+                print(f"Opening book not loaded: {e}")
+
+    def open_tablebase(self, directory):
+        """Use tables generated with `python -m chess_engine.tablebase generate`"""
+        if self.tablebase:
+            self.tablebase.close()
+        self.tablebase = None
+        self.tablebase_dir = None
+        if directory and os.path.isdir(directory):
+            self.tablebase = Tablebase(directory) or None
+            self.tablebase_dir = directory if self.tablebase else None
+
+    def set_workers(self, workers):
+        """More than one worker splits root moves across a process pool"""
+        if self.parallel:
+            self.parallel.close()
+        self.parallel = None
+        if workers > 1:
+            # multiprocessing is only imported once a pool is wanted
+            from .parallel import ParallelSearch
+            self.parallel = ParallelSearch(workers, self.tt_size_mb, self.tablebase_dir)
+
+    def book_move(self, position):
+        return self.book.probe(position) if self.book else None
+
+    def think(self, position, timer, max_depth=MAX_DEPTH):
+        """Book move for position, else the best move found within timer and max_depth"""
+        self.position = position
+        book_move = self.book_move(position)
+        if book_move is not None:
+            return book_move
+        if self.parallel:
+            best_move = self.parallel.iterative_deepening(self, max_depth, timer)
+        else:
+            best_move = self.iterative_deepening(max_depth, timer)
+        if self.stats_file and best_move is not None:
+            self.dump_stats(position, best_move, max_depth)
+        return best_move
+
+    def dump_stats(self, position, move, max_depth):
+        """Append the last search's stats to stats_file as one JSON line"""
+        record = {'fen': position_to_fen(position), 'move': move_to_uci(move),
+                  'max_depth': max_depth, **self.stats()}
+        with open(self.stats_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def close(self):
+        """Shut down the worker pool and unmap book and tables"""
+        if self.parallel:
+            self.parallel.close()
+            self.parallel = None
+        if self.book:
+            self.book.close()
+            self.book = None
+        if self.tablebase:
+            self.tablebase.close()
+            self.tablebase = None
@@ -0,0 +1,115 @@
+"""
+Forsyth-Edwards Notation (FEN) parsing and serialisation for Position.
+"""
+
+from .bitboard import WHITE, BLACK, PAWN, ROOK, KING, RANKS, SQUARE_NAMES, pop_count
+from .position import (
+    Position, piece_code, CASTLES, CASTLING_ROOKS,
+    WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE,
+)
+
+STARTING_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+_PIECE_LETTERS = 'pnbrqk'
+_CASTLING_LETTERS = [('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE),
+                     ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE)]
+
+
+def position_from_fen(fen):
+    """Build a Position from a FEN string; raises ValueError if it is malformed
+
+    Positions the move generator cannot play from are refused too: a side
+    without exactly one king, pawns on the first or last rank, the side
+    not to move in check, or an en passant square off the capturing rank.
+    """
+    fields = fen.split()
+    if len(fields) < 4:
+        raise ValueError(f"Invalid FEN (expected at least 4 fields): {fen!r}")
+    placement, turn, castling, ep = fields[:4]
+
+    position = Position(empty=True)
+    rows = placement.split('/')
+    if len(rows) != 8:
+        raise ValueError(f"Invalid FEN board (expected 8 ranks): {fen!r}")
+    for i, row in enumerate(rows):
+        rank = 7 - i
+        file = 0
+        for ch in row:
+            if ch.isdigit():
+                file += int(ch)
+                continue
+            piece_type = _PIECE_LETTERS.find(ch.lower())
+            if piece_type < 0 or file > 7:
+                raise ValueError(f"Invalid FEN board: {fen!r}")
+            color = WHITE if ch.isupper() else BLACK
+            position.put_piece(rank * 8 + file, piece_code(color, piece_type))
+            file += 1
+        if file != 8:
+            raise ValueError(f"Invalid FEN rank {row!r}: {fen!r}")
+
+    if any(pop_count(position.pieces[piece_code(color, KING)]) != 1 for color in (WHITE, BLACK)):
+        raise ValueError(f"Invalid FEN (each side needs one king): {fen!r}")
+    if (position.pieces[piece_code(WHITE, PAWN)] | position.pieces[piece_code(BLACK, PAWN)]) \
+            & (RANKS[0] | RANKS[7]):
+        raise ValueError(f"Invalid FEN (pawn on the first or last rank): {fen!r}")
+
+    if turn not in ('w', 'b'):
+        raise ValueError(f"Invalid FEN side to move: {fen!r}")
+    position.set_turn(WHITE if turn == 'w' else BLACK)
+    if position.attackers(position.turn, position.king_square(position.turn ^ 1)):
+        raise ValueError(f"Invalid FEN (the side not to move is in check): {fen!r}")
+
+    rights = 0
+    if castling != '-':
+        for letter, right in _CASTLING_LETTERS:
+            if letter in castling:
+                rights |= right
+    # Drop rights whose king and rook are not on their home squares
+    for color in (WHITE, BLACK):
+        for right, king_from, king_to, *_ in CASTLES[color]:
+            rook_from = CASTLING_ROOKS[king_to][0]
+            if position.squares[king_from] != piece_code(color, KING) \
+                    or position.squares[rook_from] != piece_code(color, ROOK):
+                rights &= ~right
+    position.set_castling(rights)
+
+    if ep != '-':
+        # Behind a pawn that has just made a double step: rank 6 when White
+        # is to move, rank 3 when Black is
+        if ep not in SQUARE_NAMES or ep[1] != ('6' if position.turn == WHITE else '3'):
+            raise ValueError(f"Invalid FEN en passant square: {fen!r}")
+        position.set_ep_square(SQUARE_NAMES.index(ep))
+
+    try:
+        position.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        position.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError:
+        raise ValueError(f"Invalid FEN move counters: {fen!r}")
+    return position
+
+
+def position_to_fen(position):
+    rows = []
+    for rank in range(7, -1, -1):
+        row = ''
+        empty = 0
+        for file in range(8):
+            code = position.squares[rank * 8 + file]
+            if code is None:
+                empty += 1
+                continue
+            if empty:
+                row += str(empty)
+                empty = 0
+            color, piece_type = divmod(code, 6)
+            letter = _PIECE_LETTERS[piece_type]
+            row += letter.upper() if color == WHITE else letter
+        if empty:
+            row += str(empty)
+        rows.append(row)
+
+    castling = ''.join(letter for letter, right in _CASTLING_LETTERS
+                       if position.castling & right) or '-'
+    ep = SQUARE_NAMES[position.ep_square] if position.ep_square is not None else '-'
+    return ' '.join(['/'.join(rows), 'w' if position.turn == WHITE else 'b',
+                     castling, ep, str(position.halfmove_clock), str(position.fullmove_number)])
@@ -0,0 +1,332 @@
+"""
+SQLite game archive with compact move lists.
+
+A game's moves are stored as one BLOB of 16-bit little-endian words, each
+the engine's packed move (from, to, flag), so a 40 move game takes 160
+bytes. Games that start from a set-up position keep its FEN in start_fen;
+the fen column holds the final position. Replaying is pushing the words in
+order, with each one checked against the legal moves.
+
+PGN files are imported and exported one game at a time with batched
+transactions, so archives far larger than memory load in constant space.
+
+    python -m chess_engine.games import games.pgn -d chess_users.db
+    python -m chess_engine.games export archive.pgn -d chess_users.db
+"""
+
+import json
+import sqlite3
+import sys
+import time
+from array import array
+
+from .bitboard import BLACK
+from .fen import STARTING_FEN, position_from_fen, position_to_fen
+from .pgn import RESULTS, ROSTER, format_pgn, iter_pgn_games
+from .san import move_to_san, parse_san
+
+DEFAULT_PATH = 'chess_users.db'
+BATCH_SIZE = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    player1 TEXT NOT NULL,
+    player2 TEXT,
+    fen TEXT NOT NULL,
+    status TEXT DEFAULT 'ongoing',
+    winner TEXT,
+    start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    end_time TIMESTAMP
+)
+"""
+
+# Columns added to the original games table, created on first open
+COLUMNS = [
+    ('start_fen', 'TEXT'),
+    ('moves', "BLOB NOT NULL DEFAULT x''"),
+    ('plies', 'INTEGER NOT NULL DEFAULT 0'),
+    ('result', "TEXT NOT NULL DEFAULT '*'"),
+    ('event', 'TEXT'),
+    ('site', 'TEXT'),
+    ('date', 'TEXT'),
+    ('round', 'TEXT'),
+    ('white_elo', 'INTEGER'),
+    ('black_elo', 'INTEGER'),
+    ('tags', 'TEXT'),
+]
+
+_INSERT_GAME = """
+    INSERT INTO games (player1, player2, fen, status, winner, start_fen, moves, plies,
+                       result, event, site, date, round, white_elo, black_elo, tags)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Once ratings.MIGRATION has added the rated column: a game flagged as
+# already rated, so it never changes its players' ratings. Only games
+# between players known to own their accounts are left for rating.
+_INSERT_UNRATED = """
+    INSERT INTO games (player1, player2, fen, status, winner, start_fen, moves, plies,
+                       result, event, site, date, round, white_elo, black_elo, tags, rated)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+"""
+
+# Headers kept in their own columns rather than in tags
+_COLUMN_HEADERS = {'Event': 'event', 'Site': 'site', 'Date': 'date', 'Round': 'round',
+                   'WhiteElo': 'white_elo', 'BlackElo': 'black_elo'}
+
+
+def pack_moves(moves):
+    """BLOB of 16-bit little-endian move words"""
+    words = array('H', moves)
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return words.tobytes()
+
+
+def unpack_moves(blob):
+    """Move list from a pack_moves BLOB"""
+    words = array('H')
+    words.frombytes(blob)
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return words.tolist()
+
+
+def replay(position, moves):
+    """Play moves on position, yielding each one just before it is pushed
+
+    Raises ValueError on a move that is not legal where it is played.
+    """
+    for move in moves:
+        if move not in position.generate_legal_moves():
+            raise ValueError(f"Illegal stored move {move:#06x} at ply {len(position.stack)}")
+        yield move
+        position.push(move)
+
+
+def _int_or_none(text):
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def _outcome(result, white, black):
+    """(status, winner) columns for a PGN result"""
+    if result == '1-0':
+        return 'finished', white
+    if result == '0-1':
+        return 'finished', black
+    if result == '1/2-1/2':
+        return 'finished', None
+    return 'ongoing', None
+
+
+def create_schema(conn):
+    """Create the games table, or add the archive columns to an older one
+
+    Runs inside the caller's transaction (also usable as a db.migrate step).
+    """
+    conn.execute(SCHEMA)
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(games)')}
+    for name, definition in COLUMNS:
+        if name not in existing:
+            conn.execute(f'ALTER TABLE games ADD COLUMN {name} {definition}')
+
+
+class GameStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            create_schema(self.conn)
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(games)')}
+        self._insert_unrated = _INSERT_UNRATED if 'rated' in columns else _INSERT_GAME
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+
+    def _row(self, headers, start_fen, moves, final_fen):
+        white = headers.get('White') or '?'
+        black = headers.get('Black')
+        result = headers.get('Result', '*')
+        if result not in RESULTS:
+            result = '*'
+        status, winner = _outcome(result, white, black)
+        tags = {name: value for name, value in headers.items()
+                if name not in ROSTER and name not in _COLUMN_HEADERS
+                and name not in ('FEN', 'SetUp')}
+        return (white, black, final_fen, status, winner,
+                None if start_fen == STARTING_FEN else start_fen,
+                pack_moves(moves), len(moves), result,
+                headers.get('Event'), headers.get('Site'), headers.get('Date'),
+                headers.get('Round'), _int_or_none(headers.get('WhiteElo')),
+                _int_or_none(headers.get('BlackElo')), json.dumps(tags) if tags else None)
+
+    def _game_row(self, moves, white, black=None, result='*', start_fen=None, headers=None):
+        headers = dict(headers or {}, White=white, Black=black, Result=result)
+        start_fen = start_fen or STARTING_FEN
+        position = position_from_fen(start_fen)
+        moves = list(replay(position, moves))
+        return self._row(headers, start_fen, moves, position_to_fen(position))
+
+    def add(self, moves, white, black=None, result='*', start_fen=None, headers=None,
+            rated=False):
+        """Store a game from its engine moves; returns its id
+
+        rated leaves the game for ratings.apply_pending; set it only when
+        both players are known to own their accounts (e.g. signed in to the
+        game server), never for local or imported games, whose names
+        anyone could register.
+        """
+        row = self._game_row(moves, white, black, result, start_fen, headers)
+        with self.conn:
+            cursor = self.conn.execute(_INSERT_GAME if rated else self._insert_unrated, row)
+        return cursor.lastrowid
+
+    def add_many(self, games):
+        """Store games given as add() keyword dicts in one transaction; returns the count"""
+        rows = []
+        unrated = []
+        for game in games:
+            game = dict(game)
+            (rows if game.pop('rated', False) else unrated).append(self._game_row(**game))
+        with self.conn:
+            self.conn.executemany(_INSERT_GAME, rows)
+            self.conn.executemany(self._insert_unrated, unrated)
+        return len(rows) + len(unrated)
+
+    def import_pgn(self, lines, batch_size=BATCH_SIZE, log=None):
+        """Stream games from PGN lines into the store in batched transactions
+
+        Games whose moves stop making sense are kept up to the last legal
+        move. Returns (imported, skipped); games with a bad FEN or no moves
+        count as skipped. Imported games never change ratings.
+        """
+        imported = skipped = 0
+        batch = []
+        start = time.time()
+        for headers, tokens in iter_pgn_games(lines):
+            start_fen = headers.get('FEN', STARTING_FEN)
+            try:
+                position = position_from_fen(start_fen)
+            except ValueError:
+                skipped += 1
+                continue
+            moves = []
+            for token in tokens:
+                try:
+                    move = parse_san(position, token)
+                except ValueError:
+                    break
+                position.push(move)
+                moves.append(move)
+            if not moves:
+                skipped += 1
+                continue
+            batch.append(self._row(headers, start_fen, moves, position_to_fen(position)))
+            if len(batch) >= batch_size:
+                with self.conn:
+                    self.conn.executemany(self._insert_unrated, batch)
+                imported += len(batch)
+                batch = []
+                if log:
+                    log(f"{imported} games, {imported / (time.time() - start):.0f}/s")
+        if batch:
+            with self.conn:
+                self.conn.executemany(self._insert_unrated, batch)
+            imported += len(batch)
+        return imported, skipped
+
+    def get(self, game_id):
+        """Game row as a dict with its moves unpacked, or None"""
+        row = self.conn.execute('SELECT * FROM games WHERE id = ?', (game_id,)).fetchone()
+        if row is None:
+            return None
+        game = dict(row)
+        game['moves'] = unpack_moves(game['moves'] or b'')
+        return game
+
+    def pgn(self, row):
+        """PGN text for a games row"""
+        headers = {'White': row['player1'], 'Black': row['player2'] or '?'}
+        for header, column in _COLUMN_HEADERS.items():
+            if row[column] is not None:
+                headers[header] = row[column]
+        if row['tags']:
+            headers.update(json.loads(row['tags']))
+        start_fen = row['start_fen']
+        if start_fen:
+            headers['SetUp'] = '1'
+            headers['FEN'] = start_fen
+        moves = row['moves']
+        if isinstance(moves, bytes):
+            moves = unpack_moves(moves)
+        position = position_from_fen(start_fen or STARTING_FEN)
+        first_move, black_first = position.fullmove_number, position.turn == BLACK
+        sans = [move_to_san(position, move) for move in replay(position, moves)]
+        return format_pgn(headers, sans, row['result'] or '*', first_move, black_first)
+
+    def export_pgn(self, out, player=None, log=None):
+        """Write games (those played by player, if given) to out as PGN; returns the count
+
+        Rows are read from a cursor as they are written, so memory use does
+        not grow with the archive.
+        """
+        if player is None:
+            cursor = self.conn.execute('SELECT * FROM games ORDER BY id')
+        else:
+            cursor = self.conn.execute('SELECT * FROM games WHERE player1 = ? OR player2 = ? '
+                                       'ORDER BY id', (player, player))
+        count = 0
+        for row in cursor:
+            try:
+                out.write(self.pgn(row))
+            except ValueError as e:
+                if log:
+                    log(f"game {row['id']} not exported: {e}")
+                continue
+            count += 1
+            if log and count % BATCH_SIZE == 0:
+                log(f"{count} games")
+        return count
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Game archive tools")
+    parser.add_argument('-d', '--database', default=DEFAULT_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    load = commands.add_parser('import', help="bulk import games from PGN")
+    load.add_argument('pgn')
+    load.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    dump = commands.add_parser('export', help="write stored games as PGN")
+    dump.add_argument('pgn')
+    dump.add_argument('--player')
+    args = parser.parse_args(argv)
+
+    with GameStore(args.database) as store:
+        if args.command == 'import':
+            with open(args.pgn, encoding='utf-8', errors='replace') as f:
+                imported, skipped = store.import_pgn(f, args.batch_size, log=print)
+            print(f"imported {imported}, skipped {skipped}")
+        else:
+            with open(args.pgn, 'w', encoding='utf-8') as f:
+                count = store.export_pgn(f, args.player, log=print)
+            print(f"exported {count} games to {args.pgn}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
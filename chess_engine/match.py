@@ -0,0 +1,394 @@
+"""
+Engine-vs-engine matches with SPRT.
+
+Two UCI engines (by default both `python -m chess_engine.uci`, so two
+checkouts of this repository can be compared) play game pairs from a set
+of openings, each opening once with either colour. Games run concurrently
+in a process pool, one game per worker, and every worker keeps its engine
+processes alive between games. The clock is kept here: an engine that
+lets its time run out, plays an illegal move or stops answering loses.
+
+After every game a sequential probability ratio test compares
+"engine1 is elo0 stronger" against "engine1 is elo1 stronger"; the match
+stops as soon as the log-likelihood ratio leaves its bounds, or when the
+game limit is reached.
+
+    python -m chess_engine.match --engine2 "python /path/to/old/chess_engine/uci.py" \\
+        --tc 10+0.1 --elo0 0 --elo1 10 --games 20000
+"""
+
+import math
+import os
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .bitboard import pop_count
+from .book import iter_sources
+from .fen import STARTING_FEN, position_from_fen, position_to_fen
+from .moves import move_to_uci
+from .pgn import format_pgn
+from .san import move_to_san, parse_move, parse_uci
+
+DEFAULT_ENGINE = f'{sys.executable} -m chess_engine.uci'
+MAX_PLIES = 400       # longer games are adjudicated as draws
+TIME_MARGIN = 0.05    # seconds an engine may overrun its clock (pipe and scheduling lag)
+START_TIMEOUT = 30.0
+
+# Balanced starting lines, played with both colours when no file is given
+OPENINGS = [
+    'e2e4 e7e5 g1f3 b8c6 f1b5 a7a6',
+    'e2e4 e7e5 g1f3 b8c6 f1c4 f8c5',
+    'e2e4 c7c5 g1f3 d7d6 d2d4 c5d4',
+    'e2e4 c7c5 b1c3 b8c6 g2g3 g7g6',
+    'e2e4 e7e6 d2d4 d7d5 b1c3 g8f6',
+    'e2e4 c7c6 d2d4 d7d5 e4e5 c8f5',
+    'd2d4 d7d5 c2c4 e7e6 b1c3 g8f6',
+    'd2d4 d7d5 c2c4 c7c6 g1f3 g8f6',
+    'd2d4 g8f6 c2c4 e7e6 b1c3 f8b4',
+    'd2d4 g8f6 c2c4 g7g6 b1c3 f8g7',
+    'c2c4 e7e5 b1c3 g8f6 g1f3 b8c6',
+    'g1f3 d7d5 g2g3 g8f6 f1g2 c7c6',
+]
+
+
+class UCIClient:
+    """A UCI engine subprocess; lines are read on a thread so waits can time out"""
+
+    def __init__(self, command, options=()):
+        self.command = command
+        self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        text=True, bufsize=1)
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+        self.send('uci')
+        self.wait_for('uciok', START_TIMEOUT)
+        for name, value in options:
+            self.send(f'setoption name {name} value {value}')
+        self.ready()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self.lines.put(line.strip())
+        self.lines.put(None)
+
+    def send(self, line):
+        self.process.stdin.write(line + '\n')
+        self.process.stdin.flush()
+
+    def wait_for(self, prefix, timeout):
+        """The first line starting with prefix; raises TimeoutError"""
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                line = self.lines.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                raise TimeoutError(f"no {prefix!r} from {self.command}") from None
+            if line is None:
+                raise TimeoutError(f"{self.command} exited")
+            if line.startswith(prefix):
+                return line
+
+    def ready(self):
+        self.send('isready')
+        self.wait_for('readyok', START_TIMEOUT)
+
+    def close(self):
+        try:
+            self.send('quit')
+            self.process.wait(1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+def parse_time_control(text):
+    """(base seconds, increment seconds) from text such as 10+0.1 or 60"""
+    base, _, increment = text.partition('+')
+    return float(base), float(increment or 0)
+
+
+def load_openings(paths=(), plies=8):
+    """(FEN, UCI move list) openings from PGN or move-list files, or the built-in lines"""
+    if not paths:
+        return [(STARTING_FEN, line.split()) for line in OPENINGS]
+    openings = []
+    for fen, tokens in iter_sources(paths):
+        try:
+            position = position_from_fen(fen)
+            moves = []
+            for token in tokens[:plies]:
+                move = parse_move(position, token)
+                position.push(move)
+                moves.append(move_to_uci(move))
+        except ValueError:
+            continue
+        openings.append((fen, moves))
+    return openings
+
+
+def _insufficient_material(position):
+    pieces = position.pieces
+    if any(pieces[code] for code in (0, 3, 4, 6, 9, 10)):  # pawns, rooks, queens
+        return False
+    # Bare kings, or a single knight or bishop, cannot mate
+    return pop_count(position.occupied) <= 3
+
+
+# Engine processes of this worker, by (command, options)
+_engines = {}
+
+
+def _engine(spec):
+    client = _engines.get(spec)
+    if client is None or client.process.poll() is not None:
+        client = _engines[spec] = UCIClient(*spec)
+    return client
+
+
+def _drop_engine(spec):
+    client = _engines.pop(spec, None)
+    if client:
+        client.process.kill()
+
+
+def play_game(job):
+    """Play one game in a worker; job is (number, opening, white spec, black spec, tc, max plies)
+
+    Returns (number, result, reason, SAN moves, start FEN, opening moves).
+    """
+    number, (start_fen, opening), white, black, (base, increment), max_plies = job
+    specs = (white, black)
+    engines = [_engine(spec) for spec in specs]
+    for engine in engines:
+        engine.send('ucinewgame')
+        engine.ready()
+
+    position = position_from_fen(start_fen)
+    for text in opening:
+        position.push(parse_uci(position, text))
+    played = list(opening)
+    sans = []
+    seen = {position.hash: 1}
+    clocks = [base, base]
+    result = reason = None
+    while result is None:
+        side = position.turn
+        legal = position.generate_legal_moves()
+        if not legal:
+            if position.in_check():
+                result, reason = ('0-1' if side == 0 else '1-0'), 'checkmate'
+            else:
+                result, reason = '1/2-1/2', 'stalemate'
+            break
+        if position.halfmove_clock >= 100:
+            result, reason = '1/2-1/2', 'fifty moves'
+            break
+        if seen[position.hash] >= 3:
+            result, reason = '1/2-1/2', 'repetition'
+            break
+        if _insufficient_material(position):
+            result, reason = '1/2-1/2', 'insufficient material'
+            break
+        if len(played) >= max_plies:
+            result, reason = '1/2-1/2', 'move limit'
+            break
+
+        engine = engines[side]
+        moves = f" moves {' '.join(played)}" if played else ''
+        engine.send(f'position fen {start_fen}{moves}')
+        engine.send(f'go wtime {int(clocks[0] * 1000)} btime {int(clocks[1] * 1000)} '
+                    f'winc {int(increment * 1000)} binc {int(increment * 1000)}')
+        start = time.perf_counter()
+        try:
+            line = engine.wait_for('bestmove', clocks[side] + TIME_MARGIN)
+        except TimeoutError:
+            _drop_engine(specs[side])  # it may still be thinking; start afresh next game
+            result, reason = ('0-1' if side == 0 else '1-0'), 'time forfeit'
+            break
+        clocks[side] -= time.perf_counter() - start
+        if clocks[side] < -TIME_MARGIN:
+            result, reason = ('0-1' if side == 0 else '1-0'), 'time forfeit'
+            break
+        clocks[side] += increment
+        try:
+            move = parse_uci(position, line.split()[1])
+        except (ValueError, IndexError):
+            result, reason = ('0-1' if side == 0 else '1-0'), 'illegal move'
+            break
+        sans.append(move_to_san(position, move, legal))
+        position.push(move)
+        played.append(move_to_uci(move))
+        seen[position.hash] = seen.get(position.hash, 0) + 1
+    return number, result, reason, sans, start_fen, opening
+
+
+def elo_from_score(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def _score_from_elo(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def sprt_bounds(alpha=0.05, beta=0.05):
+    """(lower, upper) log-likelihood ratio bounds"""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """Log-likelihood ratio of elo1 over elo0 for engine1's results (normal approximation)"""
+    games = wins + draws + losses
+    if not wins or not losses or not games:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = ((wins + draws / 4) / games - score ** 2) / games
+    if variance <= 0:
+        return 0.0
+    score0, score1 = _score_from_elo(elo0), _score_from_elo(elo1)
+    return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def elo_estimate(wins, draws, losses):
+    """(Elo difference, 95% error margin) for engine1"""
+    games = wins + draws + losses
+    if not games:
+        return 0.0, float('inf')
+    score = (wins + draws / 2) / games
+    deviation = math.sqrt(max((wins + draws / 4) / games - score ** 2, 0) / games)
+    low, high = elo_from_score(score - 1.96 * deviation), elo_from_score(score + 1.96 * deviation)
+    return elo_from_score(score), (high - low) / 2
+
+
+def run_match(engine1, engine2, openings, time_control=(10, 0.1), games=1000, workers=None,
+              elo0=0, elo1=10, alpha=0.05, beta=0.05, max_plies=MAX_PLIES, pgn=None, log=print):
+    """Play engine1 against engine2 until SPRT decides or games are played
+
+    engine1 and engine2 are (command, ((option, value), ...)) specs.
+    Returns a dict with the W/D/L counts of engine1, the Elo estimate and
+    the SPRT state ('H1' accepted, 'H0' accepted, or None if undecided).
+    """
+    workers = workers or os.cpu_count() or 1
+    lower, upper = sprt_bounds(alpha, beta)
+    wins = draws = losses = played = 0
+    llr = 0.0
+    decision = None
+    jobs = []
+    for number in range(games):
+        # Each opening is played twice, engine1 taking white first
+        opening = openings[(number // 2) % len(openings)]
+        white, black = (engine1, engine2) if number % 2 == 0 else (engine2, engine1)
+        jobs.append((number, opening, white, black, time_control, max_plies))
+    start = time.time()
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        next_job = 0
+        while decision is None and (pending or next_job < len(jobs)):
+            # Keep only a couple of games queued per worker, so stopping is quick
+            while next_job < len(jobs) and len(pending) < 2 * workers:
+                pending.add(pool.submit(play_game, jobs[next_job]))
+                next_job += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                number, result, reason, sans, start_fen, opening = future.result()
+                engine1_white = number % 2 == 0
+                if result == '1/2-1/2':
+                    draws += 1
+                elif (result == '1-0') == engine1_white:
+                    wins += 1
+                else:
+                    losses += 1
+                played += 1
+                if pgn is not None:
+                    pgn.write(_game_pgn(number, result, reason, sans, start_fen, opening,
+                                        engine1_white))
+                llr = sprt_llr(wins, draws, losses, elo0, elo1)
+                if llr >= upper:
+                    decision = 'H1'
+                elif llr <= lower:
+                    decision = 'H0'
+            if log:
+                elo, margin = elo_estimate(wins, draws, losses)
+                log(f"{played} games +{wins} ={draws} -{losses}  Elo {elo:+.1f} +/- {margin:.1f}  "
+                    f"LLR {llr:.2f} [{lower:.2f}, {upper:.2f}]  {time.time() - start:.0f}s")
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    elo, margin = elo_estimate(wins, draws, losses)
+    return {'games': played, 'wins': wins, 'draws': draws, 'losses': losses,
+            'elo': elo, 'margin': margin, 'llr': llr, 'bounds': (lower, upper),
+            'decision': decision}
+
+
+def _game_pgn(number, result, reason, sans, start_fen, opening, engine1_white):
+    position = position_from_fen(start_fen)
+    opening_sans = []
+    for text in opening:
+        move = parse_uci(position, text)
+        opening_sans.append(move_to_san(position, move))
+        position.push(move)
+    headers = {'Event': 'Engine match', 'Round': str(number + 1),
+               'White': 'engine1' if engine1_white else 'engine2',
+               'Black': 'engine2' if engine1_white else 'engine1',
+               'Termination': reason}
+    if start_fen != STARTING_FEN:
+        headers.update(SetUp='1', FEN=start_fen)
+    first = position_from_fen(start_fen)
+    return format_pgn(headers, opening_sans + sans, result, first.fullmove_number, first.turn == 1)
+
+
+def _options(pairs):
+    options = []
+    for pair in pairs or ():
+        name, _, value = pair.partition('=')
+        options.append((name, value))
+    return tuple(options)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Engine-vs-engine match with SPRT")
+    parser.add_argument('--engine1', default=DEFAULT_ENGINE, help="UCI command of the candidate")
+    parser.add_argument('--engine2', default=DEFAULT_ENGINE, help="UCI command of the baseline")
+    parser.add_argument('--option1', action='append', metavar='NAME=VALUE')
+    parser.add_argument('--option2', action='append', metavar='NAME=VALUE')
+    parser.add_argument('--tc', default='10+0.1', help="seconds per game + increment")
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--openings', nargs='*', default=(), help="PGN or move-list files")
+    parser.add_argument('--opening-plies', type=int, default=8)
+    parser.add_argument('--elo0', type=float, default=0)
+    parser.add_argument('--elo1', type=float, default=10)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--pgn', help="write the games here")
+    args = parser.parse_args(argv)
+
+    openings = load_openings(args.openings, args.opening_plies)
+    if not openings:
+        parser.error("no usable openings")
+    engine1 = (args.engine1, _options(args.option1))
+    engine2 = (args.engine2, _options(args.option2))
+    pgn = open(args.pgn, 'w', encoding='utf-8') if args.pgn else None
+    try:
+        report = run_match(engine1, engine2, openings, parse_time_control(args.tc), args.games,
+                           args.workers, args.elo0, args.elo1, args.alpha, args.beta, pgn=pgn)
+    finally:
+        if pgn:
+            pgn.close()
+    verdict = {'H1': f"engine1 is stronger (elo1={args.elo1:g} accepted)",
+               'H0': f"no gain of elo1 (elo0={args.elo0:g} accepted)",
+               None: "undecided"}[report['decision']]
+    print(f"Final: +{report['wins']} ={report['draws']} -{report['losses']}  "
+          f"Elo {report['elo']:+.1f} +/- {report['margin']:.1f}  LLR {report['llr']:.2f}  {verdict}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Compact integer move encoding.
+
+A move packs into 16 bits: from square (6 bits), to square (6 bits) and a
+4 bit flag describing the kind of move.
+"""
+
+from .bitboard import KNIGHT, BISHOP, ROOK, QUEEN, SQUARE_NAMES
+
+QUIET = 0
+DOUBLE_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EP_CAPTURE = 5
+PROMOTION = 8           # + promoted piece index (0=N, 1=B, 2=R, 3=Q)
+PROMOTION_CAPTURE = 12  # + promoted piece index
+
+PROMOTION_PIECES = [KNIGHT, BISHOP, ROOK, QUEEN]
+_PROMOTION_LETTERS = 'nbrq'
+
+
+def encode_move(from_sq, to_sq, flag=QUIET):
+    return from_sq | (to_sq << 6) | (flag << 12)
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return (move >> 6) & 63
+
+
+def move_flag(move):
+    return move >> 12
+
+
+def is_capture(move):
+    return bool((move >> 12) & CAPTURE)
+
+
+def is_en_passant(move):
+    return move >> 12 == EP_CAPTURE
+
+
+def is_castling(move):
+    return move >> 12 in (KING_CASTLE, QUEEN_CASTLE)
+
+
+def is_promotion(move):
+    return bool((move >> 12) & PROMOTION)
+
+
+def promotion_piece(move):
+    """Piece type a promotion turns into, or None for other moves"""
+    flag = move >> 12
+    if flag & PROMOTION:
+        return PROMOTION_PIECES[flag & 3]
+    return None
+
+
+def move_to_uci(move):
+    """Long algebraic notation, e.g. e2e4 or e7e8q"""
+    text = SQUARE_NAMES[move & 63] + SQUARE_NAMES[(move >> 6) & 63]
+    flag = move >> 12
+    if flag & PROMOTION:
+        text += _PROMOTION_LETTERS[flag & 3]
+    return text
@@ -0,0 +1,70 @@
+"""
+Move ordering for alpha-beta search.
+
+Moves are searched in this order: transposition table move, captures by
+most valuable victim / least valuable attacker (MVV-LVA), the two killer
+moves of the current ply, then quiet moves by history score.
+"""
+
+from .bitboard import PAWN
+from .moves import CAPTURE, EP_CAPTURE, PROMOTION
+
+MAX_PLY = 128
+
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28
+KILLER_SCORES = (1 << 27, (1 << 27) - 1)
+
+# Victim / attacker values indexed by piece type (P, N, B, R, Q, K)
+_ORDER_VALUES = [1, 3, 3, 5, 9, 20]
+
+
+class MoveOrderer:
+    def __init__(self):
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [0] * (2 * 64 * 64)
+
+    def clear(self):
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [0] * (2 * 64 * 64)
+
+    def new_search(self):
+        """Forget killers and fade history so old games don't dominate"""
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [h >> 2 for h in self.history]
+
+    def score(self, position, move, ply, tt_move=0):
+        if move == tt_move:
+            return TT_MOVE_SCORE
+        flag = move >> 12
+        squares = position.squares
+        if flag & CAPTURE:
+            victim = PAWN if flag == EP_CAPTURE else squares[(move >> 6) & 63] % 6
+            attacker = squares[move & 63] % 6
+            return CAPTURE_SCORE + _ORDER_VALUES[victim] * 32 - _ORDER_VALUES[attacker]
+        if flag == PROMOTION + 3:
+            # Queen promotions are as forcing as a capture
+            return CAPTURE_SCORE
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if move == killers[0]:
+                return KILLER_SCORES[0]
+            if move == killers[1]:
+                return KILLER_SCORES[1]
+        return self.history[position.turn * 4096 + (move & 4095)]
+
+    def order(self, position, moves, ply, tt_move=0):
+        """Return moves sorted best first"""
+        score = self.score
+        return sorted(moves, key=lambda m: score(position, m, ply, tt_move), reverse=True)
+
+    def update(self, position, move, ply, depth):
+        """Reward a quiet move that caused a beta cutoff (position = before the move)"""
+        if (move >> 12) & CAPTURE:
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        self.history[position.turn * 4096 + (move & 4095)] += depth * depth
@@ -0,0 +1,174 @@
+"""
+Parallel root search across CPU cores.
+
+Each iteration searches the first (best so far) root move in the calling
+process to get a bound, then splits the remaining root moves across a
+process pool. Workers keep their own Searcher, so their transposition
+tables stay warm from one task to the next. With one worker, or when no
+process pool can be started, the search falls back to the ordinary
+single-process Searcher.
+
+Workers only know the deadline fixed when their task was queued, which is
+no deadline at all for infinite and ponder searches. A shared stop event
+reaches the tasks already running when the search is stopped, its time
+runs out after a ponderhit, or an iteration is abandoned.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .bitboard import WHITE
+from .search import Searcher, FEATURES, INFINITY
+from .tablebase import Tablebase
+from .timeman import TimeManager, SearchTimeout
+
+_worker = None
+_stop_event = None
+_search_id = None  # root search the worker's tables were last aged for
+
+
+def _init_worker(tt_size_mb, tablebase_dir=None, stop_event=None):
+    global _worker, _stop_event
+    _worker = Searcher(tt_size_mb=tt_size_mb)
+    _stop_event = stop_event
+    if tablebase_dir:
+        _worker.tablebase = Tablebase(tablebase_dir) or None
+
+
+def _search_root_move(position, move, depth, alpha, beta, deadline, features, search_id):
+    """Worker task: value of one root move, or None if stopped or out of time first"""
+    global _search_id
+    searcher = _worker
+    if search_id != _search_id:
+        # First task of a new root search here: age the table and ordering
+        # statistics the way Searcher.prepare does
+        searcher.tt.new_search()
+        searcher.orderer.new_search()
+        _search_id = search_id
+    for name, enabled in zip(FEATURES, features):
+        setattr(searcher, name, enabled)
+    searcher.position = position
+    searcher.timer = TimeManager(deadline=deadline, stop_event=_stop_event)
+    searcher.reset_counters()
+    searcher.root_ply = len(position.stack)
+    try:
+        value = searcher.search_move(move, depth, alpha, beta)
+    except SearchTimeout:
+        value = None
+    return move, value, searcher.counters()
+
+
+class ParallelSearch:
+    def __init__(self, workers=None, tt_size_mb=16, tablebase_dir=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.tt_size_mb = tt_size_mb
+        self.tablebase_dir = tablebase_dir
+        self.pool = None
+        self.stop_event = None
+        self.search_id = 0
+
+    def _get_pool(self):
+        if self.pool is None:
+            # spawn avoids forking a process that runs GUI and server threads
+            context = multiprocessing.get_context('spawn')
+            self.stop_event = context.Event()
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=context,
+                                            initializer=_init_worker,
+                                            initargs=(self.tt_size_mb, self.tablebase_dir,
+                                                      self.stop_event))
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.stop_event.set()  # running tasks would otherwise hold up shutdown
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def iterative_deepening(self, searcher, max_depth, timer=None):
+        """Root-split iterative deepening from searcher.position; returns the best move"""
+        if self.workers <= 1:
+            return searcher.iterative_deepening(max_depth, timer)
+        try:
+            pool = self._get_pool()
+        except (OSError, NotImplementedError):
+            # No process support here: stay deterministic and single-process
+            self.workers = 1
+            return searcher.iterative_deepening(max_depth, timer)
+
+        position = searcher.position
+        white_to_move = position.turn == WHITE
+        searcher.prepare(timer)
+        timer = searcher.timer
+        self.search_id += 1
+
+        moves = searcher.root_moves()
+        if not moves:
+            return None
+        best_move = moves[0]
+        root_ply = searcher.root_ply
+
+        for depth in range(1, max_depth + 1):
+            try:
+                first_value = searcher.search_move(moves[0], depth)
+            except SearchTimeout:
+                position.unwind(root_ply)
+                break
+
+            # The rest only need to show they beat the first move
+            if white_to_move:
+                alpha, beta = first_value, INFINITY
+            else:
+                alpha, beta = -INFINITY, first_value
+            snapshot = position.copy()
+            deadline = timer.deadline()
+            features = [getattr(searcher, name) for name in FEATURES]
+            self.stop_event.clear()
+            try:
+                futures = [pool.submit(_search_root_move, snapshot, move, depth, alpha, beta, deadline,
+                                       features, self.search_id)
+                           for move in moves[1:]]
+                results = self._collect(futures, timer)
+            except BrokenProcessPool:
+                self.close()
+                self.workers = 1
+                return searcher.iterative_deepening(max_depth, timer)
+            if results is None:
+                break  # iteration not finished in time
+
+            # Results come back in move order, so ties keep the earlier move
+            iteration_best, iteration_value = moves[0], first_value
+            for move, value, counters in results:
+                searcher.add_counters(counters)
+                if (white_to_move and value > iteration_value) or \
+                   (not white_to_move and value < iteration_value):
+                    iteration_best, iteration_value = move, value
+            best_move = iteration_best
+            searcher.best_value = iteration_value
+            searcher.iteration_done(depth, best_move, iteration_value)
+
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+            if not timer.can_start_iteration():
+                break
+
+        searcher.search_time = timer.elapsed()
+        return best_move
+
+    def _collect(self, futures, timer):
+        """Wait for every task; None if any timed out or the search was stopped
+
+        On the way out the running tasks are stopped and waited for, so none
+        is left searching into the next iteration or search.
+        """
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            if timer.expired() or any(f.result()[1] is None for f in done):
+                self.stop_event.set()
+                for future in pending:
+                    future.cancel()
+                wait(pending)
+                return None
+        return [future.result() for future in futures]
@@ -0,0 +1,123 @@
+"""
+Perft: count the leaf nodes of the legal move tree to a fixed depth.
+
+Used as the correctness and speed gate for the move generator. Run as
+
+    python -m chess_engine.perft --suite              # check reference positions
+    python -m chess_engine.perft --fen "<FEN>" --depth 4 --divide
+    python -m chess_engine.perft --bench              # nodes per second
+"""
+
+import sys
+import time
+
+from .fen import STARTING_FEN, position_from_fen
+from .moves import move_to_uci
+
+# (name, FEN, expected node counts for depth 1, 2, 3, ...)
+REFERENCE_POSITIONS = [
+    ('start', STARTING_FEN, [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('promotions', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('talkchess', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def perft(position, depth):
+    if depth == 0:
+        return 1
+    moves = position.generate_legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.push(move)
+        nodes += perft(position, depth - 1)
+        position.pop()
+    return nodes
+
+
+def divide(position, depth):
+    """Node count below each root move, keyed by UCI move text"""
+    counts = {}
+    for move in position.generate_legal_moves():
+        position.push(move)
+        counts[move_to_uci(move)] = perft(position, depth - 1)
+        position.pop()
+    return counts
+
+
+def run_suite(max_depth=3, out=sys.stdout):
+    """Check every reference position up to max_depth; returns (passed, nodes, seconds)"""
+    passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected in REFERENCE_POSITIONS:
+        position = position_from_fen(fen)
+        for depth, expected_nodes in enumerate(expected[:max_depth], 1):
+            start = time.perf_counter()
+            nodes = perft(position, depth)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            ok = nodes == expected_nodes
+            passed &= ok
+            print(f"{name:<12} depth {depth}: {nodes:>9} "
+                  f"{'ok' if ok else f'FAIL (expected {expected_nodes})'} "
+                  f"{elapsed:7.2f}s", file=out)
+    return passed, total_nodes, total_time
+
+
+def benchmark(depth=4, fen=STARTING_FEN, out=sys.stdout):
+    """Time a single perft run and report nodes per second"""
+    position = position_from_fen(fen)
+    start = time.perf_counter()
+    nodes = perft(position, depth)
+    elapsed = time.perf_counter() - start
+    nps = int(nodes / elapsed) if elapsed else 0
+    print(f"perft {depth}: {nodes} nodes in {elapsed:.2f}s ({nps} nodes/s)", file=out)
+    return nodes, elapsed
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Perft move generator checks")
+    parser.add_argument('--fen', default=STARTING_FEN, help="position to search")
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--divide', action='store_true', help="show counts per root move")
+    parser.add_argument('--suite', action='store_true', help="check the reference positions")
+    parser.add_argument('--bench', action='store_true', help="report nodes per second")
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        passed, nodes, seconds = run_suite(args.depth)
+        nps = int(nodes / seconds) if seconds else 0
+        print(f"{'PASSED' if passed else 'FAILED'}: {nodes} nodes in {seconds:.2f}s ({nps} nodes/s)")
+        return 0 if passed else 1
+    if args.bench:
+        benchmark(args.depth, args.fen)
+        return 0
+
+    position = position_from_fen(args.fen)
+    if args.divide:
+        counts = divide(position, args.depth)
+        for move in sorted(counts):
+            print(f"{move}: {counts[move]}")
+        print(f"\nMoves: {len(counts)}\nNodes: {sum(counts.values())}")
+    else:
+        start = time.perf_counter()
+        nodes = perft(position, args.depth)
+        print(f"Nodes: {nodes} ({time.perf_counter() - start:.2f}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
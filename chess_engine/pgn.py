@@ -0,0 +1,117 @@
+"""
+Streaming Portable Game Notation (PGN) reading and writing.
+
+Games are read one at a time from any iterable of lines, and written one
+at a time, so files far larger than memory can be processed.
+"""
+
+import re
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+# The Seven Tag Roster, written first and in this order
+ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+LINE_LENGTH = 79
+
+_HEADER = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+_COMMENT = re.compile(r'\{[^}]*\}')
+_MOVE_NUMBER = re.compile(r'^\d+\.+')
+
+
+def _strip_variations(text):
+    depth = 0
+    out = []
+    for ch in text:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth = max(0, depth - 1)
+        elif not depth:
+            out.append(ch)
+    return ''.join(out)
+
+
+def _unescape(value):
+    return value.replace('\\"', '"').replace('\\\\', '\\') if '\\' in value else value
+
+
+def movetext_tokens(text):
+    """SAN move tokens of a movetext section (comments, variations, NAGs removed)"""
+    text = _strip_variations(_COMMENT.sub(' ', text))
+    tokens = []
+    for token in text.split():
+        token = _MOVE_NUMBER.sub('', token)
+        if not token or token.startswith('$') or token in RESULTS:
+            continue
+        tokens.append(token)
+    return tokens
+
+
+def iter_pgn_games(lines):
+    """Yield (headers, SAN move list) for every game in an iterable of lines"""
+    headers = {}
+    movetext = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        match = _HEADER.match(line)
+        if match:
+            if movetext:
+                # A header after movetext starts the next game
+                yield headers, movetext_tokens(' '.join(movetext))
+                headers, movetext = {}, []
+            headers[match.group(1)] = _unescape(match.group(2))
+            continue
+        if ';' in line and '{' not in line:
+            # Rest-of-line comment
+            line = line.split(';', 1)[0].strip()
+            if not line:
+                continue
+        movetext.append(line)
+        if line.split()[-1] in RESULTS:
+            yield headers, movetext_tokens(' '.join(movetext))
+            headers, movetext = {}, []
+    if movetext or headers:
+        yield headers, movetext_tokens(' '.join(movetext))
+
+
+def _tag(name, value):
+    value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'[{name} "{value}"]'
+
+
+def format_pgn(headers, san_moves, result='*', first_move=1, black_first=False):
+    """PGN text of one game, ending in a blank line
+
+    first_move is the move number of the first move and black_first says
+    that it is Black's, for games set up from a FEN.
+    """
+    headers = dict(headers)
+    headers['Result'] = result
+    lines = [_tag(name, headers.get(name, '?')) for name in ROSTER]
+    lines += [_tag(name, value) for name, value in headers.items() if name not in ROSTER]
+    lines.append('')
+
+    tokens = []
+    number = first_move
+    white = not black_first
+    for i, san in enumerate(san_moves):
+        if white:
+            tokens.append(f'{number}.')
+        elif i == 0:
+            tokens.append(f'{number}...')
+        tokens.append(san)
+        if not white:
+            number += 1
+        white = not white
+    tokens.append(result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = f'{line} {token}' if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,526 @@
+"""
+Bitboard position: one 64-bit integer per piece type and color, plus
+occupancy sets and a square-indexed mailbox for fast "what is on sq" lookups.
+
+push()/pop() make and unmake moves through an undo stack; each record holds
+everything that cannot be recomputed cheaply (captured piece, castling
+rights, en passant square, clocks, hash and evaluation terms).
+"""
+
+from .bitboard import (
+    WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+    FULL, BB_SQUARES, RANKS, BETWEEN, iter_squares, lsb,
+    KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+    rook_attacks, bishop_attacks, queen_attacks,
+)
+from .zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EP_KEYS
+from .evaluation import MG_TABLE, EG_TABLE, PHASE_TABLE
+from .moves import (
+    QUIET, DOUBLE_PUSH, KING_CASTLE, QUEEN_CASTLE, CAPTURE, EP_CAPTURE,
+    PROMOTION, PROMOTION_CAPTURE, PROMOTION_PIECES, encode_move,
+)
+
+BACK_RANK = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
+
+# Castling rights bits
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+
+# Rights kept when a move touches a square (king or rook leaving / captured)
+CASTLING_MASK = [ALL_CASTLING] * 64
+CASTLING_MASK[0] &= ~WHITE_QUEENSIDE
+CASTLING_MASK[7] &= ~WHITE_KINGSIDE
+CASTLING_MASK[4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[56] &= ~BLACK_QUEENSIDE
+CASTLING_MASK[63] &= ~BLACK_KINGSIDE
+CASTLING_MASK[60] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+
+# Per color: (right, king from, king to, squares that must be empty,
+#             squares the king passes that must not be attacked, flag)
+CASTLES = [
+    [(WHITE_KINGSIDE, 4, 6, BB_SQUARES[5] | BB_SQUARES[6], (5, 6), KING_CASTLE),
+     (WHITE_QUEENSIDE, 4, 2, BB_SQUARES[1] | BB_SQUARES[2] | BB_SQUARES[3], (3, 2), QUEEN_CASTLE)],
+    [(BLACK_KINGSIDE, 60, 62, BB_SQUARES[61] | BB_SQUARES[62], (61, 62), KING_CASTLE),
+     (BLACK_QUEENSIDE, 60, 58, BB_SQUARES[57] | BB_SQUARES[58] | BB_SQUARES[59], (59, 58), QUEEN_CASTLE)],
+]
+# Rook (from, to) for a castling move, keyed by the king's destination
+CASTLING_ROOKS = {6: (7, 5), 2: (0, 3), 62: (63, 61), 58: (56, 59)}
+
+
+def piece_code(color, piece_type):
+    return color * 6 + piece_type
+
+
+class Position:
+    def __init__(self, empty=False):
+        self.pieces = [0] * 12          # bitboard per piece code
+        self.occupied_co = [0, 0]       # bitboard per color
+        self.occupied = 0
+        self.squares = [None] * 64      # piece code per square
+        self.king_squares = [None, None]  # cached per color, kept by push/pop
+        self.turn = WHITE
+        self.castling = 0               # castling rights bits
+        self.ep_square = None           # square a pawn may capture en passant onto
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.stack = []                 # undo records, one per pushed move
+        self.hash = 0                   # Zobrist key, updated incrementally
+        self.mg = 0                     # tapered evaluation terms, see evaluation.py
+        self.eg = 0
+        self.phase = 0
+        if not empty:
+            self.reset()
+
+    def reset(self):
+        """Set up the standard starting position"""
+        self.clear()
+        for file, piece_type in enumerate(BACK_RANK):
+            self.put_piece(file, piece_code(WHITE, piece_type))
+            self.put_piece(56 + file, piece_code(BLACK, piece_type))
+            self.put_piece(8 + file, piece_code(WHITE, PAWN))
+            self.put_piece(48 + file, piece_code(BLACK, PAWN))
+        self.set_castling(ALL_CASTLING)
+
+    def clear(self):
+        self.pieces = [0] * 12
+        self.occupied_co = [0, 0]
+        self.occupied = 0
+        self.squares = [None] * 64
+        self.king_squares = [None, None]
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.stack = []
+        self.hash = 0
+        self.mg = self.eg = self.phase = 0
+
+    def copy(self):
+        """Independent copy of the current position (the undo stack is not copied)"""
+        other = Position(empty=True)
+        other.pieces = self.pieces[:]
+        other.occupied_co = self.occupied_co[:]
+        other.occupied = self.occupied
+        other.squares = self.squares[:]
+        other.king_squares = self.king_squares[:]
+        other.turn = self.turn
+        other.castling = self.castling
+        other.ep_square = self.ep_square
+        other.halfmove_clock = self.halfmove_clock
+        other.fullmove_number = self.fullmove_number
+        other.hash = self.hash
+        other.mg, other.eg, other.phase = self.mg, self.eg, self.phase
+        return other
+
+    # Setup helpers (keep hash and evaluation terms in sync)
+
+    def put_piece(self, sq, code):
+        bb = BB_SQUARES[sq]
+        self.pieces[code] |= bb
+        self.occupied_co[code // 6] |= bb
+        self.occupied |= bb
+        self.squares[sq] = code
+        if code % 6 == KING:
+            self.king_squares[code // 6] = sq
+        self.hash ^= PIECE_KEYS[code][sq]
+        self.mg += MG_TABLE[code][sq]
+        self.eg += EG_TABLE[code][sq]
+        self.phase += PHASE_TABLE[code]
+
+    def remove_piece(self, sq):
+        code = self.squares[sq]
+        if code is not None:
+            bb = BB_SQUARES[sq]
+            self.pieces[code] ^= bb
+            self.occupied_co[code // 6] ^= bb
+            self.occupied ^= bb
+            self.squares[sq] = None
+            if code % 6 == KING and self.king_squares[code // 6] == sq:
+                self.king_squares[code // 6] = None
+            self.hash ^= PIECE_KEYS[code][sq]
+            self.mg -= MG_TABLE[code][sq]
+            self.eg -= EG_TABLE[code][sq]
+            self.phase -= PHASE_TABLE[code]
+        return code
+
+    def set_turn(self, color):
+        if color != self.turn:
+            self.turn = color
+            self.hash ^= SIDE_KEY
+
+    def set_castling(self, rights):
+        self.hash ^= CASTLING_KEYS[self.castling] ^ CASTLING_KEYS[rights]
+        self.castling = rights
+
+    def set_ep_square(self, sq):
+        if self.ep_square is not None:
+            self.hash ^= EP_KEYS[self.ep_square & 7]
+        self.ep_square = sq
+        if sq is not None:
+            self.hash ^= EP_KEYS[sq & 7]
+
+    def piece_at(self, sq):
+        """(color, piece type) on a square, or None"""
+        code = self.squares[sq]
+        return None if code is None else divmod(code, 6)
+
+    # Make / unmake
+
+    def push(self, move):
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        flag = move >> 12
+        squares = self.squares
+        pieces = self.pieces
+        occupied_co = self.occupied_co
+        code = squares[from_sq]
+        captured = squares[to_sq]
+        h = self.hash
+        mg, eg, phase = self.mg, self.eg, self.phase
+        castling, ep_square = self.castling, self.ep_square
+        self.stack.append((move, captured, h, mg, eg, phase,
+                           castling, ep_square, self.halfmove_clock))
+
+        from_bb = BB_SQUARES[from_sq]
+        to_bb = BB_SQUARES[to_sq]
+        us = self.turn
+        if captured is not None:
+            pieces[captured] ^= to_bb
+            occupied_co[us ^ 1] ^= to_bb
+            h ^= PIECE_KEYS[captured][to_sq]
+            mg -= MG_TABLE[captured][to_sq]
+            eg -= EG_TABLE[captured][to_sq]
+            phase -= PHASE_TABLE[captured]
+        pieces[code] ^= from_bb
+        h ^= PIECE_KEYS[code][from_sq]
+        mg -= MG_TABLE[code][from_sq]
+        eg -= EG_TABLE[code][from_sq]
+        if flag & PROMOTION:
+            phase -= PHASE_TABLE[code]
+            code = us * 6 + PROMOTION_PIECES[flag & 3]
+            phase += PHASE_TABLE[code]
+        pieces[code] |= to_bb
+        occupied_co[us] ^= from_bb | to_bb
+        squares[from_sq] = None
+        squares[to_sq] = code
+        if code == us * 6 + KING:
+            self.king_squares[us] = to_sq
+        h ^= PIECE_KEYS[code][to_sq]
+        mg += MG_TABLE[code][to_sq]
+        eg += EG_TABLE[code][to_sq]
+
+        # Castling rights and en passant square
+        new_castling = castling & CASTLING_MASK[from_sq] & CASTLING_MASK[to_sq]
+        if new_castling != castling:
+            h ^= CASTLING_KEYS[castling] ^ CASTLING_KEYS[new_castling]
+            self.castling = new_castling
+        if ep_square is not None:
+            h ^= EP_KEYS[ep_square & 7]
+        if flag == DOUBLE_PUSH:
+            ep_square = (from_sq + to_sq) >> 1
+            h ^= EP_KEYS[ep_square & 7]
+            self.ep_square = ep_square
+        else:
+            self.ep_square = None
+
+        if captured is not None or code % 6 == PAWN:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if us == BLACK:
+            self.fullmove_number += 1
+
+        self.occupied = occupied_co[0] | occupied_co[1]
+        self.hash = h ^ SIDE_KEY
+        self.mg, self.eg, self.phase = mg, eg, phase
+        self.turn = us ^ 1
+
+        # Rare moves touch a second piece; the helpers keep hash/eval in sync
+        if flag == EP_CAPTURE:
+            self.remove_piece(to_sq - 8 if us == WHITE else to_sq + 8)
+        elif flag == KING_CASTLE or flag == QUEEN_CASTLE:
+            rook_from, rook_to = CASTLING_ROOKS[to_sq]
+            self.put_piece(rook_to, self.remove_piece(rook_from))
+
+    def pop(self):
+        (move, captured, self.hash, self.mg, self.eg, self.phase,
+         self.castling, self.ep_square, self.halfmove_clock) = self.stack.pop()
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        flag = move >> 12
+        squares = self.squares
+        pieces = self.pieces
+        occupied_co = self.occupied_co
+        them = self.turn
+        us = them ^ 1
+        code = squares[to_sq]
+        from_bb = BB_SQUARES[from_sq]
+        to_bb = BB_SQUARES[to_sq]
+
+        pieces[code] ^= to_bb
+        if flag & PROMOTION:
+            code = us * 6 + PAWN
+        pieces[code] |= from_bb
+        occupied_co[us] ^= from_bb | to_bb
+        if captured is not None:
+            pieces[captured] |= to_bb
+            occupied_co[them] |= to_bb
+        squares[from_sq] = code
+        squares[to_sq] = captured
+        if code == us * 6 + KING:
+            self.king_squares[us] = from_sq
+
+        if flag == EP_CAPTURE:
+            cap_sq = to_sq - 8 if us == WHITE else to_sq + 8
+            cap_bb = BB_SQUARES[cap_sq]
+            pieces[them * 6 + PAWN] |= cap_bb
+            occupied_co[them] |= cap_bb
+            squares[cap_sq] = them * 6 + PAWN
+        elif flag == KING_CASTLE or flag == QUEEN_CASTLE:
+            rook_from, rook_to = CASTLING_ROOKS[to_sq]
+            rook_bb = BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+            pieces[us * 6 + ROOK] ^= rook_bb
+            occupied_co[us] ^= rook_bb
+            squares[rook_from] = squares[rook_to]
+            squares[rook_to] = None
+
+        self.occupied = occupied_co[0] | occupied_co[1]
+        if us == BLACK:
+            self.fullmove_number -= 1
+        self.turn = us
+        return move
+
+    def push_null(self):
+        """Pass the turn without moving (for null-move pruning); undo with pop_null()"""
+        self.stack.append((0, None, self.hash, self.mg, self.eg, self.phase,
+                           self.castling, self.ep_square, self.halfmove_clock))
+        h = self.hash ^ SIDE_KEY
+        if self.ep_square is not None:
+            h ^= EP_KEYS[self.ep_square & 7]
+            self.ep_square = None
+        self.hash = h
+        self.halfmove_clock += 1
+        if self.turn == BLACK:
+            self.fullmove_number += 1
+        self.turn ^= 1
+
+    def pop_null(self):
+        (_, _, self.hash, self.mg, self.eg, self.phase,
+         self.castling, self.ep_square, self.halfmove_clock) = self.stack.pop()
+        self.turn ^= 1
+        if self.turn == BLACK:
+            self.fullmove_number -= 1
+
+    def unwind(self, length):
+        """Undo moves and null moves until length records are left on the stack"""
+        while len(self.stack) > length:
+            if self.stack[-1][0]:
+                self.pop()
+            else:
+                self.pop_null()
+
+    # Attacks
+
+    def attackers(self, color, sq, occupied=None):
+        """Bitboard of color's pieces attacking sq
+
+        Looks outward from the target along knight jumps, pawn diagonals and
+        slider rays instead of generating the attacker's moves.
+        """
+        if occupied is None:
+            occupied = self.occupied
+        pieces = self.pieces
+        base = color * 6
+        queens = pieces[base + QUEEN]
+        return ((PAWN_ATTACKS[color ^ 1][sq] & pieces[base + PAWN])
+                | (KNIGHT_ATTACKS[sq] & pieces[base + KNIGHT])
+                | (KING_ATTACKS[sq] & pieces[base + KING])
+                | (bishop_attacks(sq, occupied) & (pieces[base + BISHOP] | queens))
+                | (rook_attacks(sq, occupied) & (pieces[base + ROOK] | queens)))
+
+    def is_attacked(self, sq, by_color):
+        return bool(self.attackers(by_color, sq))
+
+    def king_square(self, color):
+        return self.king_squares[color]
+
+    def in_check(self):
+        king_sq = self.king_squares[self.turn]
+        return king_sq is not None and bool(self.attackers(self.turn ^ 1, king_sq))
+
+    def pins(self, color, king_sq):
+        """Map of color's pinned pieces to the squares they may still move to"""
+        pieces = self.pieces
+        base = (color ^ 1) * 6
+        queens = pieces[base + QUEEN]
+        snipers = ((rook_attacks(king_sq, 0) & (pieces[base + ROOK] | queens))
+                   | (bishop_attacks(king_sq, 0) & (pieces[base + BISHOP] | queens)))
+        pinned = {}
+        own = self.occupied_co[color]
+        for sniper in iter_squares(snipers):
+            between = BETWEEN[king_sq][sniper]
+            blockers = between & self.occupied
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned[lsb(blockers)] = between | BB_SQUARES[sniper]
+        return pinned
+
+    # Move generation
+
+    def generate_legal_moves(self, captures=False):
+        """Strictly legal moves for the side to move, using check and pin masks
+
+        With captures, only captures and promotions (for quiescence search).
+        """
+        moves = []
+        append = moves.append
+        us = self.turn
+        them = us ^ 1
+        base = us * 6
+        pieces = self.pieces
+        own = self.occupied_co[us]
+        enemy = self.occupied_co[them]
+        occupied = self.occupied
+        allowed = enemy if captures else ~own
+
+        king_sq = self.king_square(us)
+        if king_sq is None:
+            return self.generate_moves()
+
+        # King moves: the king itself must not shield the destination from sliders
+        without_king = occupied ^ BB_SQUARES[king_sq]
+        for to_sq in iter_squares(KING_ATTACKS[king_sq] & allowed):
+            if not self.attackers(them, to_sq, without_king):
+                append(encode_move(king_sq, to_sq, CAPTURE if BB_SQUARES[to_sq] & enemy else QUIET))
+
+        checkers = self.attackers(them, king_sq)
+        if checkers & (checkers - 1):
+            return moves  # double check: only the king may move
+        if checkers:
+            check_mask = BETWEEN[king_sq][lsb(checkers)] | checkers
+        else:
+            check_mask = FULL
+            for right, king_from, king_to, empty, path, flag in () if captures else CASTLES[us]:
+                if self.castling & right and not occupied & empty and king_sq == king_from \
+                        and pieces[base + ROOK] & BB_SQUARES[CASTLING_ROOKS[king_to][0]] \
+                        and not self.attackers(them, path[0]) and not self.attackers(them, path[1]):
+                    append(encode_move(king_from, king_to, flag))
+
+        pinned = self.pins(us, king_sq)
+        self._pawn_moves(moves, us, pieces[base + PAWN], enemy, occupied, check_mask, pinned,
+                         quiet=not captures)
+
+        for piece_type, attacks in ((KNIGHT, None), (BISHOP, bishop_attacks),
+                                    (ROOK, rook_attacks), (QUEEN, queen_attacks)):
+            bb = pieces[base + piece_type]
+            while bb:
+                low = bb & -bb
+                from_sq = low.bit_length() - 1
+                bb ^= low
+                if piece_type == KNIGHT:
+                    targets = KNIGHT_ATTACKS[from_sq]
+                else:
+                    targets = attacks(from_sq, occupied)
+                targets &= allowed & check_mask
+                if from_sq in pinned:
+                    targets &= pinned[from_sq]
+                while targets:
+                    low = targets & -targets
+                    to_sq = low.bit_length() - 1
+                    targets ^= low
+                    append(from_sq | (to_sq << 6) | ((CAPTURE if low & enemy else QUIET) << 12))
+        return moves
+
+    def generate_moves(self, color=None):
+        """Pseudo-legal moves for the side to move (or for the given color)
+
+        Castling and en passant are left out; use generate_legal_moves() to play.
+        """
+        moves = []
+        append = moves.append
+        us = self.turn if color is None else color
+        base = us * 6
+        own = self.occupied_co[us]
+        enemy = self.occupied_co[us ^ 1]
+        occupied = self.occupied
+        pieces = self.pieces
+
+        self._pawn_moves(moves, us, pieces[base + PAWN], enemy, occupied, FULL, {}, ep=False)
+
+        for piece_type, attacks in ((KNIGHT, None), (BISHOP, bishop_attacks),
+                                    (ROOK, rook_attacks), (QUEEN, queen_attacks),
+                                    (KING, None)):
+            bb = pieces[base + piece_type]
+            while bb:
+                low = bb & -bb
+                from_sq = low.bit_length() - 1
+                bb ^= low
+                if piece_type == KNIGHT:
+                    targets = KNIGHT_ATTACKS[from_sq]
+                elif piece_type == KING:
+                    targets = KING_ATTACKS[from_sq]
+                else:
+                    targets = attacks(from_sq, occupied)
+                targets &= ~own
+                while targets:
+                    low = targets & -targets
+                    to_sq = low.bit_length() - 1
+                    targets ^= low
+                    append(from_sq | (to_sq << 6) | ((CAPTURE if low & enemy else QUIET) << 12))
+        return moves
+
+    def _pawn_moves(self, moves, us, pawns, enemy, occupied, check_mask, pinned, ep=True,
+                    quiet=True):
+        append = moves.append
+        if us == WHITE:
+            push_delta, start_rank, last_rank = 8, RANKS[1], RANKS[7]
+        else:
+            push_delta, start_rank, last_rank = -8, RANKS[6], RANKS[0]
+        attack_table = PAWN_ATTACKS[us]
+        ep_square = self.ep_square if ep else None
+
+        for from_sq in iter_squares(pawns):
+            allowed = check_mask & pinned[from_sq] if from_sq in pinned else check_mask
+            to_sq = from_sq + push_delta
+            to_bb = BB_SQUARES[to_sq]
+            if not occupied & to_bb:
+                if allowed & to_bb:
+                    if to_bb & last_rank:
+                        for i in range(4):
+                            append(encode_move(from_sq, to_sq, PROMOTION + i))
+                    elif quiet:
+                        append(from_sq | (to_sq << 6))
+                if quiet and BB_SQUARES[from_sq] & start_rank:
+                    double_sq = to_sq + push_delta
+                    double_bb = BB_SQUARES[double_sq]
+                    if not occupied & double_bb and allowed & double_bb:
+                        append(encode_move(from_sq, double_sq, DOUBLE_PUSH))
+
+            attacks = attack_table[from_sq]
+            for to_sq in iter_squares(attacks & enemy & allowed):
+                if BB_SQUARES[to_sq] & last_rank:
+                    for i in range(4):
+                        append(encode_move(from_sq, to_sq, PROMOTION_CAPTURE + i))
+                else:
+                    append(encode_move(from_sq, to_sq, CAPTURE))
+
+            if ep_square is not None and attacks & BB_SQUARES[ep_square]:
+                # En passant removes two pieces from a line at once, so check
+                # legality by playing it rather than through the masks
+                move = encode_move(from_sq, ep_square, EP_CAPTURE)
+                self.push(move)
+                king_sq = self.king_square(us)
+                if king_sq is None or not self.attackers(us ^ 1, king_sq):
+                    append(move)
+                self.pop()
+
+    def moves_from(self, sq):
+        """Pseudo-legal moves of the piece standing on sq"""
+        code = self.squares[sq]
+        if code is None:
+            return []
+        return [m for m in self.generate_moves(code // 6) if m & 63 == sq]
+
+    def legal_moves_from(self, sq):
+        """Legal moves of the side to move's piece standing on sq"""
+        return [m for m in self.generate_legal_moves() if m & 63 == sq]
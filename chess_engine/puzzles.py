@@ -0,0 +1,261 @@
+"""
+SQLite puzzle store.
+
+Puzzles live in one table indexed by rating and by (length, rating); themes
+go in a puzzle_themes side table keyed by (theme, rating, puzzle id), since
+one puzzle has several themes. A random puzzle in a rating band is found by
+seeking one of those indexes from a random (rating, id) point, so serving a
+puzzle never scans the table.
+
+Every stored puzzle starts with the solver to move, and its moves (UCI,
+space separated) alternate solver and opponent replies.
+
+    python -m chess_engine.puzzles import lichess_db_puzzle.csv -d chess_puzzles.db
+"""
+
+import csv
+import random
+import sqlite3
+import sys
+import time
+
+from .fen import position_from_fen, position_to_fen
+from .san import parse_uci
+
+DEFAULT_PATH = 'chess_puzzles.db'
+BATCH_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS puzzles (
+    id INTEGER PRIMARY KEY,
+    source_id TEXT UNIQUE,
+    fen TEXT NOT NULL,
+    moves TEXT NOT NULL,
+    rating INTEGER NOT NULL DEFAULT 1500,
+    length INTEGER NOT NULL,
+    themes TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_puzzles_rating ON puzzles (rating);
+CREATE INDEX IF NOT EXISTS idx_puzzles_length ON puzzles (length, rating);
+CREATE TABLE IF NOT EXISTS puzzle_themes (
+    theme TEXT NOT NULL,
+    rating INTEGER NOT NULL,
+    puzzle_id INTEGER NOT NULL REFERENCES puzzles (id),
+    PRIMARY KEY (theme, rating, puzzle_id)
+) WITHOUT ROWID;
+"""
+
+_INSERT_PUZZLE = """
+    INSERT OR IGNORE INTO puzzles (id, source_id, fen, moves, rating, length, themes, description)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Skipped when the puzzle itself was a duplicate and never inserted
+_INSERT_THEME = """
+    INSERT OR IGNORE INTO puzzle_themes (theme, rating, puzzle_id)
+    SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM puzzles WHERE id = ? AND rating = ?)
+"""
+
+# CSV header names accepted for each column
+_COLUMNS = {
+    'source_id': ('puzzleid', 'id', 'source_id'),
+    'fen': ('fen',),
+    'moves': ('moves', 'solution'),
+    'rating': ('rating',),
+    'themes': ('themes', 'theme'),
+    'description': ('description',),
+}
+
+
+def check_solution(fen, moves):
+    """Raise ValueError unless fen is readable and moves (UCI) can be played from it"""
+    if not moves:
+        raise ValueError("no solution moves")
+    position = position_from_fen(fen)
+    for move in moves:
+        position.push(parse_uci(position, move))
+
+
+def puzzle_from_row(row):
+    """Puzzle dict from a database row, with the moves split into a list"""
+    puzzle = dict(row)
+    puzzle['solution'] = puzzle['moves'].split()
+    puzzle['themes'] = puzzle['themes'].split()
+    return puzzle
+
+
+class PuzzleStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM puzzles').fetchone()[0]
+
+    def _next_id(self):
+        return (self.conn.execute('SELECT MAX(id) FROM puzzles').fetchone()[0] or 0) + 1
+
+    def _insert(self, rows):
+        """Insert (id, source_id, fen, moves, rating, length, themes, description) rows
+
+        Returns how many were new; duplicates of a stored source_id are skipped.
+        """
+        inserted = self.conn.executemany(_INSERT_PUZZLE, rows).rowcount
+        self.conn.executemany(_INSERT_THEME, [
+            (theme, row[4], row[0], row[0], row[4])
+            for row in rows for theme in row[6].split()
+        ])
+        return inserted
+
+    def add(self, fen, solution, rating=1500, themes=(), description='', source_id=None):
+        """Store one puzzle (solver to move in fen); returns its id
+
+        Raises ValueError for a bad FEN or a solution that is not legal.
+        """
+        check_solution(fen, solution)
+        puzzle_id = self._next_id()
+        with self.conn:
+            self._insert([(puzzle_id, source_id, fen, ' '.join(solution), int(rating),
+                           len(solution), ' '.join(themes), description)])
+        return puzzle_id
+
+    def import_csv(self, lines, batch_size=BATCH_SIZE, opponent_moves_first=None, log=None):
+        """Stream puzzles from CSV lines into the store in batched transactions
+
+        The header row names the columns (Lichess puzzle dumps work as they
+        are). When opponent_moves_first is set, or the file has a PuzzleId
+        column as Lichess dumps do, the first move is the opponent's and is
+        played into the stored FEN. Returns (imported, skipped) row counts;
+        rows with a bad FEN or an illegal solution and already stored source
+        ids count as skipped.
+        """
+        reader = csv.reader(lines)
+        header = [name.strip().lower() for name in next(reader, [])]
+        columns = {}
+        for key, names in _COLUMNS.items():
+            for name in names:
+                if name in header:
+                    columns[key] = header.index(name)
+                    break
+        if 'fen' not in columns or 'moves' not in columns:
+            raise ValueError("CSV needs FEN and Moves columns")
+        if opponent_moves_first is None:
+            opponent_moves_first = 'puzzleid' in header
+
+        def field(row, key, default=''):
+            index = columns.get(key)
+            return row[index].strip() if index is not None and index < len(row) else default
+
+        next_id = self._next_id()
+        imported = skipped = 0
+        batch = []
+        start = time.time()
+        for row in reader:
+            try:
+                fen = field(row, 'fen')
+                moves = field(row, 'moves').split()
+                if opponent_moves_first:
+                    position = position_from_fen(fen)
+                    position.push(parse_uci(position, moves.pop(0)))
+                    fen = position_to_fen(position)
+                check_solution(fen, moves)
+                rating = int(field(row, 'rating', '1500') or 1500)
+            except (ValueError, IndexError):
+                skipped += 1
+                continue
+            batch.append((next_id, field(row, 'source_id') or None, fen, ' '.join(moves), rating,
+                          len(moves), field(row, 'themes'), field(row, 'description')))
+            next_id += 1
+            if len(batch) >= batch_size:
+                with self.conn:
+                    inserted = self._insert(batch)
+                imported += inserted
+                skipped += len(batch) - inserted
+                batch = []
+                if log:
+                    log(f"{imported} puzzles, {imported / (time.time() - start):.0f}/s")
+        if batch:
+            with self.conn:
+                inserted = self._insert(batch)
+            imported += inserted
+            skipped += len(batch) - inserted
+        return imported, skipped
+
+    def get(self, puzzle_id):
+        row = self.conn.execute('SELECT * FROM puzzles WHERE id = ?', (puzzle_id,)).fetchone()
+        return puzzle_from_row(row) if row else None
+
+    def random(self, min_rating=0, max_rating=5000, theme=None, length=None, rng=random):
+        """A random puzzle with min_rating <= rating <= max_rating, or None"""
+        if min_rating > max_rating:
+            return None  # an empty band
+        if theme:
+            sql = ('SELECT puzzle_id FROM puzzle_themes WHERE theme = ? '
+                   'AND (rating, puzzle_id) >= (?, ?) AND rating <= ? '
+                   'ORDER BY rating, puzzle_id LIMIT 1')
+            prefix = (theme,)
+        elif length:
+            sql = ('SELECT id FROM puzzles WHERE length = ? '
+                   'AND (rating, id) >= (?, ?) AND rating <= ? '
+                   'ORDER BY rating, id LIMIT 1')
+            prefix = (length,)
+        else:
+            sql = ('SELECT id FROM puzzles INDEXED BY idx_puzzles_rating '
+                   'WHERE (rating, id) >= (?, ?) AND rating <= ? '
+                   'ORDER BY rating, id LIMIT 1')
+            prefix = ()
+        max_id = self._next_id() - 1
+        if max_id < 1:
+            return None
+        # Seek from a random point in the band, wrapping round to its start
+        seek = (rng.randint(min_rating, max_rating), rng.randint(1, max_id))
+        row = self.conn.execute(sql, prefix + seek + (max_rating,)).fetchone() or \
+            self.conn.execute(sql, prefix + (min_rating, 0, max_rating)).fetchone()
+        return self.get(row[0]) if row else None
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Puzzle database tools")
+    parser.add_argument('-d', '--database', default=DEFAULT_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    load = commands.add_parser('import', help="bulk import puzzles from CSV")
+    load.add_argument('csv')
+    load.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    pick = commands.add_parser('random', help="print a random puzzle")
+    pick.add_argument('--min-rating', type=int, default=0)
+    pick.add_argument('--max-rating', type=int, default=5000)
+    pick.add_argument('--theme')
+    pick.add_argument('--length', type=int)
+    args = parser.parse_args(argv)
+
+    with PuzzleStore(args.database) as store:
+        if args.command == 'import':
+            with open(args.csv, newline='', encoding='utf-8') as f:
+                imported, skipped = store.import_csv(f, args.batch_size, log=print)
+            print(f"imported {imported}, skipped {skipped}")
+        else:
+            puzzle = store.random(args.min_rating, args.max_rating, args.theme, args.length)
+            if puzzle is None:
+                print("no puzzle found")
+            else:
+                print(f"#{puzzle['id']} rating {puzzle['rating']} {' '.join(puzzle['themes'])}")
+                print(puzzle['fen'])
+                print(' '.join(puzzle['solution']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
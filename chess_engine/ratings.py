@@ -0,0 +1,222 @@
+"""
+Elo ratings and the leaderboard for the web app's users database.
+
+Finished games in the games table are rated in id order, a batch per
+transaction, and flagged as rated; a partial index over the unrated
+finished games means finding new work never scans the archive. Only
+games between players signed in to the game server are left unrated by
+GameStore; local games against the computer and imported PGN games are
+stored already flagged, since anyone could register their player names.
+Games whose players have no account are flagged without changing any
+rating. Games are rated as they are saved (rate_saved) and by the update
+command below, never while a page is being read.
+
+The leaderboard walks an index on (rating, id) from the top with keyset
+pagination: a page continues from the last (rating, id) seen, so deep
+pages cost the same as the first. Ranks come from rating_counts, a
+per-rating user count kept up to date by triggers; a user's rank is one
+plus the users rated strictly higher, summed over at most a few thousand
+distinct ratings however many users there are.
+
+    python -m chess_engine.ratings update -d chess_users.db
+"""
+
+import sys
+
+from .games import DEFAULT_PATH
+
+K_FACTOR = 32
+BATCH_SIZE = 1000
+PAGE_SIZE = 50
+
+# Migration step for chess_engine.db.migrate, run after the games archive step
+MIGRATION = [
+    'ALTER TABLE games ADD COLUMN rated INTEGER NOT NULL DEFAULT 0',
+    "CREATE INDEX IF NOT EXISTS idx_games_unrated ON games (id) "
+    "WHERE rated = 0 AND status = 'finished'",
+    'CREATE INDEX IF NOT EXISTS idx_users_rating ON users (rating, id)',
+    'CREATE TABLE IF NOT EXISTS rating_counts (rating INTEGER PRIMARY KEY, users INTEGER NOT NULL)',
+    'INSERT INTO rating_counts (rating, users) '
+    'SELECT rating, COUNT(*) FROM users WHERE rating IS NOT NULL GROUP BY rating',
+    """CREATE TRIGGER IF NOT EXISTS users_rating_insert AFTER INSERT ON users
+       WHEN NEW.rating IS NOT NULL BEGIN
+           INSERT INTO rating_counts (rating, users) VALUES (NEW.rating, 1)
+           ON CONFLICT (rating) DO UPDATE SET users = users + 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS users_rating_delete AFTER DELETE ON users
+       WHEN OLD.rating IS NOT NULL BEGIN
+           UPDATE rating_counts SET users = users - 1 WHERE rating = OLD.rating;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS users_rating_update AFTER UPDATE OF rating ON users
+       WHEN OLD.rating IS NOT NEW.rating BEGIN
+           UPDATE rating_counts SET users = users - 1 WHERE rating = OLD.rating;
+           INSERT INTO rating_counts (rating, users) SELECT NEW.rating, 1
+           WHERE NEW.rating IS NOT NULL
+           ON CONFLICT (rating) DO UPDATE SET users = users + 1;
+       END""",
+]
+
+_PENDING = """
+    SELECT id, player1, player2, winner, result FROM games
+    WHERE rated = 0 AND status = 'finished' ORDER BY id LIMIT ?
+"""
+_HAS_PENDING = "SELECT 1 FROM games WHERE rated = 0 AND status = 'finished' LIMIT 1"
+
+
+def expected_score(rating, opponent):
+    return 1 / (1 + 10 ** ((opponent - rating) / 400))
+
+
+def elo_update(rating, opponent, score, k=K_FACTOR):
+    """New rating after scoring score (1, 0.5 or 0) against opponent"""
+    return round(rating + k * (score - expected_score(rating, opponent)))
+
+
+def _white_score(game):
+    """player1's (White's) score, or None if the result is unknown"""
+    result = game['result']
+    if result == '1-0':
+        return 1.0
+    if result == '0-1':
+        return 0.0
+    if result == '1/2-1/2':
+        return 0.5
+    # Games stored before results were recorded only name the winner
+    if game['winner'] is None:
+        return 0.5
+    if game['winner'] == game['player1']:
+        return 1.0
+    if game['winner'] == game['player2']:
+        return 0.0
+    return None
+
+
+def apply_pending(conn, batch_size=BATCH_SIZE, k=K_FACTOR, max_games=None):
+    """Rate finished games not rated yet, one transaction per batch
+
+    Stops after at least max_games, if given; returns the games processed.
+    """
+    processed = 0
+    # Checked without the write lock, so readers with nothing to rate never wait
+    while (max_games is None or processed < max_games) and conn.execute(_HAS_PENDING).fetchone():
+        # Ratings are read and written under one write lock, so concurrent
+        # updaters cannot lose each other's changes
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            games = _rate_batch(conn, batch_size, k)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        processed += games
+    return processed
+
+
+def rate_saved(conn):
+    """apply_pending after saving games, if the database has the ratings tables
+
+    Game archives without user accounts (e.g. benchmark databases) are left alone.
+    """
+    if any(row[1] == 'rated' for row in conn.execute('PRAGMA table_info(games)')):
+        return apply_pending(conn)
+    return 0
+
+
+def _rate_batch(conn, batch_size, k):
+    games = conn.execute(_PENDING, (batch_size,)).fetchall()
+    if not games:
+        return 0
+    names = list({name for game in games for name in (game['player1'], game['player2'])
+                  if name is not None})
+    ratings = {}
+    for i in range(0, len(names), 500):  # stay under SQLite's parameter limit
+        chunk = names[i:i + 500]
+        ratings.update(conn.execute(
+            'SELECT username, rating FROM users WHERE username IN '
+            f'({", ".join("?" * len(chunk))})', chunk).fetchall())
+    changed = set()
+    for game in games:
+        white, black = game['player1'], game['player2']
+        score = _white_score(game)
+        if score is None or white == black or ratings.get(white) is None \
+                or ratings.get(black) is None:
+            continue
+        white_rating, black_rating = ratings[white], ratings[black]
+        ratings[white] = elo_update(white_rating, black_rating, score, k)
+        ratings[black] = elo_update(black_rating, white_rating, 1 - score, k)
+        changed.update((white, black))
+    conn.executemany('UPDATE users SET rating = ? WHERE username = ?',
+                     [(ratings[name], name) for name in changed])
+    conn.executemany('UPDATE games SET rated = 1 WHERE id = ?', [(game['id'],) for game in games])
+    return len(games)
+
+
+def _above(conn, rating):
+    """Number of users rated strictly higher than rating"""
+    return conn.execute('SELECT COALESCE(SUM(users), 0) FROM rating_counts WHERE rating > ?',
+                        (rating,)).fetchone()[0]
+
+
+def leaderboard(conn, limit=PAGE_SIZE, after=None):
+    """Users from the top as (rank, username, rating, id) rows
+
+    after is the (rating, id) of the last row of the previous page. Users
+    with equal ratings share a rank and are listed newest account first.
+    """
+    if after is None:
+        rows = conn.execute('SELECT id, username, rating FROM users INDEXED BY idx_users_rating '
+                            'WHERE rating IS NOT NULL ORDER BY rating DESC, id DESC LIMIT ?',
+                            (limit,)).fetchall()
+    else:
+        rows = conn.execute('SELECT id, username, rating FROM users INDEXED BY idx_users_rating '
+                            'WHERE rating IS NOT NULL AND (rating, id) < (?, ?) '
+                            'ORDER BY rating DESC, id DESC LIMIT ?',
+                            (after[0], after[1], limit)).fetchall()
+    board = []
+    ranks = {}
+    for row in rows:
+        if row['rating'] not in ranks:
+            ranks[row['rating']] = _above(conn, row['rating']) + 1
+        board.append((ranks[row['rating']], row['username'], row['rating'], row['id']))
+    return board
+
+
+def rank(conn, username):
+    """(rank, rating) of a user, or None if there is no such rated user"""
+    row = conn.execute('SELECT rating FROM users WHERE username = ?', (username,)).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return _above(conn, row[0]) + 1, row[0]
+
+
+def main(argv=None):
+    import argparse
+    from .db import connect
+
+    parser = argparse.ArgumentParser(description="Rating tools")
+    parser.add_argument('-d', '--database', default=DEFAULT_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('update', help="rate finished games")
+    top = commands.add_parser('top', help="print the leaderboard")
+    top.add_argument('-n', type=int, default=PAGE_SIZE)
+    who = commands.add_parser('rank', help="print a user's rank")
+    who.add_argument('username')
+    args = parser.parse_args(argv)
+
+    conn = connect(args.database)
+    try:
+        if args.command == 'update':
+            print(f"rated {apply_pending(conn)} games")
+        elif args.command == 'top':
+            for position, username, rating, _ in leaderboard(conn, args.n):
+                print(f"{position:>6} {rating:>5} {username}")
+        else:
+            result = rank(conn, args.username)
+            print("no such user" if result is None else f"rank {result[0]}, rating {result[1]}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Standard Algebraic Notation (SAN) and UCI move text for Position.
+"""
+
+import re
+
+from .bitboard import PAWN, KING, SQUARE_NAMES
+from .moves import (
+    KING_CASTLE, QUEEN_CASTLE, move_to_uci, promotion_piece,
+)
+
+_PIECE_LETTERS = ' NBRQK'
+_SQUARE = re.compile(r'[a-h][1-8]')
+
+
+def move_to_san(position, move, legal_moves=None):
+    """SAN text for a legal move in position, including check/mate suffix"""
+    text = _san_without_suffix(position, move, legal_moves)
+    position.push(move)
+    if position.in_check():
+        text += '#' if not position.generate_legal_moves() else '+'
+    position.pop()
+    return text
+
+
+def _san_without_suffix(position, move, legal_moves=None):
+    flag = move >> 12
+    if flag == KING_CASTLE:
+        return 'O-O'
+    if flag == QUEEN_CASTLE:
+        return 'O-O-O'
+
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    piece_type = position.squares[from_sq] % 6
+    capture = bool(flag & 4)
+
+    if piece_type == PAWN:
+        text = SQUARE_NAMES[from_sq][0] + 'x' if capture else ''
+        text += SQUARE_NAMES[to_sq]
+        promoted = promotion_piece(move)
+        if promoted is not None:
+            text += '=' + _PIECE_LETTERS[promoted]
+        return text
+
+    text = _PIECE_LETTERS[piece_type]
+    if piece_type != KING:
+        # Disambiguate between identical pieces that can reach the same square
+        if legal_moves is None:
+            legal_moves = position.generate_legal_moves()
+        rivals = [m & 63 for m in legal_moves
+                  if (m >> 6) & 63 == to_sq and m & 63 != from_sq
+                  and position.squares[m & 63] == position.squares[from_sq]]
+        if rivals:
+            if all(sq & 7 != from_sq & 7 for sq in rivals):
+                text += SQUARE_NAMES[from_sq][0]
+            elif all(sq >> 3 != from_sq >> 3 for sq in rivals):
+                text += SQUARE_NAMES[from_sq][1]
+            else:
+                text += SQUARE_NAMES[from_sq]
+    if capture:
+        text += 'x'
+    return text + SQUARE_NAMES[to_sq]
+
+
+def parse_uci(position, text):
+    """Legal move matching UCI text such as e2e4 or e7e8q; raises ValueError"""
+    text = text.strip().lower()
+    for move in position.generate_legal_moves():
+        if move_to_uci(move) == text:
+            return move
+    raise ValueError(f"Illegal or invalid UCI move: {text!r}")
+
+
+def parse_san(position, text):
+    """Legal move matching SAN text such as Nbd7, exf6 or O-O; raises ValueError"""
+    san = text.strip().rstrip('+#!?').replace('0-0-0', 'O-O-O').replace('0-0', 'O-O')
+    if not san:
+        raise ValueError("Empty SAN move")
+    moves = position.generate_legal_moves()
+    # Only moves to the named destination can match (castling names none)
+    squares = _SQUARE.findall(san)
+    candidates = moves
+    if squares:
+        to_sq = SQUARE_NAMES.index(squares[-1])
+        candidates = [move for move in moves if (move >> 6) & 63 == to_sq]
+    for move in candidates:
+        if _san_without_suffix(position, move, moves) == san:
+            return move
+    # Accept over-disambiguated or "e8Q" style promotions as a fallback
+    loose = san.replace('=', '')
+    for move in candidates:
+        if _san_without_suffix(position, move, moves).replace('=', '') == loose:
+            return move
+    raise ValueError(f"Illegal or invalid SAN move: {text!r}")
+
+
+def parse_move(position, text):
+    """Parse either UCI or SAN move text"""
+    try:
+        return parse_uci(position, text)
+    except ValueError:
+        return parse_san(position, text)
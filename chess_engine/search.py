@@ -0,0 +1,467 @@
+"""
+Alpha-beta search over a Position.
+
+Searcher holds everything a search needs (transposition table, move
+ordering state, time manager) and nothing from the GUI, so it can run in
+worker processes as well as behind ChessAI.
+
+The search keeps a few counters as it goes (see COUNTERS): plain integer
+attributes, cheap enough to leave on. stats() turns them, with the nodes
+and time of each completed iteration, into nodes per second, cutoff and
+table hit rates and the effective branching factor.
+
+Beyond plain alpha-beta, leaves are resolved by a quiescence search over
+captures (with delta pruning), and the main search uses null-move
+pruning, late move reductions and aspiration windows around the previous
+iteration's score. Each is a Searcher attribute (see FEATURES) that can
+be switched off on its own, e.g. to measure it with chess_engine.match.
+"""
+
+from .evaluation import evaluate, MATE_SCORE, MG_VALUES
+from .moves import CAPTURE, EP_CAPTURE, PROMOTION
+from .ordering import MoveOrderer, MAX_PLY
+from .position import Position
+from .timeman import TimeManager, SearchTimeout
+from .transposition import TranspositionTable, EXACT, LOWER, UPPER
+from .bitboard import WHITE, PAWN, QUEEN, KING, pop_count
+from .tablebase import MAX_PIECES as TABLEBASE_PIECES
+
+INFINITY = float('inf')
+MATE_THRESHOLD = MATE_SCORE - 1000  # scores beyond this are mates in N plies
+
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 2   # plus one more from depth 7
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 4         # moves searched at full depth before reducing
+DELTA_MARGIN = 200        # centipawns of positional gain allowed for a capture
+ASPIRATION_MIN_DEPTH = 4
+ASPIRATION_WINDOW = 50    # centipawns either side of the previous score
+ASPIRATION_MAX = 1000     # a side widened past this is opened fully
+
+# Switchable search features, copied to parallel workers
+FEATURES = ('quiescence', 'delta_pruning', 'null_move', 'late_move_reductions',
+            'aspiration_windows')
+
+# Per-search counters, reset by prepare() and summed across parallel workers
+COUNTERS = ('nodes', 'qnodes', 'beta_cutoffs', 'first_move_cutoffs', 'tt_probes', 'tt_hits',
+            'tablebase_hits')
+
+
+def _score_to_tt(score, ply):
+    """Mate scores count plies from the root; the table keeps them from the node"""
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+class Searcher:
+    def __init__(self, position=None, tt_size_mb=16):
+        self.position = position if position is not None else Position()
+        self.tt = TranspositionTable(tt_size_mb)  # kept between moves
+        self.orderer = MoveOrderer()
+        self.timer = TimeManager()
+        self.reset_counters()
+        self.iterations = []  # (depth, nodes so far, seconds) per completed iteration
+        self.search_time = 0.0
+        self.root_ply = 0
+        self.best_value = 0
+        self.completed_depth = 0
+        self.tablebase = None  # optional Tablebase, probed in small endings
+        self.quiescence = True
+        self.delta_pruning = True
+        self.null_move = True
+        self.late_move_reductions = True
+        self.aspiration_windows = True
+        # Called as on_iteration(depth, best_move, value, nodes) after each
+        # completed iteration, e.g. to print UCI info lines
+        self.on_iteration = None
+
+    def evaluate_board(self):
+        # Centipawns from White's point of view, kept up to date by push/pop
+        return evaluate(self.position)
+
+    def minimax(self, depth, is_maximizing, alpha, beta):
+        if depth <= 0 and self.quiescence:
+            return self.quiesce(is_maximizing, alpha, beta)
+        self.nodes += 1
+        if not self.nodes & 1023 and self.timer.expired():
+            raise SearchTimeout()
+        position = self.position
+        if self.tablebase is not None and pop_count(position.occupied) <= TABLEBASE_PIECES:
+            score = self.probe_tablebase(is_maximizing)
+            if score is not None:
+                return score
+        if depth <= 0:
+            return self.evaluate_board()
+
+        key = position.hash
+        ply = len(position.stack) - self.root_ply
+        alpha_orig, beta_orig = alpha, beta  # before the table narrows the window
+        tt_move = 0
+        self.tt_probes += 1
+        entry = self.tt.probe(key)
+        if entry:
+            self.tt_hits += 1
+            tt_depth, bound, score, tt_move = entry
+            score = _score_from_tt(score, ply)
+            if tt_depth >= depth:
+                if bound == EXACT:
+                    return score
+                if bound == LOWER:
+                    alpha = max(alpha, score)
+                elif bound == UPPER:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        in_check = position.in_check()
+        # Never two null moves in a row: the second would just undo the first
+        if self.null_move and depth >= NULL_MOVE_MIN_DEPTH and ply and not in_check \
+                and position.stack[-1][0]:
+            score = self.null_move_search(depth, is_maximizing, alpha, beta)
+            if score is not None:
+                return score
+
+        moves = position.generate_legal_moves()
+        if not moves:
+            if in_check:
+                # Mated: prefer the longest defence / the quickest mate
+                return -(MATE_SCORE - ply) if is_maximizing else MATE_SCORE - ply
+            return 0  # stalemate
+        moves = self.orderer.order(position, moves, ply, tt_move)
+        # Quiet moves this late in the order are searched a ply shallower first
+        reduce_from = LMR_MIN_MOVES if self.late_move_reductions and depth >= LMR_MIN_DEPTH \
+            and not in_check else len(moves)
+        killers = self.orderer.killers[ply] if ply < MAX_PLY else ()
+
+        best_move = 0
+        if is_maximizing:
+            best_eval = -INFINITY
+            for i, move in enumerate(moves):
+                position.push(move)
+                if i >= reduce_from and not move >> 12 & (CAPTURE | PROMOTION) \
+                        and move not in killers and not position.in_check():
+                    # Reduced null-window search; only a move that beats alpha is searched fully
+                    eval = self.minimax(depth - 2, False, alpha, alpha + 1)
+                    if eval > alpha:
+                        eval = self.minimax(depth - 1, False, alpha, beta)
+                else:
+                    eval = self.minimax(depth - 1, False, alpha, beta)
+                position.pop()
+                if eval > best_eval:
+                    best_eval, best_move = eval, move
+                alpha = max(alpha, eval)
+                if beta <= alpha:
+                    self.beta_cutoffs += 1
+                    if i == 0:
+                        self.first_move_cutoffs += 1
+                    self.orderer.update(position, move, ply, depth)
+                    break
+        else:
+            best_eval = INFINITY
+            for i, move in enumerate(moves):
+                position.push(move)
+                if i >= reduce_from and not move >> 12 & (CAPTURE | PROMOTION) \
+                        and move not in killers and not position.in_check():
+                    eval = self.minimax(depth - 2, True, beta - 1, beta)
+                    if eval < beta:
+                        eval = self.minimax(depth - 1, True, alpha, beta)
+                else:
+                    eval = self.minimax(depth - 1, True, alpha, beta)
+                position.pop()
+                if eval < best_eval:
+                    best_eval, best_move = eval, move
+                beta = min(beta, eval)
+                if beta <= alpha:
+                    self.beta_cutoffs += 1
+                    if i == 0:
+                        self.first_move_cutoffs += 1
+                    self.orderer.update(position, move, ply, depth)
+                    break
+
+        if best_eval <= alpha_orig:
+            bound = UPPER
+        elif best_eval >= beta_orig:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, bound, _score_to_tt(best_eval, ply), best_move)
+        return best_eval
+
+    def null_move_search(self, depth, is_maximizing, alpha, beta):
+        """Bound from letting the opponent move twice, or None if it proves nothing
+
+        If the side to move still beats its bound after passing, a real move
+        would too. Skipped without pieces other than pawns, where passing can
+        be better than any move (zugzwang), and when the static evaluation is
+        not already past the bound.
+        """
+        position = self.position
+        us = position.turn
+        if not position.occupied_co[us] & ~(position.pieces[us * 6 + PAWN] | position.pieces[us * 6 + KING]):
+            return None
+        reduction = NULL_MOVE_REDUCTION + (depth > 6)
+        if is_maximizing:
+            if beta == INFINITY or self.evaluate_board() < beta:
+                return None
+            position.push_null()
+            score = self.minimax(depth - 1 - reduction, False, beta - 1, beta)
+            position.pop_null()
+            # A mate found after passing is no proof of one with a real move
+            return beta if score >= beta else None
+        if alpha == -INFINITY or self.evaluate_board() > alpha:
+            return None
+        position.push_null()
+        score = self.minimax(depth - 1 - reduction, True, alpha, alpha + 1)
+        position.pop_null()
+        return alpha if score <= alpha else None
+
+    def quiesce(self, is_maximizing, alpha, beta):
+        """Value of a leaf once captures have played out, from White's point of view
+
+        The side to move may stand pat on the static evaluation or try
+        captures and promotions; in check every evasion is searched.
+        Delta pruning skips captures that could not bring the evaluation
+        back to the window even by winning the piece outright. Past
+        MAX_PLY the static evaluation is returned, so long check
+        sequences cannot recurse without end.
+        """
+        self.nodes += 1
+        self.qnodes += 1
+        if not self.nodes & 1023 and self.timer.expired():
+            raise SearchTimeout()
+        position = self.position
+        ply = len(position.stack) - self.root_ply
+        if ply >= MAX_PLY:
+            return self.evaluate_board()
+        if self.tablebase is not None and pop_count(position.occupied) <= TABLEBASE_PIECES:
+            score = self.probe_tablebase(is_maximizing)
+            if score is not None:
+                return score
+        in_check = position.in_check()
+        if in_check:
+            best = stand_pat = -INFINITY if is_maximizing else INFINITY
+        else:
+            best = stand_pat = self.evaluate_board()
+            if is_maximizing:
+                if stand_pat >= beta:
+                    return stand_pat
+                alpha = max(alpha, stand_pat)
+            else:
+                if stand_pat <= alpha:
+                    return stand_pat
+                beta = min(beta, stand_pat)
+        moves = position.generate_legal_moves(captures=not in_check)
+        if not moves and in_check:
+            return -(MATE_SCORE - ply) if is_maximizing else MATE_SCORE - ply
+        if len(moves) > 1:
+            moves = self.orderer.order(position, moves, ply)
+
+        delta_pruning = self.delta_pruning and abs(stand_pat) != INFINITY
+        squares = position.squares
+        for move in moves:
+            if delta_pruning:
+                flag = move >> 12
+                gain = DELTA_MARGIN + (MG_VALUES[PAWN] if flag == EP_CAPTURE else
+                                       MG_VALUES[squares[(move >> 6) & 63] % 6] if flag & CAPTURE else 0)
+                if flag & PROMOTION:
+                    gain += MG_VALUES[QUEEN] - MG_VALUES[PAWN]
+                if (stand_pat + gain <= alpha) if is_maximizing else (stand_pat - gain >= beta):
+                    continue
+            position.push(move)
+            score = self.quiesce(not is_maximizing, alpha, beta)
+            position.pop()
+            if is_maximizing:
+                if score > best:
+                    best = score
+                alpha = max(alpha, score)
+            else:
+                if score < best:
+                    best = score
+                beta = min(beta, score)
+            if beta <= alpha:
+                break
+        return best
+
+    def probe_tablebase(self, is_maximizing):
+        """Tablebase score of the position, or None if it is not in the tables"""
+        position = self.position
+        result = self.tablebase.probe(position)
+        if result is None:
+            return None
+        self.tablebase_hits += 1
+        return self.tablebase_score(result, len(position.stack) - self.root_ply, is_maximizing)
+
+    def tablebase_score(self, result, ply, is_maximizing):
+        """Tablebase (result, plies to mate) as a score from White's point of view"""
+        outcome, plies = result
+        if not outcome:
+            return 0
+        score = MATE_SCORE - (ply + plies) if outcome > 0 else -(MATE_SCORE - (ply + plies))
+        return score if is_maximizing else -score
+
+    def search_move(self, move, depth, alpha=-INFINITY, beta=INFINITY):
+        """Value of one root move searched to depth plies"""
+        position = self.position
+        position.push(move)
+        value = self.minimax(depth - 1, position.turn == WHITE, alpha, beta)
+        position.pop()
+        return value
+
+    def search_root(self, moves, depth, white_to_move, alpha=-INFINITY, beta=INFINITY):
+        """Search the root moves to depth plies; returns (best move, value)
+
+        A value at or past alpha or beta only bounds the true value (fail
+        low / fail high); the first move to fail high ends the search.
+        """
+        best_move = None
+
+        for move in moves:
+            board_value = self.search_move(move, depth, alpha, beta)
+
+            if white_to_move:
+                if best_move is None or board_value > alpha:
+                    best_move = move
+                    alpha = max(alpha, board_value)
+            elif best_move is None or board_value < beta:
+                best_move = move
+                beta = min(beta, board_value)
+            if alpha >= beta:
+                break
+
+        return best_move, alpha if white_to_move else beta
+
+    def aspiration_search(self, moves, depth, white_to_move, guess):
+        """search_root in a narrow window around guess, widened on either
+        side until the value falls inside it"""
+        low = high = ASPIRATION_WINDOW
+        while True:
+            alpha = guess - low if low <= ASPIRATION_MAX else -INFINITY
+            beta = guess + high if high <= ASPIRATION_MAX else INFINITY
+            best_move, value = self.search_root(moves, depth, white_to_move, alpha, beta)
+            if value <= alpha:
+                low *= 4
+            elif value >= beta:
+                high *= 4
+            else:
+                return best_move, value
+
+    def root_moves(self):
+        """Legal root moves, best first by the table move and ordering heuristics"""
+        position = self.position
+        moves = position.generate_legal_moves()
+        entry = self.tt.probe(position.hash)
+        return self.orderer.order(position, moves, 0, entry[3] if entry else 0)
+
+    def reset_counters(self):
+        for name in COUNTERS:
+            setattr(self, name, 0)
+
+    def counters(self):
+        """Current values of COUNTERS, as a tuple"""
+        return tuple(getattr(self, name) for name in COUNTERS)
+
+    def add_counters(self, counters):
+        """Add a counters() tuple from another searcher (a parallel worker)"""
+        for name, value in zip(COUNTERS, counters):
+            setattr(self, name, getattr(self, name) + value)
+
+    def prepare(self, timer=None):
+        """Reset per-search state before a new search from the current position"""
+        self.timer = timer or TimeManager()
+        self.reset_counters()
+        self.iterations = []
+        self.search_time = 0.0
+        self.completed_depth = 0
+        self.tt.new_search()
+        self.orderer.new_search()
+        self.root_ply = len(self.position.stack)
+
+    def iterative_deepening(self, max_depth, timer=None):
+        """Deepen one ply at a time until max_depth or the time budget runs out
+
+        Returns the best move of the last completed iteration (None if there
+        are no legal moves).
+        """
+        position = self.position
+        white_to_move = position.turn == WHITE
+        self.prepare(timer)
+
+        moves = self.root_moves()
+        if not moves:
+            return None
+        best_move = moves[0]
+        root_ply = self.root_ply
+
+        for depth in range(1, max_depth + 1):
+            try:
+                if self.aspiration_windows and depth >= ASPIRATION_MIN_DEPTH \
+                        and abs(self.best_value) < MATE_THRESHOLD:
+                    best_move, self.best_value = self.aspiration_search(
+                        moves, depth, white_to_move, self.best_value)
+                else:
+                    best_move, self.best_value = self.search_root(moves, depth, white_to_move)
+            except SearchTimeout:
+                # Unwind the abandoned iteration and keep the last completed one
+                position.unwind(root_ply)
+                break
+            self.iteration_done(depth, best_move, self.best_value)
+            # Search the previous best move first in the next iteration
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+            if not self.timer.can_start_iteration():
+                break
+
+        self.search_time = self.timer.elapsed()
+        return best_move
+
+    def iteration_done(self, depth, best_move, value):
+        """Record a completed iteration and report it to on_iteration"""
+        self.completed_depth = depth
+        self.iterations.append((depth, self.nodes, self.timer.elapsed()))
+        if self.on_iteration:
+            self.on_iteration(depth, best_move, value, self.nodes)
+
+    def branching_factor(self):
+        """Nodes of the last completed iteration over those of the one before"""
+        if len(self.iterations) < 2:
+            return None
+        before = self.iterations[-3][1] if len(self.iterations) > 2 else 0
+        previous = self.iterations[-2][1] - before
+        last = self.iterations[-1][1] - self.iterations[-2][1]
+        return round(last / previous, 2) if previous else None
+
+    def stats(self):
+        """Statistics of the last search as a dict (JSON-serialisable)
+
+        Beside the COUNTERS: time (ms), nps, first_move_cutoff_rate (share
+        of beta cutoffs made by the first move tried), tt_hit_rate, ebf
+        (effective branching factor), the depth completed and, for each
+        iteration, its depth, own nodes and cumulative time (ms).
+        """
+        stats = dict(zip(COUNTERS, self.counters()))
+        elapsed = self.search_time or self.timer.elapsed()
+        stats['time'] = int(elapsed * 1000)
+        stats['nps'] = int(self.nodes / elapsed) if elapsed > 0 else 0
+        stats['first_move_cutoff_rate'] = \
+            round(self.first_move_cutoffs / self.beta_cutoffs, 3) if self.beta_cutoffs else None
+        stats['tt_hit_rate'] = round(self.tt_hits / self.tt_probes, 3) if self.tt_probes else None
+        stats['ebf'] = self.branching_factor()
+        stats['depth'] = self.completed_depth
+        stats['iterations'] = []
+        previous = 0
+        for depth, nodes, seconds in self.iterations:
+            stats['iterations'].append({'depth': depth, 'nodes': nodes - previous,
+                                        'time': int(seconds * 1000)})
+            previous = nodes
+        return stats
@@ -0,0 +1,433 @@
+"""
+Endgame tablebases for a lone king against KQ, KR, KP and KBN.
+
+Tables are generated offline by retrograde analysis: starting from every
+checkmate, positions are resolved backwards one ply at a time, so each
+stored value is an exact distance to mate. The strong side is always
+stored as White (positions with a black strong side are flipped) and
+pawnless tables fold the board's eight symmetries onto a white king in
+the a1-d1-d4 triangle; pawn tables only mirror files.
+
+Each table file holds a 12 byte header (magic b'CTB1', bits per entry,
+padding, uint32 entry count) followed by bit-packed entries: 0 for a draw
+(or an illegal position), otherwise distance to mate in plies plus one.
+Only the strong side can win, so the side to move tells win from loss.
+Probing memory-maps the file and reads a single entry.
+
+    python -m chess_engine.tablebase generate -d tablebases
+"""
+
+import mmap
+import os
+import struct
+import sys
+import time
+from itertools import product
+
+from .bitboard import (
+    WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN,
+    BB_SQUARES, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+    rook_attacks, bishop_attacks, queen_attacks, iter_squares, lsb, pop_count,
+)
+from .fen import position_from_fen
+
+MAGIC = b'CTB1'
+HEADER = struct.Struct('<4sBxxxI')
+
+# Strong side's pieces besides the king, in index order
+TABLES = {
+    'KQK': (QUEEN,),
+    'KRK': (ROOK,),
+    'KBNK': (BISHOP, KNIGHT),
+    'KPK': (PAWN,),
+}
+# Tables a table's promotions lead into; they have to exist first
+DEPENDENCIES = {'KPK': ('KQK', 'KRK')}
+MAX_PIECES = max(len(pieces) for pieces in TABLES.values()) + 2
+
+_LETTERS = 'PNBRQK'
+_ESCAPE = 255  # move counter value for black positions that can never be lost
+
+
+def _transform(sq, t):
+    file, rank = sq & 7, sq >> 3
+    if t & 4:
+        file, rank = rank, file
+    if t & 1:
+        file = 7 - file
+    if t & 2:
+        rank = 7 - rank
+    return rank * 8 + file
+
+
+TRANSFORMS = [[_transform(sq, t) for sq in range(64)] for t in range(8)]
+# _MIRROR_DIAGONAL[t]: the transform doing t and then reflecting in a1-h8
+_MIRROR_DIAGONAL = [next(u for u in range(8)
+                         if TRANSFORMS[u] == [TRANSFORMS[4][sq] for sq in TRANSFORMS[t]])
+                    for t in range(8)]
+
+# Pawnless: any symmetry that takes the white king into the a1-d1-d4 triangle
+_TRIANGLE = [sq for sq in range(64) if (sq & 7) <= 3 and (sq >> 3) <= (sq & 7)]
+_PAWNLESS_TRANSFORM = [next(t for t in range(8) if TRANSFORMS[t][sq] in _TRIANGLE)
+                       for sq in range(64)]
+# Pawns: mirror files so the white king is on files a-d
+_HALF_BOARD = [sq for sq in range(64) if (sq & 7) <= 3]
+_PAWN_TRANSFORM = [0 if sq & 7 <= 3 else 1 for sq in range(64)]
+
+
+def table_name(types):
+    """Table name for the strong side's non-king piece types"""
+    return 'K' + ''.join(_LETTERS[t] for t in sorted(types, reverse=True)) + 'K'
+
+
+def _white_attacks(wk, types, squares, occupied):
+    attacks = KING_ATTACKS[wk]
+    for piece_type, sq in zip(types, squares):
+        if piece_type == PAWN:
+            attacks |= PAWN_ATTACKS[WHITE][sq]
+        elif piece_type == KNIGHT:
+            attacks |= KNIGHT_ATTACKS[sq]
+        elif piece_type == BISHOP:
+            attacks |= bishop_attacks(sq, occupied)
+        elif piece_type == ROOK:
+            attacks |= rook_attacks(sq, occupied)
+        else:
+            attacks |= queen_attacks(sq, occupied)
+    return attacks
+
+
+class TableLayout:
+    """Maps (side to move, white king, black king, piece squares) to entry indices"""
+
+    def __init__(self, name):
+        self.name = name
+        self.types = TABLES[name]
+        self.pawns = PAWN in self.types
+        self.king_squares = _HALF_BOARD if self.pawns else _TRIANGLE
+        self._king_transform = _PAWN_TRANSFORM if self.pawns else _PAWNLESS_TRANSFORM
+        self._king_index = [0] * 64
+        for i, sq in enumerate(self.king_squares):
+            self._king_index[sq] = i
+        self.size = 2 * len(self.king_squares) * 64 ** (len(self.types) + 1)
+
+    def transform(self, wk, bk, squares):
+        """Symmetry taking a position to its stored orientation"""
+        t = self._king_transform[wk]
+        if not self.pawns:
+            # With the king on a1-h8 the reflection in that diagonal is free too:
+            # pick the one putting the first piece off the diagonal below it
+            m = TRANSFORMS[t]
+            if m[wk] >> 3 == m[wk] & 7:
+                for sq in (bk, *squares):
+                    sq = m[sq]
+                    if sq >> 3 != sq & 7:
+                        if sq >> 3 > sq & 7:
+                            t = _MIRROR_DIAGONAL[t]
+                        break
+        return t
+
+    def index(self, turn, wk, bk, squares):
+        """Entry index; turn is WHITE when the strong side is to move"""
+        m = TRANSFORMS[self.transform(wk, bk, squares)]
+        index = (turn * len(self.king_squares) + self._king_index[m[wk]]) * 64 + m[bk]
+        for sq in squares:
+            index = index * 64 + m[sq]
+        return index
+
+
+class EndgameTable(TableLayout):
+    """One memory-mapped table file"""
+
+    def __init__(self, path, name):
+        super().__init__(name)
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.bits, count = HEADER.unpack_from(self._map, 0) \
+            if len(self._map) >= HEADER.size else (None, 0, 0)
+        if magic != MAGIC or count != self.size or not 1 <= self.bits <= 8:
+            self._map.close()
+            raise ValueError(f"Not a {name} table: {path}")
+        self._mask = (1 << self.bits) - 1
+
+    def close(self):
+        self._map.close()
+
+    def value(self, turn, wk, bk, squares):
+        """Stored entry: 0 for a draw, else distance to mate in plies + 1"""
+        offset = self.index(turn, wk, bk, squares) * self.bits
+        start = HEADER.size + (offset >> 3)
+        word = int.from_bytes(self._map[start:start + 2], 'little')
+        return (word >> (offset & 7)) & self._mask
+
+
+class Tablebase:
+    """All tables found in a directory, probed straight from a Position"""
+
+    def __init__(self, directory='tablebases'):
+        self.directory = directory
+        self.tables = {}
+        for name in TABLES:
+            path = os.path.join(directory, name + '.ctb')
+            if os.path.exists(path):
+                self.tables[name] = EndgameTable(path, name)
+
+    def __bool__(self):
+        return bool(self.tables)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+
+    def probe(self, position):
+        """(result, plies to mate) for the side to move, or None if not covered
+
+        result is 1 for a win, -1 for a loss and 0 for a draw.
+        """
+        if pop_count(position.occupied) > MAX_PIECES or position.castling:
+            return None
+        for weak in (WHITE, BLACK):
+            if position.occupied_co[weak] == BB_SQUARES[position.king_squares[weak]]:
+                break
+        else:
+            return None
+        strong = weak ^ 1
+        types = []
+        for piece_type in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN):
+            types.extend([piece_type] * pop_count(position.pieces[strong * 6 + piece_type]))
+        table = self.tables.get(table_name(types))
+        if table is None:
+            return None
+
+        # Store everything with the strong side as White
+        flip = 56 if strong == BLACK else 0
+        squares = [lsb(position.pieces[strong * 6 + t]) ^ flip for t in table.types]
+        turn = WHITE if position.turn == strong else BLACK
+        value = table.value(turn, position.king_squares[strong] ^ flip,
+                            position.king_squares[weak] ^ flip, squares)
+        if not value:
+            return 0, 0
+        return (1 if turn == WHITE else -1), value - 1
+
+
+def generate(name, children=None, log=None):
+    """Solve one table by retrograde analysis; returns a bytearray of entries
+
+    children maps table names in DEPENDENCIES[name] to open EndgameTables.
+    """
+    layout = TableLayout(name)
+    types = layout.types
+    index = layout.index
+    values = bytearray(layout.size)  # distance to mate + 1, 0 while unresolved
+    counts = bytearray(layout.size)  # black to move: children not yet known lost
+    frontier = []
+    seeds = {}  # white-to-move wins found through promotion, by distance
+
+    # Pass 1: mates, stalemates, escapes and move counts
+    for wk in layout.king_squares:
+        for bk in range(64):
+            if bk == wk or KING_ATTACKS[wk] & BB_SQUARES[bk]:
+                continue
+            for squares in product(range(64), repeat=len(types)):
+                if wk in squares or bk in squares or len(set(squares)) != len(squares):
+                    continue
+                if layout.pawns and any(t == PAWN and not 8 <= sq < 56
+                                        for t, sq in zip(types, squares)):
+                    continue
+                if layout.transform(wk, bk, squares):
+                    continue  # stored under its mirror image
+                white = BB_SQUARES[wk]
+                for sq in squares:
+                    white |= BB_SQUARES[sq]
+                occupied = white | BB_SQUARES[bk]
+
+                if not _white_attacks(wk, types, squares, occupied) & BB_SQUARES[bk] and children:
+                    _promotion_seeds(seeds, children, wk, bk, types, squares, occupied)
+
+                attacks = _white_attacks(wk, types, squares, occupied ^ BB_SQUARES[bk])
+                targets = KING_ATTACKS[bk] & ~attacks
+                i = index(BLACK, wk, bk, squares)
+                if targets & white:
+                    counts[i] = _ESCAPE  # an undefended piece can be taken
+                elif not targets:
+                    if attacks & BB_SQUARES[bk]:
+                        values[i] = 1
+                        frontier.append((wk, bk, squares))
+                    else:
+                        counts[i] = _ESCAPE  # stalemate
+                else:
+                    counts[i] = len({index(WHITE, wk, to, squares) for to in iter_squares(targets)})
+
+    # Pass 2: walk back from the mates one ply at a time
+    depth = 0
+    while frontier or any(d > depth for d in seeds):
+        depth += 1
+        found = []
+        if depth & 1:
+            # White to move wins: some move reaches a lost black position
+            for wk, bk, squares in seeds.pop(depth, ()):
+                i = index(WHITE, wk, bk, squares)
+                if not values[i]:
+                    values[i] = depth + 1
+                    found.append((wk, bk, squares))
+            for config in frontier:
+                for wk, bk, squares in _white_unmoves(types, *config):
+                    i = index(WHITE, wk, bk, squares)
+                    if not values[i]:
+                        values[i] = depth + 1
+                        found.append((wk, bk, squares))
+        else:
+            # Black to move loses once every move reaches a won white position
+            for wk, bk, squares in frontier:
+                occupied = BB_SQUARES[wk] | BB_SQUARES[bk]
+                for sq in squares:
+                    occupied |= BB_SQUARES[sq]
+                parents = {}
+                for origin in iter_squares(KING_ATTACKS[bk] & ~occupied & ~KING_ATTACKS[wk]):
+                    parents[index(BLACK, wk, origin, squares)] = origin
+                for i, origin in parents.items():
+                    if values[i] or counts[i] == _ESCAPE:
+                        continue
+                    counts[i] -= 1
+                    if not counts[i]:
+                        values[i] = depth + 1
+                        found.append((wk, origin, squares))
+        frontier = found
+        if log:
+            log(f"{name}: {len(found)} positions at {depth} plies")
+    return values
+
+
+def _promotion_seeds(seeds, children, wk, bk, types, squares, occupied):
+    for n, (piece_type, sq) in enumerate(zip(types, squares)):
+        if piece_type != PAWN or sq < 48 or occupied & BB_SQUARES[sq + 8]:
+            continue
+        for promoted, table in (('Q', children.get('KQK')), ('R', children.get('KRK'))):
+            if table is None:
+                continue
+            value = table.value(BLACK, wk, bk, squares[:n] + (sq + 8,) + squares[n + 1:])
+            if value:
+                seeds.setdefault(value, []).append((wk, bk, squares))
+
+
+def _white_unmoves(types, wk, bk, squares):
+    """White-to-move positions one white move before a black-to-move position"""
+    occupied = BB_SQUARES[wk] | BB_SQUARES[bk]
+    for sq in squares:
+        occupied |= BB_SQUARES[sq]
+    bk_bb = BB_SQUARES[bk]
+
+    parents = []
+    for origin in iter_squares(KING_ATTACKS[wk] & ~occupied & ~KING_ATTACKS[bk]):
+        parents.append((origin, squares))
+    for n, (piece_type, sq) in enumerate(zip(types, squares)):
+        if piece_type == PAWN:
+            origins = []
+            if sq >= 16 and not occupied & BB_SQUARES[sq - 8]:
+                origins.append(sq - 8)
+                if 24 <= sq < 32 and not occupied & BB_SQUARES[sq - 16]:
+                    origins.append(sq - 16)
+        elif piece_type == KNIGHT:
+            origins = iter_squares(KNIGHT_ATTACKS[sq] & ~occupied)
+        elif piece_type == BISHOP:
+            origins = iter_squares(bishop_attacks(sq, occupied) & ~occupied)
+        elif piece_type == ROOK:
+            origins = iter_squares(rook_attacks(sq, occupied) & ~occupied)
+        else:
+            origins = iter_squares(queen_attacks(sq, occupied) & ~occupied)
+        for origin in origins:
+            parents.append((wk, squares[:n] + (origin,) + squares[n + 1:]))
+
+    for king, pieces in parents:
+        # The black king cannot be in check with White to move
+        occ = BB_SQUARES[king] | bk_bb
+        for sq in pieces:
+            occ |= BB_SQUARES[sq]
+        if not _white_attacks(king, types, pieces, occ) & bk_bb:
+            yield king, bk, pieces
+
+
+def write_table(path, values):
+    """Bit-pack entries into a table file"""
+    bits = max(1, max(values).bit_length())
+    data = bytearray((len(values) * bits + 7) // 8 + 1)
+    offset = 0
+    for value in values:
+        if value:
+            shifted = value << (offset & 7)
+            start = offset >> 3
+            data[start] |= shifted & 0xFF
+            data[start + 1] |= shifted >> 8
+        offset += bits
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, bits, len(values)))
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def generate_tables(directory, names=None, force=False, log=print):
+    """Generate the named tables (default: all) and their dependencies into directory"""
+    os.makedirs(directory, exist_ok=True)
+    done = set()
+
+    def build(name):
+        if name in done:
+            return
+        done.add(name)
+        for dependency in DEPENDENCIES.get(name, ()):
+            build(dependency)
+        path = os.path.join(directory, name + '.ctb')
+        if os.path.exists(path) and not force:
+            return
+        children = {dep: EndgameTable(os.path.join(directory, dep + '.ctb'), dep)
+                    for dep in DEPENDENCIES.get(name, ())}
+        start = time.time()
+        try:
+            values = generate(name, children)
+        finally:
+            for table in children.values():
+                table.close()
+        write_table(path, values)
+        if log:
+            log(f"{name}: {len(values)} entries, longest mate {max(values) - 1} plies, "
+                f"{time.time() - start:.1f}s")
+
+    for name in names or TABLES:
+        build(name)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Endgame tablebase tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    gen = commands.add_parser('generate', help="build tables by retrograde analysis")
+    gen.add_argument('tables', nargs='*', help="default: " + ' '.join(TABLES))
+    gen.add_argument('-d', '--directory', default='tablebases')
+    gen.add_argument('--force', action='store_true', help="rebuild existing tables")
+    probe = commands.add_parser('probe', help="look up a position")
+    probe.add_argument('fen')
+    probe.add_argument('-d', '--directory', default='tablebases')
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        unknown = set(args.tables) - set(TABLES)
+        if unknown:
+            parser.error(f"unknown tables: {' '.join(sorted(unknown))}")
+        generate_tables(args.directory, args.tables or None, args.force)
+        return 0
+    tablebase = Tablebase(args.directory)
+    result = tablebase.probe(position_from_fen(args.fen))
+    tablebase.close()
+    if result is None:
+        print("not in tablebase")
+    else:
+        outcome, plies = result
+        print({1: f"win in {plies} plies", -1: f"loss in {plies} plies", 0: "draw"}[outcome])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Time management for iterative deepening.
+
+The manager turns the remaining clock into a per-move budget: a soft limit
+after which no new iteration is started and a hard limit at which the
+running iteration is abandoned.
+"""
+
+import time
+
+MOVES_TO_GO = 30        # assumed moves left when the clock has no move count
+MOVE_OVERHEAD = 0.05    # seconds kept back for GUI/engine latency
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the hard time limit is reached"""
+
+
+class TimeManager:
+    def __init__(self, remaining=None, increment=0.0, moves_to_go=None, move_time=None,
+                 deadline=None, stop_event=None):
+        if deadline is not None:
+            # Absolute wall-clock cut-off shared with another process
+            self.soft_limit = self.hard_limit = max(0.0, deadline - time.time())
+        elif move_time is not None:
+            # Fixed time per move: use it all, never start what can't finish
+            self.soft_limit = self.hard_limit = max(0.0, move_time - MOVE_OVERHEAD)
+        elif remaining is None:
+            self.soft_limit = self.hard_limit = float('inf')
+        else:
+            available = max(0.0, remaining - MOVE_OVERHEAD)
+            budget = available / (moves_to_go or MOVES_TO_GO) + increment * 0.8
+            self.soft_limit = min(budget, available)
+            self.hard_limit = min(budget * 3, available * 0.3 + increment)
+        self.start_time = time.time()
+        self.stopped = False
+        # Event (e.g. multiprocessing) another process sets to stop this search
+        self.stop_event = stop_event
+
+    def start(self):
+        self.start_time = time.time()
+        self.stopped = False
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def deadline(self):
+        """Wall-clock time at which the hard limit is reached"""
+        return self.start_time + self.hard_limit
+
+    def ponderhit(self, timer):
+        """Turn an open-ended ponder search into a real one with timer's budget"""
+        self.start_time = timer.start_time
+        self.soft_limit, self.hard_limit = timer.soft_limit, timer.hard_limit
+
+    def stop(self):
+        """Ask the running search to finish as soon as possible"""
+        self.stopped = True
+
+    def expired(self):
+        if self.stop_event is not None and self.stop_event.is_set():
+            self.stopped = True
+        return self.stopped or self.elapsed() >= self.hard_limit
+
+    def can_start_iteration(self):
+        # The next iteration usually costs several times the last one, so
+        # only begin it if we are well inside the soft limit
+        return not self.stopped and self.elapsed() < self.soft_limit * 0.5
@@ -0,0 +1,65 @@
+"""
+Fixed-size transposition table.
+
+Entries live in two flat arrays of unsigned 64-bit integers (key and packed
+data), so the memory used is exactly 16 bytes per slot and never grows
+during a search.
+"""
+
+from array import array
+
+EXACT, LOWER, UPPER = 1, 2, 3
+
+ENTRY_SIZE = 16  # bytes per slot: 8 byte key + 8 byte packed data
+
+_SCORE_OFFSET = 1 << 31
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        slots = max(1, size_mb * 1024 * 1024 // ENTRY_SIZE)
+        # Round down to a power of two so the slot index is a simple mask
+        self.size = 1 << (slots.bit_length() - 1)
+        self.mask = self.size - 1
+        self.keys = array('Q', [0]) * self.size
+        self.data = array('Q', [0]) * self.size
+        self.age = 0
+
+    def clear(self):
+        self.keys = array('Q', [0]) * self.size
+        self.data = array('Q', [0]) * self.size
+        self.age = 0
+
+    def new_search(self):
+        """Mark entries from earlier searches as replaceable"""
+        self.age = (self.age + 1) & 63
+
+    def probe(self, key):
+        """(depth, bound, score, move) stored for key, or None"""
+        index = key & self.mask
+        if self.keys[index] != key:
+            return None
+        data = self.data[index]
+        return ((data >> 16) & 0xFF, (data >> 24) & 3,
+                (data >> 32) - _SCORE_OFFSET, data & 0xFFFF)
+
+    def store(self, key, depth, bound, score, move=0):
+        index = key & self.mask
+        data = self.data[index]
+        if self.keys[index] != key and data and \
+                (data >> 26) & 63 == self.age and depth < (data >> 16) & 0xFF:
+            # Depth-preferred: keep a deeper entry from the current search
+            return
+        if not move:
+            # Keep the best move already known for this position
+            move = data & 0xFFFF if self.keys[index] == key else 0
+        self.keys[index] = key
+        self.data[index] = ((score + _SCORE_OFFSET) << 32) | (self.age << 26) | \
+            (bound << 24) | (depth << 16) | move
+
+    def usage(self):
+        """Fraction of slots holding an entry from the current search"""
+        sample = min(self.size, 1000)
+        used = sum(1 for i in range(sample)
+                   if self.data[i] and (self.data[i] >> 26) & 63 == self.age)
+        return used / sample
@@ -0,0 +1,304 @@
+"""
+UCI front end for Engine.
+
+    python -m chess_engine.uci
+
+Commands are read from stdin and answered on stdout. Searches run on their
+own thread, so `stop` and `ponderhit` are handled while the engine thinks.
+Only the chess_engine package is imported, never pygame or Flask, so the
+engine can run as a batch service or under a match harness without a display.
+
+Besides the standard info fields, the SearchStats option adds an
+`info string` line of search counters per iteration, and StatsFile
+appends each searched move's stats to a JSON lines file. Each switchable
+search feature is a check option too (Quiescence, NullMove, ...), so a
+match can play the engine against itself with one of them turned off.
+"""
+
+import sys
+import threading
+
+from .bitboard import WHITE
+from .engine import Engine, MAX_DEPTH
+from .evaluation import MATE_SCORE
+from .fen import STARTING_FEN, position_from_fen, position_to_fen
+from .moves import move_to_uci
+from .san import parse_uci
+from .search import MATE_THRESHOLD
+from .timeman import TimeManager
+from .transposition import TranspositionTable
+
+ENGINE_NAME = 'Python Chess'
+ENGINE_AUTHOR = 'the Python Chess developers'
+
+OPTIONS = [
+    'option name Hash type spin default 16 min 1 max 4096',
+    'option name Threads type spin default 1 min 1 max 64',
+    'option name Ponder type check default false',
+    'option name OwnBook type check default true',
+    'option name BookFile type string default chess_book.bin',
+    'option name TablebasePath type string default tablebases',
+    'option name SearchStats type check default false',
+    'option name StatsFile type string default <empty>',
+    'option name Quiescence type check default true',
+    'option name DeltaPruning type check default true',
+    'option name NullMove type check default true',
+    'option name LateMoveReductions type check default true',
+    'option name AspirationWindows type check default true',
+]
+# Check options switching Searcher features, by lower-cased option name
+FEATURE_OPTIONS = {
+    'quiescence': 'quiescence',
+    'deltapruning': 'delta_pruning',
+    'nullmove': 'null_move',
+    'latemovereductions': 'late_move_reductions',
+    'aspirationwindows': 'aspiration_windows',
+}
+
+
+def format_score(value):
+    """UCI score text for a value from the side to move's point of view"""
+    if abs(value) >= MATE_THRESHOLD:
+        plies = MATE_SCORE - abs(value)
+        moves = (plies + 1) // 2
+        return f"mate {moves if value > 0 else -moves}"
+    return f"cp {int(value)}"
+
+
+def principal_variation(searcher, position, best_move, max_length):
+    """Best line from position by following table moves after best_move"""
+    pv = [best_move]
+    position = position.copy()
+    position.push(best_move)
+    seen = {position.hash}
+    while len(pv) < max_length:
+        entry = searcher.tt.probe(position.hash)
+        if not entry or entry[3] not in position.generate_legal_moves():
+            break
+        position.push(entry[3])
+        if position.hash in seen:
+            break
+        seen.add(position.hash)
+        pv.append(entry[3])
+    return pv
+
+
+class UCIEngine:
+    def __init__(self, engine=None, out=None):
+        self.engine = engine or Engine()
+        self.engine.on_iteration = self.info
+        self.out = out or sys.stdout
+        self.position = position_from_fen(STARTING_FEN)
+        self.book_path = 'chess_book.bin'
+        self.own_book = True
+        self.search_stats = False  # info string with search counters per iteration
+        self.thread = None
+        self.timer = None
+        self.clock = {}  # go parameters of the running search, kept for ponderhit
+        self.root = None
+        self.wait_for_stop = False
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def send(self, line):
+        with self.lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def run(self, lines=None):
+        """Handle commands until quit or end of input"""
+        for line in lines if lines is not None else sys.stdin:
+            if not self.handle(line):
+                break
+        self.quit()
+
+    def handle(self, line):
+        """Process one command line; returns False on quit"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'quit':
+            return False
+        if command == 'uci':
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            for option in OPTIONS:
+                self.send(option)
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.set_option(args)
+        elif command == 'ucinewgame':
+            self.stop()
+            self.engine.tt.clear()
+            self.engine.orderer.clear()
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'ponderhit':
+            self.ponderhit()
+        elif command == 'd':
+            self.send(position_to_fen(self.position))
+        else:
+            self.send(f"info string unknown command: {command}")
+        return True
+
+    def set_option(self, args):
+        text = ' '.join(args)
+        name, _, value = text.partition(' value ')
+        name = name.replace('name', '', 1).strip().lower()
+        value = value.strip()
+        self.stop()
+        try:
+            if name == 'hash':
+                self.engine.tt_size_mb = max(1, int(value))
+                self.engine.tt = TranspositionTable(self.engine.tt_size_mb)
+                self.engine.set_workers(self.engine.parallel.workers if self.engine.parallel else 1)
+            elif name == 'threads':
+                self.engine.set_workers(max(1, int(value)))
+            elif name == 'ownbook':
+                self.own_book = value.lower() == 'true'
+                self.engine.open_book(self.book_path if self.own_book else None)
+            elif name == 'bookfile':
+                self.book_path = value
+                self.engine.open_book(self.book_path if self.own_book else None)
+            elif name == 'tablebasepath':
+                self.engine.open_tablebase(value)
+                self.engine.set_workers(self.engine.parallel.workers if self.engine.parallel else 1)
+            elif name in FEATURE_OPTIONS:
+                setattr(self.engine, FEATURE_OPTIONS[name], value.lower() == 'true')
+            elif name == 'searchstats':
+                self.search_stats = value.lower() == 'true'
+            elif name == 'statsfile':
+                self.engine.stats_file = value if value and value != '<empty>' else None
+            elif name != 'ponder':
+                self.send(f"info string unknown option: {name}")
+        except ValueError:
+            self.send(f"info string bad value for {name}: {value}")
+
+    def set_position(self, args):
+        if 'moves' in args:
+            split = args.index('moves')
+            setup, moves = args[:split], args[split + 1:]
+        else:
+            setup, moves = args, []
+        try:
+            if setup and setup[0] == 'fen':
+                position = position_from_fen(' '.join(setup[1:]))
+            else:
+                position = position_from_fen(STARTING_FEN)
+            for text in moves:
+                position.push(parse_uci(position, text))
+        except ValueError as e:
+            self.send(f"info string {e}")
+            return
+        self.position = position
+
+    def _clock_timer(self, clock):
+        """TimeManager for the go parameters"""
+        if 'movetime' in clock:
+            return TimeManager(move_time=clock['movetime'] / 1000)
+        white = self.position.turn == WHITE
+        remaining = clock.get('wtime' if white else 'btime')
+        if remaining is None:
+            return TimeManager()
+        return TimeManager(remaining / 1000, clock.get('winc' if white else 'binc', 0) / 1000,
+                           clock.get('movestogo'))
+
+    def go(self, args):
+        self.stop()
+        clock = {}
+        flags = set()
+        i = 0
+        while i < len(args):
+            if args[i] in ('infinite', 'ponder'):
+                flags.add(args[i])
+                i += 1
+            elif i + 1 < len(args):
+                try:
+                    clock[args[i]] = int(args[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            else:
+                i += 1
+
+        self.clock = clock
+        # Pondering and infinite searches only answer after ponderhit/stop
+        self.timer = TimeManager() if flags else self._clock_timer(clock)
+        self.wait_for_stop = bool(flags)
+        self.stop_event.clear()
+        self.root = self.position.copy()
+        max_depth = clock.get('depth', MAX_DEPTH)
+        self.thread = threading.Thread(target=self._search, args=(self.root, self.timer, max_depth),
+                                       name='uci-search', daemon=True)
+        self.thread.start()
+
+    def _search(self, position, timer, max_depth):
+        best_move = self.engine.think(position, timer, max_depth)
+        if self.wait_for_stop:
+            self.stop_event.wait()
+        if best_move is None:
+            self.send('bestmove 0000')
+            return
+        pv = principal_variation(self.engine, position, best_move, 2)
+        if len(pv) > 1:
+            self.send(f"bestmove {move_to_uci(best_move)} ponder {move_to_uci(pv[1])}")
+        else:
+            self.send(f"bestmove {move_to_uci(best_move)}")
+
+    def info(self, depth, best_move, value, nodes):
+        """Searcher.on_iteration hook: one UCI info line per completed depth"""
+        elapsed = max(self.timer.elapsed(), 0.001) if self.timer else 0.001
+        if self.root.turn != WHITE:
+            value = -value  # UCI scores are from the side to move's point of view
+        pv = ' '.join(move_to_uci(move) for move in
+                      principal_variation(self.engine, self.root, best_move, depth))
+        engine = self.engine
+        self.send(f"info depth {depth} score {format_score(value)} nodes {nodes} "
+                  f"nps {int(nodes / elapsed)} time {int(elapsed * 1000)} "
+                  f"hashfull {int(engine.tt.usage() * 1000)} tbhits {engine.tablebase_hits} pv {pv}")
+        if self.search_stats:
+            cutoffs = engine.beta_cutoffs
+            self.send(f"info string qnodes {engine.qnodes} cutoffs {cutoffs} "
+                      f"firstcut {engine.first_move_cutoffs / cutoffs if cutoffs else 0:.3f} "
+                      f"ttprobes {engine.tt_probes} tthits {engine.tt_hits} "
+                      f"ebf {engine.branching_factor() or '-'}")
+
+    def ponderhit(self):
+        """The expected move was played: switch to the real clock and answer normally"""
+        if self.thread is None or not self.thread.is_alive():
+            return
+        if self.timer is not None:
+            self.timer.ponderhit(self._clock_timer(self.clock))
+        self.wait_for_stop = False
+        self.stop_event.set()
+
+    def stop(self):
+        """Finish the running search now; it still reports its bestmove"""
+        if self.thread is None:
+            return
+        if self.timer is not None:
+            self.timer.stop()
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def quit(self):
+        self.stop()
+        self.engine.close()
+
+
+def main(argv=None):
+    UCIEngine().run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
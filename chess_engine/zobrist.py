@@ -0,0 +1,33 @@
+"""
+Zobrist keys for incremental position hashing.
+
+Keys come from a fixed seed so hashes are stable across runs and processes
+(transposition tables and opening books can be shared between them).
+"""
+
+import random
+
+_rng = random.Random(0x5EED_C4E55)
+
+# PIECE_KEYS[piece code][square]
+PIECE_KEYS = [[_rng.getrandbits(64) for _ in range(64)] for _ in range(12)]
+SIDE_KEY = _rng.getrandbits(64)
+# One key per castling-rights combination (none = 0) and per en passant file
+CASTLING_KEYS = [0] + [_rng.getrandbits(64) for _ in range(15)]
+EP_KEYS = [_rng.getrandbits(64) for _ in range(8)]
+
+del _rng
+
+
+def compute_hash(position):
+    """Hash a position from scratch (Position.push/pop keep it up to date)"""
+    h = 0
+    for sq, code in enumerate(position.squares):
+        if code is not None:
+            h ^= PIECE_KEYS[code][sq]
+    if position.turn:
+        h ^= SIDE_KEY
+    h ^= CASTLING_KEYS[position.castling]
+    if position.ep_square is not None:
+        h ^= EP_KEYS[position.ep_square & 7]
+    return h
@@ -1,17 +1,18 @@
-import pygame
-import sys
 import random
 import time
 from enum import Enum
-from flask import Flask, render_template_string, request, redirect, url_for, session, flash
-from werkzeug.security import generate_password_hash, check_password_hash
-import sqlite3
-import os
-from threading import Thread
-import webbrowser
+from chess_engine import Position, square, row_col, move_from, move_to, move_to_uci
+from chess_engine import STARTING_FEN, position_from_fen, position_to_fen
+from chess_engine.bitboard import QUEEN
+from chess_engine.moves import promotion_piece, is_en_passant
+from chess_engine.timeman import TimeManager
+from chess_engine.engine import Engine
+from chess_engine.background import BackgroundSearch
+from chess_engine.san import parse_uci
 
-# Initialize pygame
-pygame.init()
+# This module is the board/move/AI core and imports without side effects.
+# The pygame GUI (chess_gui) and the Flask site (chess_web) are only loaded
+# by the entry points that need them; their names resolve lazily below.
 
 # Constants
 WIDTH, HEIGHT = 800, 900
@@ -26,8 +27,6 @@ HIGHLIGHT = (247, 247, 105, 150)
 RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
-FONT = pygame.font.SysFont('Arial', 24)
-LARGE_FONT = pygame.font.SysFont('Arial', 36)
 
 # Chess Enums
 class PieceType(Enum):
@@ -69,20 +68,23 @@ class Piece:
         # Use white symbols but color them appropriately
         return symbols[self.type]
     
+    VALUES = {
+        PieceType.PAWN: 1,
+        PieceType.KNIGHT: 3,
+        PieceType.BISHOP: 3,
+        PieceType.ROOK: 5,
+        PieceType.QUEEN: 9,
+        PieceType.KING: 0  # Priceless!
+    }
+    
     def get_value(self):
-        values = {
-            PieceType.PAWN: 1,
-            PieceType.KNIGHT: 3,
-            PieceType.BISHOP: 3,
-            PieceType.ROOK: 5,
-            PieceType.QUEEN: 9,
-            PieceType.KING: 0  # Priceless!
-        }
-        return values[self.type]
+        return self.VALUES[self.type]
 
 # Chess Game Class
 class ChessGame:
     def __init__(self, mode=GameMode.COMPUTER):
+        self.position = Position()
+        self.start_fen = STARTING_FEN
         self.board = self.initialize_board()
         self.current_turn = PieceColor.WHITE
         self.selected_piece = None
@@ -102,35 +104,16 @@ class ChessGame:
         self.ai_thinking = False
         self.message = ""
         self.message_timer = 0
+        self.renderer = None  # created on first draw, so pygame loads only for the GUI
     
     def initialize_board(self):
+        # Build the GUI piece grid from the bitboard position
         board = [[None for _ in range(8)] for _ in range(8)]
-        
-        # Pawns
-        for col in range(8):
-            board[1][col] = Piece(PieceColor.BLACK, PieceType.PAWN, (1, col))
-            board[6][col] = Piece(PieceColor.WHITE, PieceType.PAWN, (6, col))
-        
-        # Rooks
-        board[0][0] = board[0][7] = Piece(PieceColor.BLACK, PieceType.ROOK, (0, 0))
-        board[7][0] = board[7][7] = Piece(PieceColor.WHITE, PieceType.ROOK, (7, 0))
-        
-        # Knights
-        board[0][1] = board[0][6] = Piece(PieceColor.BLACK, PieceType.KNIGHT, (0, 1))
-        board[7][1] = board[7][6] = Piece(PieceColor.WHITE, PieceType.KNIGHT, (7, 1))
-        
-        # Bishops
-        board[0][2] = board[0][5] = Piece(PieceColor.BLACK, PieceType.BISHOP, (0, 2))
-        board[7][2] = board[7][5] = Piece(PieceColor.WHITE, PieceType.BISHOP, (7, 2))
-        
-        # Queens
-        board[0][3] = Piece(PieceColor.BLACK, PieceType.QUEEN, (0, 3))
-        board[7][3] = Piece(PieceColor.WHITE, PieceType.QUEEN, (7, 3))
-        
-        # Kings
-        board[0][4] = Piece(PieceColor.BLACK, PieceType.KING, (0, 4))
-        board[7][4] = Piece(PieceColor.WHITE, PieceType.KING, (7, 4))
-        
+        for sq, code in enumerate(self.position.squares):
+            if code is not None:
+                color, piece_type = divmod(code, 6)
+                row, col = row_col(sq)
+                board[row][col] = Piece(PieceColor(color), PieceType(piece_type + 1), (row, col))
         return board
     
     def update_timer(self):
@@ -158,183 +141,154 @@ class ChessGame:
         return 0 <= row < 8 and 0 <= col < 8
     
     def get_possible_moves(self, piece):
+        sq = square(*piece.position)
+        if piece.color.value == self.position.turn:
+            engine_moves = self.position.legal_moves_from(sq)
+        else:
+            # The side not on move has no legal moves; report where it could go
+            engine_moves = self.position.moves_from(sq)
         moves = []
-        row, col = piece.position
-        
-        if piece.type == PieceType.PAWN:
-            direction = -1 if piece.color == PieceColor.WHITE else 1
-            # Forward move
-            if self.is_valid_position(row + direction, col) and not self.board[row + direction][col]:
-                moves.append((row + direction, col))
-                # Double move from starting position
-                start_row = 6 if piece.color == PieceColor.WHITE else 1
-                if row == start_row and not self.board[row + 2*direction][col]:
-                    moves.append((row + 2*direction, col))
-            # Captures
-            for dc in [-1, 1]:
-                if self.is_valid_position(row + direction, col + dc):
-                    target = self.board[row + direction][col + dc]
-                    if target and target.color != piece.color:
-                        moves.append((row + direction, col + dc))
-        
-        elif piece.type == PieceType.KNIGHT:
-            knight_moves = [
-                (row+2, col+1), (row+2, col-1),
-                (row-2, col+1), (row-2, col-1),
-                (row+1, col+2), (row+1, col-2),
-                (row-1, col+2), (row-1, col-2)
-            ]
-            for r, c in knight_moves:
-                if self.is_valid_position(r, c):
-                    target = self.board[r][c]
-                    if not target or target.color != piece.color:
-                        moves.append((r, c))
-        
-        elif piece.type == PieceType.BISHOP:
-            directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-            for dr, dc in directions:
-                for i in range(1, 8):
-                    r, c = row + i*dr, col + i*dc
-                    if not self.is_valid_position(r, c):
-                        break
-                    target = self.board[r][c]
-                    if not target:
-                        moves.append((r, c))
-                    else:
-                        if target.color != piece.color:
-                            moves.append((r, c))
-                        break
-        
-        elif piece.type == PieceType.ROOK:
-            directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
-            for dr, dc in directions:
-                for i in range(1, 8):
-                    r, c = row + i*dr, col + i*dc
-                    if not self.is_valid_position(r, c):
-                        break
-                    target = self.board[r][c]
-                    if not target:
-                        moves.append((r, c))
-                    else:
-                        if target.color != piece.color:
-                            moves.append((r, c))
-                        break
-        
-        elif piece.type == PieceType.QUEEN:
-            # Combine bishop and rook moves
-            directions = [(1, 1), (1, -1), (-1, 1), (-1, -1), 
-                          (1, 0), (-1, 0), (0, 1), (0, -1)]
-            for dr, dc in directions:
-                for i in range(1, 8):
-                    r, c = row + i*dr, col + i*dc
-                    if not self.is_valid_position(r, c):
-                        break
-                    target = self.board[r][c]
-                    if not target:
-                        moves.append((r, c))
-                    else:
-                        if target.color != piece.color:
-                            moves.append((r, c))
-                        break
-        
-        elif piece.type == PieceType.KING:
-            king_moves = [
-                (row+1, col), (row-1, col),
-                (row, col+1), (row, col-1),
-                (row+1, col+1), (row+1, col-1),
-                (row-1, col+1), (row-1, col-1)
-            ]
-            for r, c in king_moves:
-                if self.is_valid_position(r, c):
-                    target = self.board[r][c]
-                    if not target or target.color != piece.color:
-                        moves.append((r, c))
-        
+        for move in engine_moves:
+            target = row_col(move_to(move))
+            if target not in moves:
+                moves.append(target)
         return moves
     
+    def find_move(self, start_pos, end_pos):
+        """Legal engine move matching a GUI from/to pair (promotions default to a queen)"""
+        to_sq = square(*end_pos)
+        for move in self.position.legal_moves_from(square(*start_pos)):
+            if move_to(move) == to_sq and promotion_piece(move) in (None, QUEEN):
+                return move
+        return None
+    
     def make_move(self, start_pos, end_pos):
         start_row, start_col = start_pos
-        end_row, end_col = end_pos
         piece = self.board[start_row][start_col]
         
         if not piece or piece.color != self.current_turn:
             return False
         
-        possible_moves = self.get_possible_moves(piece)
-        if (end_row, end_col) not in possible_moves:
+        # Only legal moves match, so the king can never be left in check
+        move = self.find_move(start_pos, end_pos)
+        if move is None:
             return False
         
-        # Check if move would leave king in check
-        # (This is a simplified check - in a real game you'd need to make the move and verify)
-        
         # Update timer
         self.update_timer()
         
-        # Move the piece
-        captured_piece = self.board[end_row][end_col]
-        self.board[end_row][end_col] = piece
-        self.board[start_row][start_col] = None
-        piece.position = (end_row, end_col)
-        piece.has_moved = True
+        self.push(move)
+        return True
+    
+    def push(self, move):
+        """Play a legal engine move: position, piece grid, history and turn"""
+        start_pos = row_col(move_from(move))
+        end_pos = row_col(move_to(move))
+        captured_piece = self.board[end_pos[0]][end_pos[1]]
+        if is_en_passant(move):
+            captured_piece = self.board[start_pos[0]][end_pos[1]]
+        
+        self.position.push(move)
+        self.board = self.initialize_board()
         
         # Record move
         self.move_history.append((start_pos, end_pos, captured_piece))
         
-        # Check for pawn promotion
-        if piece.type == PieceType.PAWN and (end_row == 0 or end_row == 7):
-            piece.type = PieceType.QUEEN  # Auto-queen for simplicity
-        
-        # Check for game end conditions
+        # Switch turns, then check for game end conditions
+        self.current_turn = PieceColor(self.position.turn)
         self.check_for_check()
         self.check_for_game_end()
+    
+    def pop(self):
+        """Take back the last move played with push/make_move"""
+        if not self.position.stack:
+            return None
+        move = self.position.pop()
+        self.board = self.initialize_board()
+        self.move_history.pop()
+        self.selected_piece = None
         
-        # Switch turns
-        self.current_turn = PieceColor.BLACK if self.current_turn == PieceColor.WHITE else PieceColor.WHITE
-        
+        self.current_turn = PieceColor(self.position.turn)
+        self.game_over = self.checkmate = self.stalemate = False
+        self.winner = None
+        self.check_for_check()
+        return move
+    
+    def load_fen(self, fen):
+        """Set up the board from a FEN string; raises ValueError if it is invalid"""
+        self.position = position_from_fen(fen)
+        self.start_fen = fen
+        self.board = self.initialize_board()
+        self.move_history = []
+        self.selected_piece = None
+        self.current_turn = PieceColor(self.position.turn)
+        self.game_over = self.checkmate = self.stalemate = False
+        self.winner = None
+        self.check_for_check()
+        self.check_for_game_end()
+    
+    def to_fen(self):
+        return position_to_fen(self.position)
+    
+    def moves(self):
+        """Engine moves played since the start position, for the game archive"""
+        return [entry[0] for entry in self.position.stack]
+    
+    def result(self):
+        """PGN result: 1-0, 0-1, 1/2-1/2, or * while the game goes on"""
+        if self.stalemate:
+            return '1/2-1/2'
+        if not self.game_over or self.winner is None:
+            return '*'
+        return '1-0' if self.winner == PieceColor.WHITE else '0-1'
+    
+    def load_puzzle(self, puzzle):
+        """Start a puzzle: its position with the solver to move"""
+        self.load_fen(puzzle['fen'])
+        self.puzzle_solution = list(puzzle['solution'])
+        self.puzzle_moves = []
+        self.player_color = self.current_turn
+        self.message = puzzle.get('description') or "Find the best move"
+        self.message_timer = 5
+    
+    def check_puzzle_move(self):
+        """Judge the player's last move against the solution and play the reply"""
+        played = move_to_uci(self.position.stack[-1][0])
+        expected = self.puzzle_solution[len(self.puzzle_moves)]
+        if played != expected and not self.checkmate:
+            # Any mate also solves it; anything else is taken back
+            self.pop()
+            self.message = "Not the solution, try again"
+            self.message_timer = 3
+            return False
+        self.puzzle_moves.append(played)
+        if not self.checkmate and len(self.puzzle_moves) < len(self.puzzle_solution):
+            reply = self.puzzle_solution[len(self.puzzle_moves)]
+            self.push(parse_uci(self.position, reply))
+            self.puzzle_moves.append(reply)
+            self.message = "Correct! Keep going"
+            self.message_timer = 3
+        if self.checkmate or len(self.puzzle_moves) >= len(self.puzzle_solution):
+            self.game_over = True
+            self.message = "Puzzle solved!"
+            self.message_timer = 5
         return True
     
     def check_for_check(self):
-        # Find kings
-        white_king_pos = None
-        black_king_pos = None
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.type == PieceType.KING:
-                    if piece.color == PieceColor.WHITE:
-                        white_king_pos = (row, col)
-                    else:
-                        black_king_pos = (row, col)
-        
-        # Check if either king is under attack
+        # Kings are tracked by the position, so this is two attack lookups
         self.check = False
-        if white_king_pos:
-            self.check = self.is_square_under_attack(white_king_pos, PieceColor.BLACK)
-        if black_king_pos and not self.check:
-            self.check = self.is_square_under_attack(black_king_pos, PieceColor.WHITE)
+        for color in (PieceColor.WHITE, PieceColor.BLACK):
+            king_sq = self.position.king_square(color.value)
+            if king_sq is not None and self.is_square_under_attack(row_col(king_sq), PieceColor(1 - color.value)):
+                self.check = True
+                break
     
     def is_square_under_attack(self, position, by_color):
-        row, col = position
-        for r in range(8):
-            for c in range(8):
-                piece = self.board[r][c]
-                if piece and piece.color == by_color:
-                    if (row, col) in self.get_possible_moves(piece):
-                        return True
-        return False
+        return self.position.is_attacked(square(*position), by_color.value)
     
     def check_for_game_end(self):
         # Check for checkmate or stalemate
-        has_legal_moves = False
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.color == self.current_turn:
-                    if self.get_possible_moves(piece):
-                        has_legal_moves = True
-                        break
-            if has_legal_moves:
-                break
+        has_legal_moves = bool(self.position.generate_legal_moves())
         
         if not has_legal_moves:
             if self.check:
@@ -350,203 +304,137 @@ class ChessGame:
                 self.message_timer = 5
     
     def draw(self, screen):
-        # Draw board
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                color = LIGHT_SQUARE if (row + col) % 2 == 0 else DARK_SQUARE
-                pygame.draw.rect(screen, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-                
-                # Highlight selected piece and possible moves
-                if self.selected_piece and self.selected_piece.position == (row, col):
-                    highlight = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-                    highlight.fill(HIGHLIGHT)
-                    screen.blit(highlight, (col * SQUARE_SIZE, row * SQUARE_SIZE))
-                
-                # Highlight possible moves
-                if self.selected_piece:
-                    possible_moves = self.get_possible_moves(self.selected_piece)
-                    for r, c in possible_moves:
-                        if (r, c) == (row, col):
-                            highlight = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-                            highlight.fill((100, 255, 100, 150))
-                            screen.blit(highlight, (c * SQUARE_SIZE, r * SQUARE_SIZE))
-        
-        # Draw pieces
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                piece = self.board[row][col]
-                if piece:
-                    text_color = WHITE if piece.color == PieceColor.WHITE else BLACK
-                    symbol = piece.get_symbol()
-                    text = FONT.render(symbol, True, text_color)
-                    screen.blit(text, (col * SQUARE_SIZE + SQUARE_SIZE//2 - text.get_width()//2, 
-                                      row * SQUARE_SIZE + SQUARE_SIZE//2 - text.get_height()//2))
-        
-        # Draw timer
-        white_time_text = FONT.render(f"White: {int(self.white_time//60)}:{int(self.white_time%60):02d}", True, BLACK)
-        black_time_text = FONT.render(f"Black: {int(self.black_time//60)}:{int(self.black_time%60):02d}", True, BLACK)
-        screen.blit(white_time_text, (20, HEIGHT - 80))
-        screen.blit(black_time_text, (WIDTH - 150, HEIGHT - 80))
-        
-        # Draw game status
+        """Draw the game; returns the screen rectangles that changed"""
+        if self.renderer is None:
+            from chess_gui import BoardRenderer
+            self.renderer = BoardRenderer()
+        dirty = self.renderer.draw(self, screen)
         if self.message_timer > 0:
-            status_text = LARGE_FONT.render(self.message, True, RED)
-            screen.blit(status_text, (WIDTH//2 - status_text.get_width()//2, HEIGHT - 40))
             self.message_timer -= 1/FPS
-        elif self.game_over:
-            if self.checkmate:
-                status_text = LARGE_FONT.render(f"Checkmate! {'White' if self.winner == PieceColor.WHITE else 'Black'} wins!", True, RED)
-            elif self.stalemate:
-                status_text = LARGE_FONT.render("Stalemate! Game drawn.", True, BLUE)
-            else:
-                status_text = LARGE_FONT.render(f"Game Over! {'White' if self.winner == PieceColor.WHITE else 'Black'} wins!", True, RED)
-            screen.blit(status_text, (WIDTH//2 - status_text.get_width()//2, HEIGHT - 40))
-        elif self.check:
-            status_text = FONT.render("CHECK!", True, RED)
-            screen.blit(status_text, (WIDTH//2 - status_text.get_width()//2, HEIGHT - 40))
-        
-        # Draw current turn indicator
-        turn_text = FONT.render(f"Current turn: {'White' if self.current_turn == PieceColor.WHITE else 'Black'}", 
-                               True, GREEN if self.current_turn == PieceColor.WHITE else BLACK)
-        screen.blit(turn_text, (WIDTH//2 - turn_text.get_width()//2, HEIGHT - 120))
-        
-        # Draw mode indicator
-        mode_text = FONT.render(f"Mode: {self.mode.name}", True, BLUE)
-        screen.blit(mode_text, (WIDTH//2 - mode_text.get_width()//2, 10))
+        return dirty
 
 # Chess AI
-class ChessAI:
-    def __init__(self, game):
+class ChessAI(Engine):
+    MIN_THINK_TIME = 0.5  # seconds, so instant replies don't look abrupt
+    PONDER_EXTRA_DEPTH = 2  # opponent's time buys this much more depth
+    
+    def __init__(self, game, tt_size_mb=16, workers=1, book_path='chess_book.bin',
+                 tablebase_dir='tablebases', ponder=True):
         self.game = game
+        self.ponder = ponder  # search the expected reply while the opponent thinks
+        self.ponder_move = None
+        self.ponder_timer = None
+        super().__init__(tt_size_mb, workers, book_path, tablebase_dir)
+        # The engine only ever searches its own copy of the game position
+        self.position = game.position.copy()
         self.difficulty = 1  # 1-3
+        self.max_depth = None  # None: difficulty + 1 plies
+        self.background = BackgroundSearch()
     
-    def evaluate_board(self):
-        score = 0
-        for row in range(8):
-            for col in range(8):
-                piece = self.game.board[row][col]
-                if piece:
-                    value = piece.get_value()
-                    score += value if piece.color == PieceColor.WHITE else -value
-        return score
-    
-    def minimax(self, depth, is_maximizing, alpha, beta):
-        if depth == 0 or self.game.game_over:
-            return self.evaluate_board()
-        
-        if is_maximizing:
-            max_eval = -float('inf')
-            for row in range(8):
-                for col in range(8):
-                    piece = self.game.board[row][col]
-                    if piece and piece.color == PieceColor.WHITE:
-                        moves = self.game.get_possible_moves(piece)
-                        for move in moves:
-                            # Make move
-                            original_pos = piece.position
-                            captured_piece = self.game.board[move[0]][move[1]]
-                            self.game.board[move[0]][move[1]] = piece
-                            self.game.board[original_pos[0]][original_pos[1]] = None
-                            piece.position = move
-                            
-                            # Evaluate
-                            eval = self.minimax(depth - 1, False, alpha, beta)
-                            max_eval = max(max_eval, eval)
-                            alpha = max(alpha, eval)
-                            
-                            # Undo move
-                            self.game.board[original_pos[0]][original_pos[1]] = piece
-                            self.game.board[move[0]][move[1]] = captured_piece
-                            piece.position = original_pos
-                            
-                            if beta <= alpha:
-                                return max_eval
-            return max_eval
-        else:
-            min_eval = float('inf')
-            for row in range(8):
-                for col in range(8):
-                    piece = self.game.board[row][col]
-                    if piece and piece.color == PieceColor.BLACK:
-                        moves = self.game.get_possible_moves(piece)
-                        for move in moves:
-                            # Make move
-                            original_pos = piece.position
-                            captured_piece = self.game.board[move[0]][move[1]]
-                            self.game.board[move[0]][move[1]] = piece
-                            self.game.board[original_pos[0]][original_pos[1]] = None
-                            piece.position = move
-                            
-                            # Evaluate
-                            eval = self.minimax(depth - 1, True, alpha, beta)
-                            min_eval = min(min_eval, eval)
-                            beta = min(beta, eval)
-                            
-                            # Undo move
-                            self.game.board[original_pos[0]][original_pos[1]] = piece
-                            self.game.board[move[0]][move[1]] = captured_piece
-                            piece.position = original_pos
-                            
-                            if beta <= alpha:
-                                return min_eval
-            return min_eval
-    
-    def find_best_move(self):
-        best_move = None
-        best_value = -float('inf') if self.game.current_turn == PieceColor.WHITE else float('inf')
-        
-        for row in range(8):
-            for col in range(8):
-                piece = self.game.board[row][col]
-                if piece and piece.color == self.game.current_turn:
-                    moves = self.game.get_possible_moves(piece)
-                    for move in moves:
-                        # Make move
-                        original_pos = piece.position
-                        captured_piece = self.game.board[move[0]][move[1]]
-                        self.game.board[move[0]][move[1]] = piece
-                        self.game.board[original_pos[0]][original_pos[1]] = None
-                        piece.position = move
-                        
-                        # Evaluate
-                        board_value = self.minimax(self.difficulty, self.game.current_turn == PieceColor.BLACK, -float('inf'), float('inf'))
-                        
-                        # Undo move
-                        self.game.board[original_pos[0]][original_pos[1]] = piece
-                        self.game.board[move[0]][move[1]] = captured_piece
-                        piece.position = original_pos
-                        
-                        if (self.game.current_turn == PieceColor.WHITE and board_value > best_value) or \
-                           (self.game.current_turn == PieceColor.BLACK and board_value < best_value):
-                            best_value = board_value
-                            best_move = ((row, col), move)
-        
-        return best_move
+    def make_timer(self, move_time=None):
+        """Time budget for the side to move in the game"""
+        if move_time is not None:
+            return TimeManager(move_time=move_time)
+        white_to_move = self.game.current_turn == PieceColor.WHITE
+        return TimeManager(self.game.white_time if white_to_move else self.game.black_time)
     
-    def make_move(self):
+    def think(self, position, timer, extra_depth=0):
+        """Engine move for position: random at difficulty 1, else book move or a search"""
+        if self.difficulty <= 1:
+            book_move = self.book_move(position)
+            if book_move is not None:
+                return book_move
+            possible_moves = position.generate_legal_moves()
+            return random.choice(possible_moves) if possible_moves else None
+        max_depth = (self.max_depth or self.difficulty + 1) + extra_depth
+        return super().think(position, timer, max_depth)
+    
+    def search(self, move_time=None):
+        """Engine move for the current game position, searched on this thread"""
+        return self.think(self.game.position.copy(), self.make_timer(move_time))
+    
+    def find_best_move(self, move_time=None):
+        best_move = self.search(move_time)
+        if best_move is None:
+            return None
+        return row_col(move_from(best_move)), row_col(move_to(best_move))
+    
+    def _job(self, position, timer, extra_depth=0):
+        def job():
+            move = self.think(position, timer, extra_depth)
+            # Pad quick answers on the worker thread, never on the GUI thread
+            remaining = self.MIN_THINK_TIME - timer.elapsed()
+            if remaining > 0 and not timer.stopped:
+                time.sleep(remaining)
+            return move
+        return job
+    
+    def start_thinking(self, move_time=None):
+        """Search the game position on the engine thread; poll() plays the result"""
+        timer = self.make_timer(move_time)
         self.game.ai_thinking = True
-        time.sleep(0.5)  # Simulate thinking time
-        
-        if self.difficulty > 1:
-            best_move = self.find_best_move()
-        else:
-            # For lower difficulty, just pick a random move
-            possible_moves = []
-            for row in range(8):
-                for col in range(8):
-                    piece = self.game.board[row][col]
-                    if piece and piece.color == self.game.current_turn:
-                        moves = self.game.get_possible_moves(piece)
-                        for move in moves:
-                            possible_moves.append(((row, col), move))
-            best_move = random.choice(possible_moves) if possible_moves else None
-        
-        if best_move:
-            self.game.make_move(best_move[0], best_move[1])
-        
+        ponder_move, self.ponder_move = self.ponder_move, None
+        stack = self.game.position.stack
+        if ponder_move is not None and stack and stack[-1][0] == ponder_move:
+            # Ponder hit: the running search carries on as the real one
+            self.ponder_timer.ponderhit(timer)
+            return
+        # Nothing pondered or a miss: starting a new job abandons the ponder search
+        self.background.start(self._job(self.game.position.copy(), timer), timer)
+    
+    def start_pondering(self):
+        """Search the expected reply position in the background while the opponent thinks"""
+        self.ponder_move = None
+        if not self.ponder or self.difficulty <= 1 or self.game.game_over:
+            return False
+        position = self.game.position.copy()
+        # The table move of the position we just left the opponent is our best guess
+        entry = self.tt.probe(position.hash)
+        if not entry or entry[3] not in position.generate_legal_moves():
+            return False
+        position.push(entry[3])
+        if not position.generate_legal_moves():
+            return False
+        self.ponder_move = entry[3]
+        self.ponder_timer = TimeManager()  # open-ended until ponderhit
+        self.background.start(self._job(position, self.ponder_timer, self.PONDER_EXTRA_DEPTH),
+                              self.ponder_timer)
+        return True
+    
+    def stop_thinking(self):
+        """Abandon a background or ponder search without playing its move"""
+        self.background.stop()
+        self.ponder_move = None
+        self.game.ai_thinking = False
+    
+    def poll(self):
+        """Play a finished background move on the game; True if one was played"""
+        result = self.background.poll()
+        if result is None:
+            return False
         self.game.ai_thinking = False
+        best_move = result[1]
+        if best_move is None:
+            return False
+        self.game.update_timer()
+        self.game.push(best_move)
+        return True
+    
+    def make_move(self):
+        """Search and play a move synchronously"""
+        best_move = self.search()
+        if best_move is not None:
+            self.game.update_timer()
+            self.game.push(best_move)
+    
+    def close(self):
+        """Stop the engine thread and worker pool, unmap book and tables"""
+        self.background.close()
+        super().close()
+
+# Puzzle Database (built-in puzzles seed the SQLite store)
+PUZZLE_DB = 'chess_puzzles.db'
 
-# Puzzle Database
 puzzles = [
     {
         "fen": "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 0 1",
@@ -555,318 +443,72 @@ puzzles = [
     },
     {
         "fen": "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 0 1",
-        "solution": ["f3e5", "f6e4", "d1d8"],
-        "description": "Double attack leading to queen capture"
+        "solution": ["f3g5", "d7d5", "e4d5"],
+        "description": "Double attack on f7"
     }
 ]
 
-# Flask Web Application for Authentication
-app = Flask(__name__)
-app.secret_key = 'your_secret_key_here'
-
-# Database setup
-def get_db_connection():
-    conn = sqlite3.connect('chess_users.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_db():
-    if not os.path.exists('chess_users.db'):
-        conn = get_db_connection()
-        conn.execute('''
-            CREATE TABLE users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                email TEXT UNIQUE,
-                rating INTEGER DEFAULT 1000,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.execute('''
-            CREATE TABLE games (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                player1 TEXT NOT NULL,
-                player2 TEXT,
-                fen TEXT NOT NULL,
-                status TEXT DEFAULT 'ongoing',
-                winner TEXT,
-                start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                end_time TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        conn.close()
-
-# HTML Templates
-base_template = '''
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Chess Game</title>
-    <style>
-        body { font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }
-        .alert { padding: 10px; margin: 10px 0; border-radius: 4px; }
-        .alert-error { background-color: #ffdddd; color: #ff0000; }
-        .alert-success { background-color: #ddffdd; color: #00aa00; }
-        .alert-info { background-color: #ddddff; color: #0000aa; }
-        .game-mode { 
-            display: inline-block; 
-            width: 200px; 
-            height: 100px; 
-            margin: 10px; 
-            padding: 20px;
-            border: 1px solid #ccc;
-            border-radius: 5px;
-            text-align: center;
-            vertical-align: top;
-            cursor: pointer;
-        }
-        .game-mode:hover { background-color: #f0f0f0; }
-        nav { background: #f8f8f8; padding: 10px; margin-bottom: 20px; }
-        nav a { margin-right: 15px; text-decoration: none; color: #333; }
-        nav a:hover { text-decoration: underline; }
-    </style>
-</head>
-<body>
-    <nav>
-        <a href="/">Home</a>
-        {% if 'username' in session %}
-            <a href="/play">Play</a>
-            <a href="/puzzles">Puzzles</a>
-            <a href="/multiplayer">Multiplayer</a>
-            <a href="/logout">Logout ({{ session['username'] }})</a>
-        {% else %}
-            <a href="/login">Login</a>
-            <a href="/register">Register</a>
-        {% endif %}
-    </nav>
-    {% with messages = get_flashed_messages(with_categories=true) %}
-        {% if messages %}
-            {% for category, message in messages %}
-                <div class="alert alert-{{ category }}">{{ message }}</div>
-            {% endfor %}
-        {% endif %}
-    {% endwith %}
-    {% block content %}{% endblock %}
-</body>
-</html>
-'''
-
-login_template = '''
-{% extends "base.html" %}
-{% block content %}
-    <h1>Login</h1>
-    <form method="POST">
-        <label for="username">Username:</label>
-        <input type="text" id="username" name="username" required><br>
-        <label for="password">Password:</label>
-        <input type="password" id="password" name="password" required><br>
-        <button type="submit">Login</button>
-    </form>
-    <p>Don't have an account? <a href="{{ url_for('register') }}">Register here</a></p>
-{% endblock %}
-'''
-
-register_template = '''
-{% extends "base.html" %}
-{% block content %}
-    <h1>Register</h1>
-    <form method="POST">
-        <label for="username">Username:</label>
-        <input type="text" id="username" name="username" required><br>
-        <label for="email">Email (optional):</label>
-        <input type="email" id="email" name="email"><br>
-        <label for="password">Password:</label>
-        <input type="password" id="password" name="password" required><br>
-        <button type="submit">Register</button>
-    </form>
-    <p>Already have an account? <a href="{{ url_for('login') }}">Login here</a></p>
-{% endblock %}
-'''
-
-play_template = '''
-{% extends "base.html" %}
-{% block content %}
-    <h1>Choose Game Mode</h1>
-    <div>
-        <div class="game-mode" onclick="window.location.href='/start_game?mode=computer'">
-            <h3>vs Computer</h3>
-            <p>Play against AI with adjustable difficulty</p>
-        </div>
-        <div class="game-mode" onclick="window.location.href='/start_game?mode=puzzle'">
-            <h3>Puzzles</h3>
-            <p>Solve tactical chess puzzles</p>
-        </div>
-        <div class="game-mode" onclick="window.location.href='/start_game?mode=multiplayer'">
-            <h3>Multiplayer</h3>
-            <p>Play against random opponents online</p>
-        </div>
-        <div class="game-mode" onclick="window.location.href='/start_game?mode=friend'">
-            <h3>Play with Friend</h3>
-            <p>Challenge a specific friend</p>
-        </div>
-    </div>
-{% endblock %}
-'''
-
-# Flask Routes
-@app.route('/')
-def index():
-    if 'username' in session:
-        return render_template_string(base_template + '''
-            <h1>Welcome to Chess Game, {{ session['username'] }}!</h1>
-            <p>Select a game mode from the navigation menu to start playing.</p>
-        ''')
-    return render_template_string(base_template + '''
-        <h1>Welcome to Chess Game!</h1>
-        <p>Please <a href="/login">login</a> or <a href="/register">register</a> to play.</p>
-    ''')
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        username = request.form['username']
-        password = request.form['password']
-        
-        conn = get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        conn.close()
-        
-        if user and check_password_hash(user['password'], password):
-            session['username'] = username
-            flash('Login successful!', 'success')
-            return redirect(url_for('index'))
-        else:
-            flash('Invalid username or password', 'error')
-    
-    return render_template_string(login_template)
+def init_puzzle_db():
+    from chess_engine.puzzles import PuzzleStore
+    with PuzzleStore(PUZZLE_DB) as store:
+        if store.random() is None:
+            for puzzle in puzzles:
+                store.add(puzzle['fen'], puzzle['solution'], description=puzzle['description'])
 
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'POST':
-        username = request.form['username']
-        password = generate_password_hash(request.form['password'])
-        email = request.form.get('email', '')
-        
-        conn = get_db_connection()
-        try:
-            conn.execute('INSERT INTO users (username, password, email) VALUES (?, ?, ?)',
-                         (username, password, email))
-            conn.commit()
-            flash('Registration successful! Please log in.', 'success')
-            return redirect(url_for('login'))
-        except sqlite3.IntegrityError:
-            flash('Username or email already exists', 'error')
-        finally:
-            conn.close()
-    
-    return render_template_string(register_template)
-
-@app.route('/play')
-def play_menu():
-    if 'username' not in session:
-        return redirect(url_for('login'))
-    return render_template_string(play_template)
+def random_puzzle(min_rating=0, max_rating=5000, theme=None):
+    """Random stored puzzle in the rating band (indexed lookup), or None"""
+    from chess_engine.puzzles import PuzzleStore
+    with PuzzleStore(PUZZLE_DB) as store:
+        return store.random(min_rating, max_rating, theme)
 
-@app.route('/start_game')
-def start_game():
-    if 'username' not in session:
-        return redirect(url_for('login'))
-    
-    mode = request.args.get('mode', 'computer')
-    if mode == 'computer':
-        game_mode = GameMode.COMPUTER
-    elif mode == 'puzzle':
-        game_mode = GameMode.PUZZLE
-    elif mode == 'multiplayer':
-        game_mode = GameMode.MULTIPLAYER
-    elif mode == 'friend':
-        game_mode = GameMode.FRIEND
-    else:
-        flash('Invalid game mode', 'error')
-        return redirect(url_for('play_menu'))
-    
-    # In a real app, you would launch the game window here
-    # For this example, we'll just show a message
-    flash(f'Starting {mode} game...', 'info')
-    return redirect(url_for('index'))
+# Finished games go to the archive in the web app's database
+GAMES_DB = 'chess_users.db'
 
-@app.route('/puzzles')
-def puzzle_mode():
-    if 'username' not in session:
-        return redirect(url_for('login'))
-    return "Puzzle mode would launch here"
+def save_game(game, white, black, path=GAMES_DB):
+    """Archive a ChessGame's moves and result; returns the stored game id"""
+    from chess_engine.games import GameStore
+    with GameStore(path) as store:
+        start_fen = None if game.start_fen == STARTING_FEN else game.start_fen
+        return store.add(game.moves(), white, black, game.result(), start_fen)
 
-@app.route('/multiplayer')
-def multiplayer():
-    if 'username' not in session:
-        return redirect(url_for('login'))
-    return "Multiplayer mode would launch here"
+# Names that moved to the GUI and web modules, imported on first use
+_LAZY_MODULES = {
+    'FONT': 'chess_gui',
+    'LARGE_FONT': 'chess_gui',
+    'BoardRenderer': 'chess_gui',
+    'run_chess_game': 'chess_gui',
+    'app': 'chess_web',
+    'get_db_connection': 'chess_web',
+    'init_db': 'chess_web',
+}
 
-@app.route('/logout')
-def logout():
-    session.pop('username', None)
-    flash('You have been logged out', 'info')
-    return redirect(url_for('index'))
-
-# Main Game Loop
-def run_chess_game(mode=GameMode.COMPUTER):
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption('Python Chess')
-    clock = pygame.time.Clock()
-    
-    game = ChessGame(mode)
-    ai = ChessAI(game)
-    
-    running = True
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.MOUSEBUTTONDOWN and not game.game_over and not game.ai_thinking:
-                if event.button == 1:  # Left click
-                    col = event.pos[0] // SQUARE_SIZE
-                    row = event.pos[1] // SQUARE_SIZE
-                    
-                    if 0 <= row < 8 and 0 <= col < 8:
-                        if game.selected_piece:
-                            # Try to move the selected piece
-                            if game.make_move(game.selected_piece.position, (row, col)):
-                                game.selected_piece = None
-                                # AI move in computer mode
-                                if mode == GameMode.COMPUTER and not game.game_over and game.current_turn != game.player_color:
-                                    ai.make_move()
-                            elif game.mode == GameMode.PUZZLE:
-                                # Check puzzle solution
-                                pass
-                        else:
-                            # Select a piece
-                            piece = game.board[row][col]
-                            if piece and piece.color == game.current_turn:
-                                game.selected_piece = piece
-        
-        # Update timer
-        game.update_timer()
-        
-        # Draw everything
-        screen.fill(WHITE)
-        game.draw(screen)
-        pygame.display.flip()
-        clock.tick(FPS)
-    
-    pygame.quit()
+def __getattr__(name):
+    module = _LAZY_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    return getattr(importlib.import_module(module), name)
 
 # Run the application
 if __name__ == '__main__':
+    import webbrowser
+    from threading import Thread
+    from chess_web import app, init_db
+    from chess_gui import run_chess_game
+    
     # Initialize database
     init_db()
+    init_puzzle_db()
     
     # Start Flask server in a separate thread
     flask_thread = Thread(target=lambda: app.run(port=5000, threaded=True))
     flask_thread.daemon = True
     flask_thread.start()
     
+    # Multiplayer and friend games run on the asyncio game server
+    from chess_server import serve
+    Thread(target=serve, kwargs={'secret': app.secret_key}, daemon=True).start()
+    
     # Wait a moment for the server to start
     time.sleep(1)
     
@@ -874,4 +516,4 @@ if __name__ == '__main__':
     webbrowser.open('http://localhost:5000')
     
     # Run the chess game (for demo purposes, we'll run vs computer)
-    run_chess_game(GameMode.COMPUTER)
\ No newline at end of file
+    run_chess_game()
@@ -0,0 +1,248 @@
+"""
+Pygame front end for the chess game: cached board rendering and the main loop.
+
+Importing this module initialises pygame and loads the fonts, so only the
+GUI entry point imports it.
+"""
+
+import random
+import pygame
+from chess_game import (
+    WIDTH, HEIGHT, BOARD_SIZE, SQUARE_SIZE, FPS, WHITE, BLACK, LIGHT_SQUARE, DARK_SQUARE,
+    HIGHLIGHT, RED, GREEN, BLUE, PieceColor, GameMode, Piece, ChessGame, ChessAI,
+    puzzles, random_puzzle, save_game,
+)
+
+# Initialize pygame
+pygame.init()
+
+FONT = pygame.font.SysFont('Arial', 24)
+LARGE_FONT = pygame.font.SysFont('Arial', 36)
+
+# Board Renderer
+class BoardRenderer:
+    """Draws a ChessGame, repainting only the regions that changed
+
+    The square pattern, piece glyphs, highlight overlays and text are
+    rendered once and shared by every board; draw() returns the dirty
+    rectangles to pass to pygame.display.update.
+    """
+    _board_surface = None
+    _glyphs = {}
+    _highlights = {}
+    _texts = {}
+    
+    def __init__(self):
+        self.screen = None
+        self.squares = None  # (glyph key, highlight) shown on each square last frame
+        self.overlays = []  # text drawn over the board and panel last frame
+        self.targets_key = None
+        self.targets = set()
+    
+    def invalidate(self):
+        """Repaint everything on the next frame"""
+        self.squares = None
+    
+    @classmethod
+    def board_surface(cls):
+        if cls._board_surface is None:
+            surface = pygame.Surface((BOARD_SIZE * SQUARE_SIZE, BOARD_SIZE * SQUARE_SIZE))
+            for row in range(BOARD_SIZE):
+                for col in range(BOARD_SIZE):
+                    color = LIGHT_SQUARE if (row + col) % 2 == 0 else DARK_SQUARE
+                    pygame.draw.rect(surface, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+            cls._board_surface = surface
+        return cls._board_surface
+    
+    @classmethod
+    def glyph(cls, key):
+        surface = cls._glyphs.get(key)
+        if surface is None:
+            color, piece_type = key
+            text_color = WHITE if color == PieceColor.WHITE else BLACK
+            surface = cls._glyphs[key] = FONT.render(Piece(color, piece_type, None).get_symbol(), True, text_color)
+        return surface
+    
+    @classmethod
+    def highlight(cls, color):
+        surface = cls._highlights.get(color)
+        if surface is None:
+            surface = cls._highlights[color] = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+            surface.fill(color)
+        return surface
+    
+    @classmethod
+    def text(cls, font, message, color):
+        key = (id(font), message, color)
+        surface = cls._texts.get(key)
+        if surface is None:
+            if len(cls._texts) > 256:
+                cls._texts.clear()  # clock strings change every second
+            surface = cls._texts[key] = font.render(message, True, color)
+        return surface
+    
+    def possible_moves(self, game):
+        """Target squares of the selected piece, generated once per selection"""
+        piece = game.selected_piece
+        if piece is None:
+            return set()
+        key = (piece.position, game.position.hash, len(game.position.stack))
+        if key != self.targets_key:
+            self.targets_key = key
+            self.targets = set(game.get_possible_moves(piece))
+        return self.targets
+    
+    def overlay_texts(self, game):
+        """Text for this frame as (key, surface, position) tuples"""
+        overlays = []
+        
+        def add(font, message, color, pos=None, center_y=None):
+            surface = self.text(font, message, color)
+            if pos is None:
+                pos = (WIDTH//2 - surface.get_width()//2, center_y)
+            overlays.append(((id(font), message, color, pos), surface, pos))
+        
+        # Timers
+        add(FONT, f"White: {int(game.white_time//60)}:{int(game.white_time%60):02d}", BLACK, (20, HEIGHT - 80))
+        add(FONT, f"Black: {int(game.black_time//60)}:{int(game.black_time%60):02d}", BLACK, (WIDTH - 150, HEIGHT - 80))
+        
+        # Game status
+        if game.message_timer > 0:
+            add(LARGE_FONT, game.message, RED, center_y=HEIGHT - 40)
+        elif game.game_over:
+            if game.checkmate:
+                add(LARGE_FONT, f"Checkmate! {'White' if game.winner == PieceColor.WHITE else 'Black'} wins!", RED, center_y=HEIGHT - 40)
+            elif game.stalemate:
+                add(LARGE_FONT, "Stalemate! Game drawn.", BLUE, center_y=HEIGHT - 40)
+            else:
+                add(LARGE_FONT, f"Game Over! {'White' if game.winner == PieceColor.WHITE else 'Black'} wins!", RED, center_y=HEIGHT - 40)
+        elif game.check:
+            add(FONT, "CHECK!", RED, center_y=HEIGHT - 40)
+        
+        # Current turn and mode indicators
+        add(FONT, f"Current turn: {'White' if game.current_turn == PieceColor.WHITE else 'Black'}",
+            GREEN if game.current_turn == PieceColor.WHITE else BLACK, center_y=HEIGHT - 120)
+        add(FONT, f"Mode: {game.mode.name}", BLUE, center_y=10)
+        return overlays
+    
+    def draw(self, game, screen):
+        selected = game.selected_piece.position if game.selected_piece else None
+        targets = self.possible_moves(game)
+        squares = []
+        for row in range(BOARD_SIZE):
+            for col in range(BOARD_SIZE):
+                piece = game.board[row][col]
+                glyph = (piece.color, piece.type) if piece else None
+                highlight = HIGHLIGHT if (row, col) == selected else \
+                    (100, 255, 100, 150) if (row, col) in targets else None
+                squares.append((glyph, highlight))
+        overlays = self.overlay_texts(game)
+        
+        board_height = BOARD_SIZE * SQUARE_SIZE
+        panel = pygame.Rect(0, board_height, WIDTH, HEIGHT - board_height)
+        full = self.squares is None or screen is not self.screen
+        if full:
+            dirty = set(range(BOARD_SIZE * BOARD_SIZE))
+            panel_dirty = True
+        else:
+            dirty = {i for i, state in enumerate(squares) if state != self.squares[i]}
+            panel_dirty = False
+            old_keys = [overlay[0] for overlay in self.overlays]
+            new_keys = [overlay[0] for overlay in overlays]
+            if old_keys != new_keys:
+                # Clear where text was and where it goes: squares and/or the panel
+                for _, surface, pos in self.overlays + overlays:
+                    rect = surface.get_rect(topleft=pos)
+                    panel_dirty = panel_dirty or rect.colliderect(panel)
+                    for row in range(max(0, rect.top // SQUARE_SIZE), min(BOARD_SIZE, (rect.bottom - 1) // SQUARE_SIZE + 1)):
+                        for col in range(max(0, rect.left // SQUARE_SIZE), min(BOARD_SIZE, (rect.right - 1) // SQUARE_SIZE + 1)):
+                            dirty.add(row * BOARD_SIZE + col)
+        
+        rects = []
+        board = self.board_surface()
+        for i in sorted(dirty):
+            row, col = divmod(i, BOARD_SIZE)
+            rect = pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+            screen.blit(board, rect, rect)
+            glyph, highlight = squares[i]
+            if highlight:
+                screen.blit(self.highlight(highlight), rect)
+            if glyph:
+                text = self.glyph(glyph)
+                screen.blit(text, (rect.centerx - text.get_width()//2, rect.centery - text.get_height()//2))
+            rects.append(rect)
+        if panel_dirty:
+            screen.fill(WHITE, panel)
+            rects.append(panel)
+        
+        # Text sits on top of whatever was repainted underneath it
+        for rect in rects:
+            screen.set_clip(rect)
+            for _, surface, pos in overlays:
+                if rect.colliderect(surface.get_rect(topleft=pos)):
+                    screen.blit(surface, pos)
+        screen.set_clip(None)
+        
+        self.screen = screen
+        self.squares = squares
+        self.overlays = overlays
+        if full:
+            return [screen.get_rect()]
+        return rects
+
+# Main Game Loop
+def run_chess_game(mode=GameMode.COMPUTER):
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption('Python Chess')
+    clock = pygame.time.Clock()
+    
+    game = ChessGame(mode)
+    ai = ChessAI(game)
+    if mode == GameMode.PUZZLE:
+        game.load_puzzle(random_puzzle() or random.choice(puzzles))
+    
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                ai.stop_thinking()
+                running = False
+            elif event.type == pygame.MOUSEBUTTONDOWN and not game.game_over and not game.ai_thinking:
+                if event.button == 1:  # Left click
+                    col = event.pos[0] // SQUARE_SIZE
+                    row = event.pos[1] // SQUARE_SIZE
+                    
+                    if 0 <= row < 8 and 0 <= col < 8:
+                        if game.selected_piece:
+                            # Try to move the selected piece
+                            if game.make_move(game.selected_piece.position, (row, col)):
+                                game.selected_piece = None
+                                if game.mode == GameMode.PUZZLE:
+                                    # Check puzzle solution
+                                    game.check_puzzle_move()
+                                # AI move in computer mode, found in the background
+                                elif mode == GameMode.COMPUTER and not game.game_over and game.current_turn != game.player_color:
+                                    ai.start_thinking()
+                        else:
+                            # Select a piece
+                            piece = game.board[row][col]
+                            if piece and piece.color == game.current_turn:
+                                game.selected_piece = piece
+        
+        # Play the engine's move once the background search delivers it,
+        # then ponder on the player's time
+        if game.ai_thinking and ai.poll():
+            ai.start_pondering()
+        
+        # Update timer
+        game.update_timer()
+        
+        # Draw only what changed since the last frame
+        pygame.display.update(game.draw(screen))
+        clock.tick(FPS)
+    
+    ai.close()
+    if mode == GameMode.COMPUTER and game.moves():
+        save_game(game, 'Player', 'Computer')
+    pygame.quit()
+
@@ -0,0 +1,608 @@
+"""
+Asyncio multiplayer server for GameMode.MULTIPLAYER and GameMode.FRIEND.
+
+One process hosts every live ChessGame in memory. Players connect over
+WebSocket (RFC 6455, implemented on asyncio streams so no extra package
+is needed) and exchange JSON messages:
+
+    -> {"type": "join", "token": t}                 random opponent
+    -> {"type": "join", "token": t, "friend": "k"}  opponent with the same code
+    <- {"type": "start", "game": 7, "color": "white", "opponent": "bob", "fen": ...}
+    -> {"type": "move", "move": "e2e4"}
+    <- {"type": "move", "move": "e2e4", "fen": ..., "ply": 1, "clock": [598.2, 600]}
+    -> {"type": "resign"}
+    <- {"type": "end", "result": "1-0", "reason": "checkmate"}
+    <- {"type": "error", "message": ...}
+
+Moves are checked against the game's legal moves on the server and sent to
+both players. The server keeps both clocks and ends the game on time when
+the player on move runs out, whether or not they send a move. Finished games are queued and written to the games table in
+batches by a background task. GET /stats answers with per-move latency
+percentiles as JSON.
+
+Players are named by a token chess_web signs for the logged-in user
+(sign_player) with a secret it shares with the server; with a secret set,
+joins without a valid token are refused. A server without a secret (bench
+runs, local testing) takes the "name" of the join message instead and
+saves those games unrated, so nobody can move another account's rating.
+
+    python chess_server.py serve --port 8765 --secret "$CHESS_SERVER_SECRET"
+    python chess_server.py bench --games 1000
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+
+from chess_engine import Position, move_to_uci
+from chess_engine.san import parse_uci
+from chess_game import GAMES_DB, ChessGame, GameMode, PieceColor
+
+HOST = '127.0.0.1'
+PORT = 8765
+FLUSH_INTERVAL = 1.0  # seconds between writes of finished games
+FLUSH_BATCH = 500
+MAX_MESSAGE = 1 << 16
+LATENCY_SAMPLES = 100000
+TOKEN_TTL = 3600  # seconds a signed player token stays valid for joining
+CLOCK = 600  # seconds on each player's clock
+
+_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_TEXT, _CLOSE, _PING, _PONG = 0x1, 0x8, 0x9, 0xA
+
+
+def _mask(payload, key):
+    """XOR payload with the repeating 4 byte key (masking and unmasking are the same)"""
+    n = len(payload)
+    stream = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, 'little') ^ int.from_bytes(stream, 'little')).to_bytes(n, 'little')
+
+
+def _frame(opcode, payload, masked):
+    head = bytearray([0x80 | opcode])
+    bit = 0x80 if masked else 0
+    n = len(payload)
+    if n < 126:
+        head.append(bit | n)
+    elif n < 1 << 16:
+        head.append(bit | 126)
+        head += n.to_bytes(2, 'big')
+    else:
+        head.append(bit | 127)
+        head += n.to_bytes(8, 'big')
+    if masked:
+        key = os.urandom(4)
+        head += key
+        payload = _mask(payload, key)
+    return bytes(head) + payload
+
+
+def _signature(payload, secret):
+    key = secret if isinstance(secret, bytes) else secret.encode()
+    return hmac.new(key, b'chess-server:' + payload.encode(), hashlib.sha256).hexdigest()
+
+
+def sign_player(name, secret, ttl=TOKEN_TTL):
+    """Token naming a logged-in player, for the join message"""
+    payload = f"{int(time.time() + ttl)}:{name}"
+    return f"{payload}:{_signature(payload, secret)}"
+
+
+def verify_player(token, secret):
+    """Player name from a sign_player token, or None if it is forged or expired"""
+    payload, _, signature = token.rpartition(':')
+    expires, _, name = payload.partition(':')
+    if not name or not hmac.compare_digest(signature, _signature(payload, secret)):
+        return None
+    try:
+        return name if int(expires) >= time.time() else None
+    except ValueError:
+        return None
+
+
+class WebSocket:
+    """Text-message WebSocket over an asyncio stream pair (clients mask their frames)"""
+
+    def __init__(self, reader, writer, client=False):
+        self.reader = reader
+        self.writer = writer
+        self.client = client
+        self.closed = False
+
+    @classmethod
+    async def accept(cls, reader, writer, headers):
+        key = headers.get('sec-websocket-key', '').encode()
+        accept = base64.b64encode(hashlib.sha1(key + _GUID).digest()).decode()
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                      f'Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+        await writer.drain()
+        return cls(reader, writer)
+
+    @classmethod
+    async def connect(cls, host, port, path='/'):
+        reader, writer = await asyncio.open_connection(host, port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\n'
+                      f'Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n'
+                      'Sec-WebSocket-Version: 13\r\n\r\n').encode())
+        await writer.drain()
+        status = await reader.readuntil(b'\r\n\r\n')
+        if b' 101 ' not in status.split(b'\r\n', 1)[0]:
+            writer.close()
+            raise ConnectionError(f"WebSocket handshake refused: {status[:40]!r}")
+        return cls(reader, writer, client=True)
+
+    async def send(self, text):
+        self.writer.write(_frame(_TEXT, text.encode(), self.client))
+        await self.writer.drain()
+
+    async def recv(self):
+        """Next text message, or None once the connection is closed"""
+        fragments = []
+        try:
+            while True:
+                head = await self.reader.readexactly(2)
+                opcode, length = head[0] & 0x0F, head[1] & 0x7F
+                if length == 126:
+                    length = int.from_bytes(await self.reader.readexactly(2), 'big')
+                elif length == 127:
+                    length = int.from_bytes(await self.reader.readexactly(8), 'big')
+                if length > MAX_MESSAGE:
+                    break
+                key = await self.reader.readexactly(4) if head[1] & 0x80 else None
+                payload = await self.reader.readexactly(length)
+                if key:
+                    payload = _mask(payload, key)
+                if opcode == _CLOSE:
+                    break
+                if opcode == _PING:
+                    self.writer.write(_frame(_PONG, payload, self.client))
+                    continue
+                if opcode == _PONG:
+                    continue
+                fragments.append(payload)
+                if head[0] & 0x80:
+                    return b''.join(fragments).decode('utf-8', 'replace')
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        await self.close()
+        return None
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.writer.write(_frame(_CLOSE, b'', self.client))
+            self.writer.close()
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+class Player:
+    def __init__(self, name, ws, verified=False):
+        self.name = name
+        self.ws = ws
+        self.verified = verified  # name proven by a signed token
+        self.session = None
+        self.color = None
+
+    async def send(self, message):
+        if not self.ws.closed:
+            try:
+                await self.ws.send(json.dumps(message))
+            except (ConnectionError, OSError):
+                await self.ws.close()
+
+
+class Session:
+    def __init__(self, game_id, white, black, mode):
+        self.id = game_id
+        self.game = ChessGame(mode)
+        self.players = {PieceColor.WHITE: white, PieceColor.BLACK: black}
+        self.flag = None  # call_later handle that ends the game when the mover's time runs out
+        for color, player in self.players.items():
+            player.session = self
+            player.color = color
+
+    async def broadcast(self, message):
+        # drain() only suspends when a socket buffer is full, so in the usual
+        # case both players are written without yielding to other sessions
+        for player in self.players.values():
+            await player.send(message)
+
+
+class GameServer:
+    def __init__(self, database=GAMES_DB, flush_interval=FLUSH_INTERVAL, secret=None,
+                 clock=CLOCK):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.secret = secret  # shared with chess_web; None lets guests play unrated
+        self.sessions = {}
+        self.waiting = None  # player waiting for a random opponent
+        self.invites = {}    # friend code -> waiting player
+        self.finished = []   # add_many() rows not yet written
+        self.saved = 0
+        self.moves = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)  # seconds to validate and deliver a move
+        self._next_id = 0
+        self._server = None
+        self._flusher = None
+        self._sockets = set()
+        self._handlers = set()
+
+    async def start(self, host=HOST, port=PORT):
+        self._server = await asyncio.start_server(self._connection, host, port, backlog=4096)
+        self._flusher = asyncio.create_task(self._flush_loop())
+        return self._server
+
+    async def close(self):
+        """Stop accepting, hang up on every player (their games end) and save what finished"""
+        if self._server:
+            self._server.close()
+        for ws in list(self._sockets):
+            await ws.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        if self._server:
+            await self._server.wait_closed()
+        if self._flusher:
+            self._flusher.cancel()
+        await self.flush()
+
+    def stats(self):
+        samples = sorted(self.latencies)
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3) \
+                if samples else None
+        return {'sessions': len(self.sessions), 'moves': self.moves, 'saved': self.saved,
+                'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95),
+                               'p99': percentile(0.99), 'max': percentile(1.0)}}
+
+    async def _connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            await self._serve_client(reader, writer)
+        finally:
+            self._handlers.discard(task)
+
+    async def _serve_client(self, reader, writer):
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        lines = request.decode('latin-1').split('\r\n')
+        path = lines[0].split()[1] if len(lines[0].split()) > 1 else '/'
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('upgrade', '').lower() != 'websocket':
+            if path == '/stats':
+                body, status = json.dumps(self.stats()).encode(), '200 OK'
+            else:
+                body, status = b'WebSocket endpoint\n', '400 Bad Request'
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\n'
+                         f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+            await writer.drain()
+            writer.close()
+            return
+        ws = await WebSocket.accept(reader, writer, headers)
+        self._sockets.add(ws)
+        player = None
+        while True:
+            text = await ws.recv()
+            if text is None:
+                break
+            received = time.perf_counter()
+            try:
+                message = json.loads(text)
+                kind = message.get('type')
+            except (ValueError, AttributeError):
+                await ws.send(json.dumps({'type': 'error', 'message': 'bad message'}))
+                continue
+            if kind == 'join' and player is None:
+                if self.secret:
+                    name = verify_player(str(message.get('token') or ''), self.secret)
+                    if name is None:
+                        await ws.send(json.dumps({'type': 'error', 'message': 'login required'}))
+                        continue
+                    player = Player(name, ws, verified=True)
+                else:
+                    player = Player(str(message.get('name') or 'Guest')[:40], ws)
+                await self._join(player, message.get('friend'))
+            elif kind == 'move' and player and player.session:
+                if await self._move(player, str(message.get('move', ''))):
+                    self.latencies.append(time.perf_counter() - received)
+            elif kind == 'resign' and player and player.session:
+                game = player.session.game
+                game.winner = PieceColor(1 - player.color.value)
+                await self._end(player.session, 'resignation')
+            elif player:
+                await player.send({'type': 'error', 'message': f'unexpected {kind!r}'})
+            else:
+                await ws.send(json.dumps({'type': 'error', 'message': 'join first'}))
+        self._sockets.discard(ws)
+        await self._disconnect(player)
+
+    async def _join(self, player, friend):
+        if friend:
+            opponent = self.invites.pop(friend, None)
+            if opponent is None or opponent.ws.closed:
+                self.invites[friend] = player
+                await player.send({'type': 'waiting', 'friend': friend})
+                return
+            mode = GameMode.FRIEND
+        else:
+            opponent = self.waiting
+            if opponent is None or opponent.ws.closed:
+                self.waiting = player
+                await player.send({'type': 'waiting'})
+                return
+            self.waiting = None
+            mode = GameMode.MULTIPLAYER
+        white, black = (opponent, player) if random.random() < 0.5 else (player, opponent)
+        self._next_id += 1
+        session = Session(self._next_id, white, black, mode)
+        session.game.white_time = session.game.black_time = self.clock
+        session.game.last_move_time = time.time()
+        self.sessions[session.id] = session
+        self._arm_flag(session)
+        fen = session.game.to_fen()
+        await asyncio.gather(
+            white.send({'type': 'start', 'game': session.id, 'color': 'white',
+                        'opponent': black.name, 'fen': fen}),
+            black.send({'type': 'start', 'game': session.id, 'color': 'black',
+                        'opponent': white.name, 'fen': fen}))
+
+    async def _move(self, player, text):
+        session = player.session
+        game = session.game
+        if game.current_turn != player.color:
+            await player.send({'type': 'error', 'message': 'not your turn'})
+            return False
+        try:
+            move = parse_uci(game.position, text)
+        except ValueError:
+            await player.send({'type': 'error', 'message': f'illegal move {text!r}'})
+            return False
+        game.update_timer()
+        if game.game_over:  # flag fell before the move arrived
+            await self._end(session, 'time')
+            return False
+        game.push(move)
+        self.moves += 1
+        await session.broadcast({'type': 'move', 'move': move_to_uci(move), 'fen': game.to_fen(),
+                                 'ply': len(game.position.stack),
+                                 'clock': [round(game.white_time, 1), round(game.black_time, 1)]})
+        if game.game_over:
+            await self._end(session, 'checkmate' if game.checkmate else 'stalemate')
+        else:
+            self._arm_flag(session)
+        return True
+
+    def _arm_flag(self, session):
+        """(Re)schedule the flag fall of the side to move, so a player who stops moving loses"""
+        if session.flag:
+            session.flag.cancel()
+        game = session.game
+        remaining = game.white_time if game.current_turn == PieceColor.WHITE else game.black_time
+        session.flag = asyncio.get_running_loop().call_later(
+            max(remaining, 0), self._flag_timer, session)
+
+    def _flag_timer(self, session):
+        task = asyncio.ensure_future(self._flag_fall(session))
+        self._handlers.add(task)
+        task.add_done_callback(self._handlers.discard)
+
+    async def _flag_fall(self, session):
+        if session.id not in self.sessions:
+            return
+        game = session.game
+        game.update_timer()
+        if game.game_over:
+            await self._end(session, 'time')
+        else:  # timer fired a little early
+            self._arm_flag(session)
+
+    async def _end(self, session, reason):
+        if self.sessions.pop(session.id, None) is None:
+            return
+        if session.flag:
+            session.flag.cancel()
+        game = session.game
+        game.game_over = True
+        result = game.result()
+        await session.broadcast({'type': 'end', 'result': result, 'reason': reason})
+        for player in session.players.values():
+            player.session = None
+        white, black = session.players[PieceColor.WHITE], session.players[PieceColor.BLACK]
+        self.finished.append({
+            'moves': game.moves(), 'white': white.name, 'black': black.name, 'result': result,
+            'headers': {'Event': 'Online game', 'Termination': reason},
+            'rated': white.verified and black.verified,
+        })
+        if len(self.finished) >= FLUSH_BATCH:
+            await self.flush()
+
+    async def _disconnect(self, player):
+        if player is None:
+            return
+        if self.waiting is player:
+            self.waiting = None
+        for code, waiting in list(self.invites.items()):
+            if waiting is player:
+                del self.invites[code]
+        if player.session:
+            player.session.game.winner = PieceColor(1 - player.color.value)
+            await self._end(player.session, 'abandoned')
+
+    async def flush(self):
+        """Write queued finished games in one transaction, off the event loop"""
+        if not self.finished:
+            return
+        batch, self.finished = self.finished, []
+        try:
+            self.saved += await asyncio.to_thread(self._save, batch)
+        except Exception:
+            self.finished = batch + self.finished  # retried on the next flush
+            raise
+
+    def _save(self, batch):
+        from chess_engine import ratings
+        from chess_engine.games import GameStore
+        with GameStore(self.database) as store:
+            saved = store.add_many(batch)
+            ratings.rate_saved(store.conn)
+            return saved
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Saving games failed: {e!r}")
+
+
+async def _bench_client(host, port, name, max_plies, rtts, rng):
+    """Simulated player: random legal moves until the game ends or max_plies"""
+    ws = await WebSocket.connect(host, port)
+    await ws.send(json.dumps({'type': 'join', 'name': name}))
+    position = Position()
+    color = None
+    sent = None
+    while True:
+        text = await ws.recv()
+        if text is None:
+            return
+        message = json.loads(text)
+        kind = message['type']
+        if kind == 'start':
+            color = 0 if message['color'] == 'white' else 1
+        elif kind == 'move':
+            position.push(parse_uci(position, message['move']))
+            if sent is not None and position.turn != color:
+                rtts.append(time.perf_counter() - sent)
+                sent = None
+        elif kind == 'end':
+            await ws.close()
+            return
+        if color is None or position.turn != color or kind not in ('start', 'move'):
+            continue
+        moves = position.generate_legal_moves()
+        if not moves:
+            continue  # mate or stalemate: the end message follows
+        if len(position.stack) >= max_plies:
+            await ws.send(json.dumps({'type': 'resign'}))
+            continue
+        move = rng.choice(moves)
+        sent = time.perf_counter()
+        await ws.send(json.dumps({'type': 'move', 'move': move_to_uci(move)}))
+
+
+def serve(host=HOST, port=PORT, database=GAMES_DB, stop=None, ready=None, secret=None,
+          clock=CLOCK):
+    """Run a GameServer until stop (a threading or multiprocessing Event) is set"""
+    async def run():
+        server = GameServer(database, secret=secret, clock=clock)
+        await server.start(host, port)
+        if ready is not None:
+            ready.set()
+        try:
+            if stop is None:
+                await asyncio.Event().wait()
+            else:
+                await asyncio.to_thread(stop.wait)
+        finally:
+            await server.close()
+    asyncio.run(run())
+
+
+async def _fetch_stats(port):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    writer.write(b'GET /stats HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+
+async def bench(games=100, max_plies=40, database='bench_games.db', port=PORT + 1, seed=1):
+    """Play games between simulated clients and a server process; returns a report dict
+
+    The server runs in its own process so its move latency is not mixed
+    with the clients' work; client_rtt_ms is send-to-echo time seen by the
+    clients, which includes their own move generation when they share a
+    CPU with the server.
+    """
+    import multiprocessing
+    ready, stop = multiprocessing.Event(), multiprocessing.Event()
+    process = multiprocessing.Process(target=serve, args=(HOST, port, database, stop, ready))
+    process.start()
+    try:
+        await asyncio.to_thread(ready.wait, 30)
+        rng = random.Random(seed)
+        rtts = []
+        start = time.perf_counter()
+        await asyncio.gather(*(_bench_client(HOST, port, f'bot{i}', max_plies, rtts, rng)
+                               for i in range(2 * games)))
+        elapsed = time.perf_counter() - start
+        report = await _fetch_stats(port)
+    finally:
+        stop.set()
+        await asyncio.to_thread(process.join, 30)
+    rtts.sort()
+    report.update({
+        'games': games, 'seconds': round(elapsed, 2),
+        'moves_per_second': round(report['moves'] / elapsed),
+        'client_rtt_ms': {p: round(rtts[min(len(rtts) - 1, int(q * len(rtts)))] * 1000, 3)
+                          for p, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))}
+        if rtts else None,
+    })
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Multiplayer game server")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_cmd = commands.add_parser('serve', help="run the server")
+    serve_cmd.add_argument('--host', default=HOST)
+    serve_cmd.add_argument('--port', type=int, default=PORT)
+    serve_cmd.add_argument('-d', '--database', default=GAMES_DB)
+    serve_cmd.add_argument('--secret', default=os.environ.get('CHESS_SERVER_SECRET'),
+                           help="key shared with chess_web for player tokens "
+                                "(default $CHESS_SERVER_SECRET; without one games are unrated)")
+    load = commands.add_parser('bench', help="play simulated games and report move latency")
+    load.add_argument('--games', type=int, default=100)
+    load.add_argument('--max-plies', type=int, default=40)
+    load.add_argument('-d', '--database', default='bench_games.db')
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        print(json.dumps(asyncio.run(bench(args.games, args.max_plies, args.database)), indent=2))
+        return 0
+
+    print(f"Serving games on ws://{args.host}:{args.port}")
+    try:
+        serve(args.host, args.port, args.database, secret=args.secret)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
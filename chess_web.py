@@ -0,0 +1,415 @@
+"""
+Flask site for accounts, the play menu and puzzles.
+"""
+
+import secrets
+import sqlite3
+import threading
+from flask import Flask, render_template_string, request, redirect, url_for, session, flash, g, jsonify
+from werkzeug.security import generate_password_hash, check_password_hash
+from chess_engine import analysis, ratings
+from chess_engine.db import ConnectionPool
+from chess_engine.games import create_schema as create_games_schema
+from chess_game import GameMode, random_puzzle
+from chess_server import PORT as GAME_SERVER_PORT, sign_player
+
+# Flask Web Application for Authentication
+app = Flask(__name__)
+app.secret_key = 'your_secret_key_here'
+
+# Database setup
+DATABASE = 'chess_users.db'
+
+# Schema versions, applied in order by chess_engine.db.migrate; append new
+# steps, never edit old ones
+MIGRATIONS = [
+    # 1: accounts (IF NOT EXISTS adopts databases made before migrations)
+    ['''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            email TEXT UNIQUE,
+            rating INTEGER DEFAULT 1000,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''],
+    # 2: games archive with packed move lists
+    create_games_schema,
+    # 3: rating updates and the leaderboard index
+    ratings.MIGRATION,
+    # 4: engine annotations of stored games
+    analysis.SCHEMA,
+]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def db_pool():
+    """The users database pool, migrated on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(DATABASE, migrations=MIGRATIONS)
+        return _pool
+
+def get_db_connection():
+    """This request's pooled connection; it goes back to the pool at teardown"""
+    if 'db' not in g:
+        g.db = db_pool().acquire()
+    return g.db
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool().release(conn)
+
+def init_db():
+    db_pool()
+
+# Longest search per position a web request may ask for, in milliseconds
+MAX_ANALYSIS_MOVETIME = 10000
+MAX_ANALYSIS_POSITIONS = 500  # per request
+MAX_ANALYSIS_JOBS = 3         # unfinished requests per user
+MAX_ANALYSIS_QUEUED = 5000    # positions waiting across all users
+
+_analysis = None
+_analysis_lock = threading.Lock()
+
+def analysis_service():
+    """The engine worker pool for /api/analysis, started on first use"""
+    global _analysis
+    with _analysis_lock:
+        if _analysis is None:
+            _analysis = analysis.AnalysisService(max_batch=MAX_ANALYSIS_POSITIONS,
+                                                 max_jobs_per_owner=MAX_ANALYSIS_JOBS,
+                                                 max_queued=MAX_ANALYSIS_QUEUED)
+        return _analysis
+
+# HTML Templates
+base_template = '''
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Chess Game</title>
+    <style>
+        body { font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }
+        .alert { padding: 10px; margin: 10px 0; border-radius: 4px; }
+        .alert-error { background-color: #ffdddd; color: #ff0000; }
+        .alert-success { background-color: #ddffdd; color: #00aa00; }
+        .alert-info { background-color: #ddddff; color: #0000aa; }
+        .game-mode { 
+            display: inline-block; 
+            width: 200px; 
+            height: 100px; 
+            margin: 10px; 
+            padding: 20px;
+            border: 1px solid #ccc;
+            border-radius: 5px;
+            text-align: center;
+            vertical-align: top;
+            cursor: pointer;
+        }
+        .game-mode:hover { background-color: #f0f0f0; }
+        nav { background: #f8f8f8; padding: 10px; margin-bottom: 20px; }
+        nav a { margin-right: 15px; text-decoration: none; color: #333; }
+        nav a:hover { text-decoration: underline; }
+    </style>
+</head>
+<body>
+    <nav>
+        <a href="/">Home</a>
+        <a href="/leaderboard">Leaderboard</a>
+        {% if 'username' in session %}
+            <a href="/play">Play</a>
+            <a href="/puzzles">Puzzles</a>
+            <a href="/multiplayer">Multiplayer</a>
+            <a href="/logout">Logout ({{ session['username'] }})</a>
+        {% else %}
+            <a href="/login">Login</a>
+            <a href="/register">Register</a>
+        {% endif %}
+    </nav>
+    {% with messages = get_flashed_messages(with_categories=true) %}
+        {% if messages %}
+            {% for category, message in messages %}
+                <div class="alert alert-{{ category }}">{{ message }}</div>
+            {% endfor %}
+        {% endif %}
+    {% endwith %}
+    {% block content %}{% endblock %}
+</body>
+</html>
+'''
+
+login_template = '''
+{% extends "base.html" %}
+{% block content %}
+    <h1>Login</h1>
+    <form method="POST">
+        <label for="username">Username:</label>
+        <input type="text" id="username" name="username" required><br>
+        <label for="password">Password:</label>
+        <input type="password" id="password" name="password" required><br>
+        <button type="submit">Login</button>
+    </form>
+    <p>Don't have an account? <a href="{{ url_for('register') }}">Register here</a></p>
+{% endblock %}
+'''
+
+register_template = '''
+{% extends "base.html" %}
+{% block content %}
+    <h1>Register</h1>
+    <form method="POST">
+        <label for="username">Username:</label>
+        <input type="text" id="username" name="username" required><br>
+        <label for="email">Email (optional):</label>
+        <input type="email" id="email" name="email"><br>
+        <label for="password">Password:</label>
+        <input type="password" id="password" name="password" required><br>
+        <button type="submit">Register</button>
+    </form>
+    <p>Already have an account? <a href="{{ url_for('login') }}">Login here</a></p>
+{% endblock %}
+'''
+
+play_template = '''
+{% extends "base.html" %}
+{% block content %}
+    <h1>Choose Game Mode</h1>
+    <div>
+        <div class="game-mode" onclick="window.location.href='/start_game?mode=computer'">
+            <h3>vs Computer</h3>
+            <p>Play against AI with adjustable difficulty</p>
+        </div>
+        <div class="game-mode" onclick="window.location.href='/start_game?mode=puzzle'">
+            <h3>Puzzles</h3>
+            <p>Solve tactical chess puzzles</p>
+        </div>
+        <div class="game-mode" onclick="window.location.href='/start_game?mode=multiplayer'">
+            <h3>Multiplayer</h3>
+            <p>Play against random opponents online</p>
+        </div>
+        <div class="game-mode" onclick="window.location.href='/start_game?mode=friend'">
+            <h3>Play with Friend</h3>
+            <p>Challenge a specific friend</p>
+        </div>
+    </div>
+{% endblock %}
+'''
+
+# Flask Routes
+@app.route('/')
+def index():
+    if 'username' in session:
+        return render_template_string(base_template + '''
+            <h1>Welcome to Chess Game, {{ session['username'] }}!</h1>
+            <p>Select a game mode from the navigation menu to start playing.</p>
+        ''')
+    return render_template_string(base_template + '''
+        <h1>Welcome to Chess Game!</h1>
+        <p>Please <a href="/login">login</a> or <a href="/register">register</a> to play.</p>
+    ''')
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        
+        user = get_db_connection().execute('SELECT * FROM users WHERE username = ?',
+                                           (username,)).fetchone()
+        
+        if user and check_password_hash(user['password'], password):
+            session['username'] = username
+            flash('Login successful!', 'success')
+            return redirect(url_for('index'))
+        else:
+            flash('Invalid username or password', 'error')
+    
+    return render_template_string(login_template)
+
+@app.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = generate_password_hash(request.form['password'])
+        email = request.form.get('email', '')
+        
+        conn = get_db_connection()
+        try:
+            conn.execute('INSERT INTO users (username, password, email) VALUES (?, ?, ?)',
+                         (username, password, email))
+            conn.commit()
+            flash('Registration successful! Please log in.', 'success')
+            return redirect(url_for('login'))
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            flash('Username or email already exists', 'error')
+    
+    return render_template_string(register_template)
+
+@app.route('/play')
+def play_menu():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    return render_template_string(play_template)
+
+@app.route('/start_game')
+def start_game():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    
+    mode = request.args.get('mode', 'computer')
+    if mode == 'computer':
+        game_mode = GameMode.COMPUTER
+    elif mode == 'puzzle':
+        game_mode = GameMode.PUZZLE
+    elif mode == 'multiplayer':
+        return redirect(url_for('multiplayer'))
+    elif mode == 'friend':
+        return redirect(url_for('multiplayer', friend=secrets.token_urlsafe(6)))
+    else:
+        flash('Invalid game mode', 'error')
+        return redirect(url_for('play_menu'))
+    
+    # In a real app, you would launch the game window here
+    # For this example, we'll just show a message
+    flash(f'Starting {mode} game...', 'info')
+    return redirect(url_for('index'))
+
+@app.route('/puzzles')
+def puzzle_mode():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    puzzle = random_puzzle(request.args.get('min_rating', 0, type=int),
+                           request.args.get('max_rating', 5000, type=int),
+                           request.args.get('theme'))
+    if puzzle is None:
+        flash('No puzzle found for that rating range', 'error')
+        return redirect(url_for('play_menu'))
+    return render_template_string(base_template + '''
+        <h1>Puzzle #{{ puzzle.id }} (rating {{ puzzle.rating }})</h1>
+        <p>{{ puzzle.description or 'Find the best move' }}</p>
+        <p><code>{{ puzzle.fen }}</code></p>
+        <p>Themes: {{ puzzle.themes|join(', ') }}</p>
+        <p><a href="/puzzles?min_rating={{ puzzle.rating - 100 }}&max_rating={{ puzzle.rating + 100 }}">Another puzzle like this</a></p>
+    ''', puzzle=puzzle)
+
+@app.route('/leaderboard')
+def leaderboard():
+    conn = get_db_connection()
+    after = None
+    if 'rating' in request.args and 'id' in request.args:
+        after = (request.args.get('rating', type=int), request.args.get('id', type=int))
+    board = ratings.leaderboard(conn, ratings.PAGE_SIZE, after)
+    mine = ratings.rank(conn, session['username']) if 'username' in session else None
+    return render_template_string(base_template + '''
+        <h1>Leaderboard</h1>
+        {% if mine %}<p>Your rank: #{{ mine[0] }} (rating {{ mine[1] }})</p>{% endif %}
+        <table>
+            <tr><th>Rank</th><th>Player</th><th>Rating</th></tr>
+            {% for rank, username, rating, id in board %}
+            <tr><td>{{ rank }}</td><td>{{ username }}</td><td>{{ rating }}</td></tr>
+            {% endfor %}
+        </table>
+        {% if board|length == page_size %}
+        <p><a href="/leaderboard?rating={{ board[-1][2] }}&id={{ board[-1][3] }}">Next page</a></p>
+        {% endif %}
+    ''', board=board, mine=mine, page_size=ratings.PAGE_SIZE)
+
+@app.route('/multiplayer')
+def multiplayer():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    return render_template_string(base_template + '''
+        <h1>{{ 'Play a friend' if friend else 'Multiplayer' }}</h1>
+        {% if friend %}
+        <p>Send your friend this link: <code>{{ request.url }}</code></p>
+        {% endif %}
+        <p id="status">Connecting...</p>
+        <pre id="board"></pre>
+        <p id="moves"></p>
+        <form id="move-form"><input id="move" placeholder="e2e4" size="6"> <button>Move</button>
+        <button type="button" id="resign">Resign</button></form>
+        <script>
+        const status = document.getElementById('status');
+        const ws = new WebSocket('ws://' + location.hostname + ':{{ port }}/');
+        const moves = [];
+        function show(fen) {
+            document.getElementById('board').textContent = fen.split(' ')[0].split('/')
+                .map(row => row.replace(/\\d/g, n => '.'.repeat(n)).split('').join(' ')).join('\\n');
+        }
+        ws.onopen = () => ws.send(JSON.stringify({type: 'join', token: {{ token|tojson }},
+                                                  friend: {{ friend|tojson }}}));
+        ws.onmessage = event => {
+            const message = JSON.parse(event.data);
+            if (message.type === 'waiting') status.textContent = 'Waiting for an opponent...';
+            if (message.type === 'start') {
+                status.textContent = 'Playing ' + message.color + ' against ' + message.opponent;
+                show(message.fen);
+            }
+            if (message.type === 'move') {
+                moves.push(message.move);
+                document.getElementById('moves').textContent = moves.join(' ');
+                show(message.fen);
+            }
+            if (message.type === 'end') status.textContent = 'Game over: ' + message.result + ' (' + message.reason + ')';
+            if (message.type === 'error') status.textContent = message.message;
+        };
+        ws.onclose = () => { status.textContent += ' (disconnected)'; };
+        document.getElementById('move-form').onsubmit = event => {
+            event.preventDefault();
+            ws.send(JSON.stringify({type: 'move', move: document.getElementById('move').value.trim()}));
+            document.getElementById('move').value = '';
+        };
+        document.getElementById('resign').onclick = () => ws.send(JSON.stringify({type: 'resign'}));
+        </script>
+    ''', friend=request.args.get('friend'),
+       token=sign_player(session['username'], app.secret_key), port=GAME_SERVER_PORT)
+
+@app.route('/api/analysis', methods=['POST'])
+def submit_analysis():
+    """Queue {"fens": [...], "depth": n, "movetime": ms}; returns the job id to poll"""
+    if 'username' not in session:
+        return jsonify(error='login required'), 401
+    data = request.get_json(silent=True) or {}
+    fens, depth, movetime = data.get('fens'), data.get('depth'), data.get('movetime')
+    if not isinstance(fens, list) or not all(isinstance(fen, str) for fen in fens):
+        return jsonify(error='fens must be a list of FEN strings'), 400
+    if not all(value is None or type(value) is int for value in (depth, movetime)):
+        return jsonify(error='depth and movetime must be integers'), 400
+    # Every web search is time-bounded, whatever depth was asked for
+    if movetime is None:
+        movetime = MAX_ANALYSIS_MOVETIME if depth is not None else analysis.DEFAULT_MOVETIME
+    movetime = min(movetime, MAX_ANALYSIS_MOVETIME)
+    try:
+        job_id = analysis_service().submit(fens, depth, movetime, owner=session['username'])
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except analysis.AnalysisBusy as e:
+        return jsonify(error=str(e)), 429
+    return jsonify(job=job_id, status=url_for('analysis_status', job_id=job_id)), 202
+
+@app.route('/api/analysis/<job_id>', methods=['GET', 'DELETE'])
+def analysis_status(job_id):
+    """Progress and results so far; DELETE drops the positions not started yet"""
+    if 'username' not in session:
+        return jsonify(error='login required'), 401
+    service = analysis_service()
+    # Other users' jobs look the same as unknown ones
+    owner = session['username']
+    if request.method == 'DELETE' and not service.cancel(job_id, owner):
+        return jsonify(error='unknown job'), 404
+    status = service.status(job_id, owner=owner)
+    if status is None:
+        return jsonify(error='unknown job'), 404
+    return jsonify(status)
+
+@app.route('/logout')
+def logout():
+    session.pop('username', None)
+    flash('You have been logged out', 'info')
+    return redirect(url_for('index'))
@@ -0,0 +1,78 @@
+import pytest
+
+from chess_engine import STARTING_FEN, Position
+from chess_engine.analysis import AnalysisBusy, AnalysisService, game_positions
+from chess_engine.san import parse_uci
+
+MATE_IN_ONE = '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'
+STALEMATE = '7k/5Q2/6K1/8/8/8/8/8 b - - 0 1'
+
+
+@pytest.fixture
+def service():
+    service = AnalysisService(workers=1, tablebase_dir=None, max_batch=5, max_jobs_per_owner=1,
+                              max_queued=8)
+    yield service
+    service.close()
+
+
+def test_analyse_batch(service):
+    job_id = service.submit([MATE_IN_ONE, STALEMATE, STARTING_FEN], depth=2)
+    results = service.wait(job_id, timeout=120)
+    assert results[0]['bestmove'] == 'd1d8' and results[0]['score'] == {'mate': 1}
+    assert results[1]['bestmove'] is None and results[1]['score'] == {'cp': 0}
+    assert results[2]['depth'] == 2 and len(results[2]['pv']) >= 1
+    status = service.status(job_id, results=False)
+    assert status == {'id': job_id, 'state': 'done', 'total': 3, 'completed': 3}
+    assert service.status('no such job') is None
+
+
+@pytest.mark.parametrize('fens', [[], [STARTING_FEN] * 6, [STARTING_FEN, 'not a fen']])
+def test_bad_batch(service, fens):
+    with pytest.raises(ValueError):
+        service.submit(fens, depth=1)
+
+
+def test_limits(service):
+    slow = dict(depth=None, movetime=3000)
+    service.submit([STARTING_FEN] * 4, owner='alice', **slow)
+    with pytest.raises(AnalysisBusy):
+        service.submit([STARTING_FEN], owner='alice', **slow)    # one job per owner
+    service.submit([STARTING_FEN] * 3, owner='bob', **slow)
+    with pytest.raises(AnalysisBusy):
+        service.submit([STARTING_FEN] * 2, owner='carol', **slow)  # queue holds 8 positions
+
+
+def test_game_positions():
+    e4 = parse_uci(Position(), 'e2e4')
+    assert game_positions(None, [e4]) == [
+        STARTING_FEN, 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1']
+    with pytest.raises(ValueError):
+        game_positions(None, [e4, e4])
+
+
+def test_analysis_api(monkeypatch, service):
+    import chess_web
+
+    monkeypatch.setattr(chess_web, '_analysis', service)
+    client = chess_web.app.test_client()
+    assert client.post('/api/analysis', json={'fens': [STARTING_FEN]}).status_code == 401
+    with client.session_transaction() as session:
+        session['username'] = 'alice'
+    response = client.post('/api/analysis', json={'fens': [STARTING_FEN, 'bad'], 'depth': 1})
+    assert response.status_code == 400 and 'position 2' in response.get_json()['error']
+    response = client.post('/api/analysis', json={'fens': [MATE_IN_ONE], 'depth': 1})
+    assert response.status_code == 202
+    job = response.get_json()['job']
+    service.wait(job, timeout=60)
+    assert client.get(f'/api/analysis/{job}').get_json()['results'][0]['bestmove'] == 'd1d8'
+    with client.session_transaction() as session:
+        session['username'] = 'mallory'
+    assert client.get(f'/api/analysis/{job}').status_code == 404
+    assert client.delete(f'/api/analysis/{job}').status_code == 404
+    with client.session_transaction() as session:
+        session['username'] = 'alice'
+    assert client.delete(f'/api/analysis/{job}').status_code == 200
+    service.submit([STARTING_FEN], owner='alice', movetime=3000)
+    response = client.post('/api/analysis', json={'fens': [STARTING_FEN], 'depth': 1})
+    assert response.status_code == 429
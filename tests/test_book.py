@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from chess_engine import STARTING_FEN, position_from_fen
+from chess_engine.book import OpeningBook, build_book
+from chess_engine.moves import move_to_uci
+
+LINES = '''# two King's pawn games and a Queen's pawn game
+e2e4 e7e5 g1f3 b8c6
+e4 c5 Nf3 d6
+d2d4 d7d5
+r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3 | f1b5 a7a6
+'''
+
+
+@pytest.fixture
+def book(tmp_path):
+    source = tmp_path / 'lines.txt'
+    source.write_text(LINES)
+    path = str(tmp_path / 'book.bin')
+    assert build_book([str(source)], path) == (4, 11)
+    with OpeningBook(path) as book:
+        yield book
+
+
+def test_book_probe(book):
+    start = position_from_fen(STARTING_FEN)
+    assert sorted((move_to_uci(move), weight) for move, weight in book.entries(start.hash)) == \
+        [('d2d4', 1), ('e2e4', 2)]
+    assert move_to_uci(book.probe(start, best=True)) == 'e2e4'
+    assert move_to_uci(book.probe(start, rng=random.Random(1))) in ('e2e4', 'd2d4')
+    ruy_lopez = position_from_fen('r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3')
+    assert move_to_uci(book.probe(ruy_lopez, best=True)) == 'f1b5'
+    assert book.probe(position_from_fen('8/8/8/4k3/8/8/8/4K2R w K - 0 1')) is None
+
+
+def test_not_a_book(tmp_path):
+    path = tmp_path / 'bad.bin'
+    path.write_bytes(b'not a book at all')
+    with pytest.raises(ValueError):
+        OpeningBook(str(path))
@@ -0,0 +1,62 @@
+import sqlite3
+
+from chess_engine.db import migrate
+from chess_engine.games import GameStore
+from chess_engine.pgn import iter_pgn_games
+
+PGN = '''[Event "Test"]
+[Site "?"]
+[Date "2024.01.01"]
+[Round "1"]
+[White "alice"]
+[Black "bob"]
+[Result "1-0"]
+[ECO "C50"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 {Italian} Bc5 4. O-O Nf6 5. d4 exd4 6. e5 d5
+7. exf6 dxc4 8. Re1+ Be6 9. Ng5 Qd5 10. Nc3 Qf5 11. Nce4 O-O-O 12. g4 1-0
+
+[Event "From a position"]
+[White "carol"]
+[Black "dave"]
+[Result "0-1"]
+[SetUp "1"]
+[FEN "4k3/P7/8/8/8/8/6p1/4K3 b - - 0 40"]
+
+40... g1=Q+ 41. Kd2 Qd4+ 0-1
+'''
+
+
+def test_pgn_round_trip(tmp_path):
+    with GameStore(str(tmp_path / 'games.db')) as store:
+        assert store.import_pgn(PGN.splitlines()) == (2, 0)
+        exported = ''.join(store.pgn(row) for row in
+                           store.conn.execute('SELECT * FROM games ORDER BY id'))
+    games = list(iter_pgn_games(exported.splitlines()))
+    expected = list(iter_pgn_games(PGN.splitlines()))
+    assert len(games) == len(expected) == 2
+    for (headers, moves), (original_headers, original_moves) in zip(games, expected):
+        assert moves == original_moves
+        # The export fills in missing Seven Tag Roster tags with '?'
+        assert headers.items() >= original_headers.items()
+
+
+def test_stored_game_replays(tmp_path):
+    with GameStore(str(tmp_path / 'games.db')) as store:
+        store.import_pgn(PGN.splitlines())
+        game = store.get(1)
+    assert game['player1'] == 'alice' and game['result'] == '1-0' and len(game['moves']) == 23
+
+
+def test_migrations_reach_latest_version(tmp_path):
+    from chess_web import MIGRATIONS
+
+    path = str(tmp_path / 'users.db')
+    conn = sqlite3.connect(path, isolation_level=None)
+    assert migrate(conn, MIGRATIONS) == len(MIGRATIONS)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'users', 'games', 'game_analysis'} <= tables
+    # Running again is a no-op
+    assert migrate(conn, MIGRATIONS) == len(MIGRATIONS)
+    conn.close()
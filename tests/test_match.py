@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from chess_engine import position_from_fen
+from chess_engine.match import (
+    DEFAULT_ENGINE, _insufficient_material, elo_estimate, load_openings, parse_time_control,
+    run_match, sprt_bounds, sprt_llr,
+)
+
+
+def test_parse_time_control():
+    assert parse_time_control('10+0.1') == (10.0, 0.1)
+    assert parse_time_control('60') == (60.0, 0.0)
+
+
+def test_sprt():
+    lower, upper = sprt_bounds(0.05, 0.05)
+    assert lower == pytest.approx(-2.944, abs=1e-3) and upper == pytest.approx(2.944, abs=1e-3)
+    assert sprt_llr(0, 10, 0, 0, 10) == 0.0
+    assert sprt_llr(600, 200, 200, 0, 10) > upper      # engine1 clearly stronger
+    assert sprt_llr(200, 200, 600, 0, 10) < lower
+    elo, margin = elo_estimate(50, 0, 50)
+    assert elo == pytest.approx(0) and 0 < margin < 100
+
+
+@pytest.mark.parametrize('fen, insufficient', [
+    ('8/8/8/4k3/8/8/8/4K3 w - - 0 1', True),
+    ('8/8/8/4k3/8/8/8/4KN2 w - - 0 1', True),
+    ('8/8/8/4k3/8/8/8/3BKN2 w - - 0 1', False),
+    ('8/8/8/4k3/8/8/4P3/4K3 w - - 0 1', False),
+])
+def test_insufficient_material(fen, insufficient):
+    assert _insufficient_material(position_from_fen(fen)) == insufficient
+
+
+def test_run_match():
+    openings = load_openings()
+    spec = (DEFAULT_ENGINE, ())
+    pgn = io.StringIO()
+    result = run_match(spec, spec, openings, time_control=(5, 0.05), games=2, workers=1,
+                       max_plies=24, pgn=pgn, log=None)
+    assert result['games'] == 2
+    assert result['wins'] + result['draws'] + result['losses'] == 2
+    assert result['decision'] is None
+    assert pgn.getvalue().count('[Result ') == 2
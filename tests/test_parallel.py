@@ -0,0 +1,18 @@
+from chess_engine import parallel
+from chess_engine.fen import position_from_fen
+from chess_engine.search import FEATURES, INFINITY
+
+
+def test_worker_tables_age_once_per_search(monkeypatch):
+    monkeypatch.setattr(parallel, '_search_id', None)
+    parallel._init_worker(1)
+    position = position_from_fen('r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3')
+    moves = position.generate_legal_moves()
+    features = [True] * len(FEATURES)
+    ages = []
+    for search_id, move in zip((1, 1, 2, 2, 3), moves):
+        _, value, _ = parallel._search_root_move(position, move, 2, -INFINITY, INFINITY,
+                                                 float('inf'), features, search_id)
+        assert value is not None
+        ages.append(parallel._worker.tt.age)
+    assert ages == [1, 1, 2, 2, 3]
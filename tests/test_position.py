@@ -0,0 +1,67 @@
+import pytest
+
+from chess_engine import STARTING_FEN, position_from_fen, position_to_fen
+from chess_engine.evaluation import compute_scores
+from chess_engine.moves import KING_CASTLE, QUEEN_CASTLE
+from chess_engine.perft import REFERENCE_POSITIONS, perft
+from chess_engine.zobrist import compute_hash
+
+FENS = [fen for _, fen, _ in REFERENCE_POSITIONS] + [
+    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+    '8/8/8/8/8/8/6k1/4K2R b K - 12 60',
+]
+
+
+@pytest.mark.parametrize('name, fen, counts', REFERENCE_POSITIONS)
+def test_perft(name, fen, counts):
+    position = position_from_fen(fen)
+    for depth, expected in enumerate(counts[:3], 1):
+        assert perft(position, depth) == expected, f"{name} depth {depth}"
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_fen_round_trip(fen):
+    assert position_to_fen(position_from_fen(fen)) == fen
+
+
+@pytest.mark.parametrize('fen', ['', 'rnbqkbnr/pppppppp/8/8 w KQkq - 0 1',
+                                 'rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                                 STARTING_FEN.replace(' w ', ' x '),
+                                 'P7/8/8/8/8/8/8/K6k w - - 0 1',          # pawn on the last rank
+                                 'K6k/8/8/8/8/8/8/7p b - - 0 1',          # pawn on the first rank
+                                 '8/8/8/4k3/8/8/8/8 w - - 0 1',           # no white king
+                                 'kk6/8/8/8/8/8/8/K7 w - - 0 1',          # two black kings
+                                 'k7/8/8/8/8/8/8/K6Q w - - 0 1',          # Black in check, White to move
+                                 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e6 0 1',
+                                 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e4 0 1'])
+def test_bad_fen(fen):
+    with pytest.raises(ValueError):
+        position_from_fen(fen)
+
+
+def test_castling_rights_need_king_and_rook():
+    position = position_from_fen('4k3/8/8/8/8/8/8/R3K3 w KQ - 0 1')
+    assert position_to_fen(position) == '4k3/8/8/8/8/8/8/R3K3 w Q - 0 1'
+    position.set_castling(position.castling | 1)  # a stale kingside right
+    flags = {move >> 12 for move in position.generate_legal_moves()}
+    assert KING_CASTLE not in flags and QUEEN_CASTLE in flags
+
+
+def _walk(position, depth):
+    """Push and pop every line to depth, checking the state is restored each time"""
+    if depth == 0:
+        return
+    for move in position.generate_legal_moves():
+        before = (position_to_fen(position), position.hash, position.mg, position.eg, position.phase)
+        position.push(move)
+        assert position.hash == compute_hash(position)
+        assert (position.mg, position.eg, position.phase) == compute_scores(position)
+        _walk(position, depth - 1)
+        position.pop()
+        assert (position_to_fen(position), position.hash, position.mg, position.eg,
+                position.phase) == before
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_push_pop_restores_hash_and_eval(fen):
+    _walk(position_from_fen(fen), 2)
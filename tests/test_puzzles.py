@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from chess_engine.puzzles import PuzzleStore
+
+MATE_IN_ONE = '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'
+
+CSV = '''PuzzleId,FEN,Moves,Rating,Themes
+a1,6k1/5ppp/8/8/8/8/5PPP/3R1K2 b - - 0 1,g8h8 f1g1 h8g8 d1d8,1200,mateIn1 short
+a2,6k1/5ppp/8/8/8/8/5PPP/3R1K2 b - - 0 1,g8h8 d1d9,1300,short
+a3,not a fen,e2e4 e7e5,1400,short
+a4,6k1/5ppp/8/8/8/8/5PPP/3R1K2 b - - 0 1,g8h8 f1g1 h8h8,1500,short
+a5,6k1/5ppp/8/8/8/8/5PPP/3R1K2 b - - 0 1,g8h8,1600,short
+a1,6k1/5ppp/8/8/8/8/5PPP/3R1K2 b - - 0 1,g8h8 f1g1 h8g8 d1d8,1200,mateIn1 short
+'''
+
+
+@pytest.fixture
+def store(tmp_path):
+    with PuzzleStore(str(tmp_path / 'puzzles.db')) as store:
+        yield store
+
+
+def test_add(store):
+    puzzle_id = store.add(MATE_IN_ONE, ['d1d8'], rating=1000, themes=['mateIn1'])
+    puzzle = store.get(puzzle_id)
+    assert puzzle['solution'] == ['d1d8'] and puzzle['themes'] == ['mateIn1']
+    for fen, solution in [('bad', ['d1d8']), (MATE_IN_ONE, []), (MATE_IN_ONE, ['d1d9'])]:
+        with pytest.raises(ValueError):
+            store.add(fen, solution)
+
+
+def test_import_csv_skips_bad_rows(store):
+    assert store.import_csv(CSV.splitlines()) == (1, 5)
+    puzzle = store.random(rng=random.Random(1))
+    assert puzzle['source_id'] == 'a1' and puzzle['solution'] == ['f1g1', 'h8g8', 'd1d8']
+    assert puzzle['fen'] == '7k/5ppp/8/8/8/8/5PPP/3R1K2 w - - 1 2'
+
+
+def test_random_band(store):
+    for rating in (1000, 1500, 2000):
+        store.add(MATE_IN_ONE, ['d1d8'], rating=rating)
+    rng = random.Random(7)
+    assert {store.random(1400, 1600, rng=rng)['rating'] for _ in range(10)} == {1500}
+    assert store.random(2100, 3000, rng=rng) is None
+    assert store.random(2000, 1000, rng=rng) is None
+    assert store.random(1000, 2000, theme='fork', rng=rng) is None
@@ -0,0 +1,106 @@
+import sqlite3
+
+import pytest
+
+from chess_engine import Position, ratings
+from chess_engine.db import migrate
+from chess_engine.games import GameStore
+from chess_engine.san import parse_uci
+
+SCHOLARS_MATE = ['e2e4', 'e7e5', 'f1c4', 'b8c6', 'd1h5', 'g8f6', 'h5f7']
+
+
+@pytest.fixture
+def database(tmp_path):
+    from chess_web import MIGRATIONS
+
+    path = str(tmp_path / 'users.db')
+    conn = sqlite3.connect(path, isolation_level=None)
+    migrate(conn, MIGRATIONS)
+    conn.executemany('INSERT INTO users (username, password, rating) VALUES (?, ?, ?)',
+                     [('alice', 'x', 1000), ('bob', 'x', 1000), ('carol', 'x', 1200)])
+    conn.close()
+    return path
+
+
+def _moves(uci_moves):
+    position = Position()
+    moves = []
+    for text in uci_moves:
+        move = parse_uci(position, text)
+        position.push(move)
+        moves.append(move)
+    return moves
+
+
+def test_elo_update():
+    assert ratings.expected_score(1000, 1000) == 0.5
+    assert ratings.elo_update(1000, 1000, 1) == 1016
+    assert ratings.elo_update(1000, 1000, 0) == 984
+
+
+def test_rate_saved_and_leaderboard(database):
+    moves = _moves(SCHOLARS_MATE)
+    with GameStore(database) as store:
+        store.add_many([
+            {'moves': moves, 'white': 'alice', 'black': 'bob', 'result': '1-0', 'rated': True},
+            {'moves': moves, 'white': 'bob', 'black': 'alice', 'result': '1-0'},
+            {'moves': moves, 'white': 'alice', 'black': 'Computer', 'result': '1-0', 'rated': True},
+        ])
+        assert ratings.rate_saved(store.conn) == 2
+        conn = store.conn
+        conn.row_factory = sqlite3.Row
+        assert dict(conn.execute('SELECT username, rating FROM users').fetchall()) == \
+            {'alice': 1016, 'bob': 984, 'carol': 1200}
+        assert conn.execute('SELECT COUNT(*) FROM games WHERE rated = 0').fetchone()[0] == 0
+
+        board = ratings.leaderboard(conn, limit=2)
+        assert [(rank, name) for rank, name, _, _ in board] == [(1, 'carol'), (2, 'alice')]
+        after = (board[-1][2], board[-1][3])
+        assert [name for _, name, _, _ in ratings.leaderboard(conn, 2, after)] == ['bob']
+        assert ratings.rank(conn, 'bob') == (3, 984)
+        assert ratings.rank(conn, 'nobody') is None
+
+
+def test_rate_saved_without_ratings_tables(tmp_path):
+    with GameStore(str(tmp_path / 'games.db')) as store:
+        store.add_many([{'moves': _moves(SCHOLARS_MATE), 'white': 'alice', 'black': 'bob',
+                         'result': '1-0', 'rated': True}])
+        assert ratings.rate_saved(store.conn) == 0
+
+
+def test_leaderboard_page_does_not_write(database, monkeypatch):
+    import chess_web
+
+    monkeypatch.setattr(chess_web, 'DATABASE', database)
+    monkeypatch.setattr(chess_web, '_pool', None)
+    with GameStore(database) as store:
+        store.add(_moves(SCHOLARS_MATE), 'alice', 'bob', '1-0', rated=True)
+    response = chess_web.app.test_client().get('/leaderboard')
+    assert response.status_code == 200
+    assert b'carol' in response.data
+    conn = sqlite3.connect(database)
+    assert conn.execute('SELECT COUNT(*) FROM games WHERE rated = 0').fetchone()[0] == 1
+    conn.close()
+    chess_web.db_pool().close()
+
+
+def test_local_and_imported_games_are_not_rated(database):
+    from chess_game import ChessGame, PieceColor, save_game
+
+    conn = sqlite3.connect(database)
+    conn.executemany('INSERT INTO users (username, password, rating) VALUES (?, ?, ?)',
+                     [('Player', 'x', 1000), ('Computer', 'x', 1000)])
+    conn.commit()
+    game = ChessGame()
+    for move in _moves(['f2f3', 'e7e5', 'g2g4', 'd8h4']):
+        game.position.push(move)
+    game.game_over, game.winner = True, PieceColor.BLACK
+    save_game(game, 'Player', 'Computer', path=database)
+    with GameStore(database) as store:
+        store.import_pgn(['[White "alice"]', '[Black "bob"]', '[Result "0-1"]', '',
+                          '1. f3 e5 2. g4 Qh4# 0-1'])
+        assert ratings.rate_saved(store.conn) == 0
+    assert dict(conn.execute('SELECT username, rating FROM users').fetchall()) == \
+        {'alice': 1000, 'bob': 1000, 'carol': 1200, 'Player': 1000, 'Computer': 1000}
+    conn.close()
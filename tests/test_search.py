@@ -0,0 +1,12 @@
+from chess_engine.fen import position_from_fen
+from chess_engine.ordering import MAX_PLY
+from chess_engine.search import INFINITY, MATE_SCORE, Searcher
+
+FOOLS_MATE = 'rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3'
+
+
+def test_quiesce_stops_at_max_ply():
+    searcher = Searcher(position_from_fen(FOOLS_MATE))
+    assert searcher.quiesce(True, -INFINITY, INFINITY) == -MATE_SCORE
+    searcher.root_ply = -MAX_PLY  # as if MAX_PLY moves deep into the search
+    assert searcher.quiesce(True, -INFINITY, INFINITY) == searcher.evaluate_board()
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from chess_server import WebSocket, serve, sign_player, verify_player
+
+
+def test_player_tokens():
+    token = sign_player('alice', 'secret')
+    assert verify_player(token, 'secret') == 'alice'
+    assert verify_player(token, 'other secret') is None
+    assert verify_player(token.replace('alice', 'mallory'), 'secret') is None
+    assert verify_player(sign_player('alice', 'secret', ttl=-1), 'secret') is None
+    assert verify_player('', 'secret') is None
+
+
+@pytest.fixture
+def server(request, tmp_path):
+    """(port, database) of a game server with the secret 'secret', stopped afterwards"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    database = str(tmp_path / 'games.db')
+    stop, ready = threading.Event(), threading.Event()
+    thread = threading.Thread(target=serve, args=('127.0.0.1', port, database, stop, ready),
+                              kwargs={'secret': 'secret', **getattr(request, 'param', {})})
+    thread.start()
+    assert ready.wait(10)
+    yield port, database
+    stop.set()
+    thread.join(10)
+
+
+async def _messages(ws, count):
+    return [json.loads(await ws.recv()) for _ in range(count)]
+
+
+def test_game_over_websocket(server):
+    port, database = server
+
+    async def play():
+        intruder = await WebSocket.connect('127.0.0.1', port)
+        await intruder.send(json.dumps({'type': 'join', 'name': 'alice'}))
+        assert (await _messages(intruder, 1))[0] == {'type': 'error', 'message': 'login required'}
+        await intruder.close()
+
+        alice = await WebSocket.connect('127.0.0.1', port)
+        bob = await WebSocket.connect('127.0.0.1', port)
+        await alice.send(json.dumps({'type': 'join', 'token': sign_player('alice', 'secret'),
+                                     'friend': 'k'}))
+        assert (await _messages(alice, 1))[0]['type'] == 'waiting'
+        await bob.send(json.dumps({'type': 'join', 'token': sign_player('bob', 'secret'),
+                                   'friend': 'k'}))
+        start = (await _messages(alice, 1))[0]
+        assert start['type'] == 'start' and start['opponent'] == 'bob'
+        assert (await _messages(bob, 1))[0]['opponent'] == 'alice'
+        # Colours are drawn at random
+        white, black = (alice, bob) if start['color'] == 'white' else (bob, alice)
+
+        await black.send(json.dumps({'type': 'move', 'move': 'e7e5'}))
+        assert (await _messages(black, 1))[0]['type'] == 'error'
+        await white.send(json.dumps({'type': 'move', 'move': 'e2e4'}))
+        for message in await _messages(white, 1) + await _messages(black, 1):
+            assert message['type'] == 'move' and message['move'] == 'e2e4' and message['ply'] == 1
+        await black.send(json.dumps({'type': 'resign'}))
+        for message in await _messages(white, 1) + await _messages(black, 1):
+            assert message == {'type': 'end', 'result': '1-0', 'reason': 'resignation'}
+        await alice.close()
+        await bob.close()
+        return start['color']
+
+    alice_color = asyncio.run(asyncio.wait_for(play(), 30))
+
+    # The game is written on the next flush (or when the server stops)
+    for _ in range(50):
+        conn = sqlite3.connect(database)
+        try:
+            rows = conn.execute('SELECT player1, player2, result, plies FROM games').fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        conn.close()
+        if rows:
+            break
+        time.sleep(0.1)
+    expected = ('alice', 'bob') if alice_color == 'white' else ('bob', 'alice')
+    assert rows == [expected + ('1-0', 1)]
+
+
+@pytest.mark.parametrize('server', [{'clock': 0.5}], indirect=True)
+def test_flag_falls_without_a_move(server):
+    port, _ = server
+
+    async def play():
+        players = [await WebSocket.connect('127.0.0.1', port) for _ in range(2)]
+        for name, ws in zip(['alice', 'bob'], players):
+            await ws.send(json.dumps({'type': 'join', 'token': sign_player(name, 'secret')}))
+        assert (await _messages(players[0], 1))[0]['type'] == 'waiting'
+        starts = [(await _messages(ws, 1))[0] for ws in players]
+        white = players[[start['color'] for start in starts].index('white')]
+        black = players[1 - players.index(white)]
+        await white.send(json.dumps({'type': 'move', 'move': 'e2e4'}))
+        await _messages(white, 1)
+        await _messages(black, 1)
+        # Black never answers and loses on time
+        for message in await _messages(white, 1) + await _messages(black, 1):
+            assert message == {'type': 'end', 'result': '1-0', 'reason': 'time'}
+        for ws in players:
+            await ws.close()
+
+    asyncio.run(asyncio.wait_for(play(), 30))
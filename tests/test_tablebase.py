@@ -0,0 +1,35 @@
+import pytest
+
+from chess_engine import position_from_fen
+from chess_engine.evaluation import MATE_SCORE
+from chess_engine.search import Searcher
+from chess_engine.tablebase import Tablebase, generate_tables
+
+
+@pytest.fixture(scope='module')
+def tablebase(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('tablebases'))
+    generate_tables(directory, ['KQK', 'KRK'], log=None)
+    tablebase = Tablebase(directory)
+    yield tablebase
+    tablebase.close()
+
+
+@pytest.mark.parametrize('fen, expected', [
+    ('7k/8/6K1/8/8/8/8/1Q6 w - - 0 1', (1, 1)),    # Qb8 mates
+    ('7k/8/5K2/8/8/8/8/6Q1 b - - 0 1', (-1, 2)),   # any king move, then Qg7 mates
+    ('7K/8/6k1/8/8/8/8/1q6 b - - 0 1', (1, 1)),    # the same with colours swapped
+    ('8/8/8/4k3/8/8/8/4K2R b - - 0 1', (-1, 28)),
+    ('8/8/8/4k3/8/8/8/2RQK3 w - - 0 1', None),     # more pieces than any table
+    ('8/8/8/4k3/8/8/8/R3K3 w Q - 0 1', None),      # castling rights are never in a table
+])
+def test_probe(tablebase, fen, expected):
+    assert tablebase.probe(position_from_fen(fen)) == expected
+
+
+def test_search_uses_tablebase(tablebase):
+    searcher = Searcher(position_from_fen('8/8/8/4k3/8/8/8/4K2R w - - 0 1'))
+    searcher.tablebase = tablebase
+    searcher.iterative_deepening(2)
+    assert searcher.tablebase_hits
+    assert searcher.best_value > MATE_SCORE - 40